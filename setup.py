@@ -24,13 +24,11 @@ import yaprt
 with open('requirements.txt') as f:
     required = f.read().splitlines()
 
-if sys.version_info < (2, 6, 0):
-    sys.stderr.write("Python 2.6.0 or greater is required\n")
+if sys.version_info < (2, 7, 0):
+    sys.stderr.write("Python 2.7.0 or greater is required\n")
     raise SystemExit(
         '\nUpgrade python because you version of it is VERY deprecated\n'
     )
-elif sys.version_info < (2, 7, 0):
-    required.append('argparse')
 
 with open('README.rst', 'r') as r_file:
     LDINFO = r_file.read()
@@ -55,7 +53,6 @@ setuptools.setup(
         'Intended Audience :: Developers',
         'Operating System :: OS Independent',
         'License :: OSI Approved :: Apache Software License',
-        'Programming Language :: Python :: 2.6',
         'Programming Language :: Python :: 2.7',
         'Topic :: Utilities',
         'Topic :: Software Development :: Libraries :: Python Modules'
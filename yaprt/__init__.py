@@ -63,6 +63,71 @@ ARGUMENTS_DICT = {
                 'repo-requirements.json'
             )
         },
+        'queue_file': {
+            'commands': [
+                '--queue-file'
+            ],
+            'help': 'Path to the work queue database shared by the build'
+                    ' producer and build workers.',
+            'default': None
+        },
+        'metrics_dir': {
+            'commands': [
+                '--metrics-dir'
+            ],
+            'help': 'Path to a directory where a json file with the wall'
+                    ' time, CPU time, peak memory and output size of every'
+                    ' build operation is written for each run.',
+            'default': None
+        },
+        'publish_root': {
+            'commands': [
+                '--publish-root'
+            ],
+            'help': 'Publish the repository as generations within this'
+                    ' directory. Every run stages a new generation, hard'
+                    ' linking unchanged content from the current one, and'
+                    ' then swaps the "current" symlink to it. Paths within'
+                    ' the publish root are placed within the staged'
+                    ' generation.',
+            'default': None
+        },
+        'keep_generations': {
+            'commands': [
+                '--keep-generations'
+            ],
+            'help': 'Number of published generations kept for rollback,'
+                    ' including the current one. Default: %(default)s',
+            'type': int,
+            'default': 5
+        },
+        'hash_cache': {
+            'commands': [
+                '--hash-cache'
+            ],
+            'help': 'SQLite database caching the hashes of files by their'
+                    ' device, inode, size and mtime, so unchanged files are'
+                    ' never read again to hash them.',
+            'default': None
+        },
+        'index_workers': {
+            'commands': [
+                '--index-workers'
+            ],
+            'help': 'Number of threads hashing files and writing HTML'
+                    ' indexes. Default: %(default)s',
+            'type': int,
+            'default': 1
+        },
+        'index_state_file': {
+            'commands': [
+                '--index-state-file'
+            ],
+            'help': 'File keeping the state of the HTML indexes between'
+                    ' runs. When set, only the indexes of directories whose'
+                    ' content has changed are written again.',
+            'default': None
+        },
         'git_repo_path': {
             'commands': [
                 '--git-repo-path'
@@ -99,6 +164,25 @@ ARGUMENTS_DICT = {
             'help': 'Enable debug mode',
             'action': 'store_true',
             'default': False
+        },
+        'trace_file': {
+            'commands': [
+                '--trace-file'
+            ],
+            'help': 'Path to a file where the phases, git operations,'
+                    ' builds and commands of the run are written as a'
+                    ' Chrome trace, viewable in "chrome://tracing".',
+            'default': None
+        },
+        'prometheus_textfile_dir': {
+            'commands': [
+                '--prometheus-textfile-dir'
+            ],
+            'help': 'Path to the node exporter textfile collector'
+                    ' directory. When set, the phase durations and counts'
+                    ' of the run are written to "yaprt_<command>.prom"'
+                    ' while the run progresses.',
+            'default': None
         }
     },
     'subparsed_args': {
@@ -163,7 +247,14 @@ ARGUMENTS_DICT = {
             'help': 'Build all of the wheels from a json report.',
             'shared_args': [
                 'report_file',
-                'git_repo_path'
+                'git_repo_path',
+                'queue_file',
+                'metrics_dir',
+                'publish_root',
+                'keep_generations',
+                'index_state_file',
+                'hash_cache',
+                'index_workers'
             ],
             'optional_args': {
                 'groups': {
@@ -176,7 +267,39 @@ ARGUMENTS_DICT = {
                             'build_requirements',
                             'build_packages',
                             'build_output',
-                            'build_dir'
+                            'build_dir',
+                            'build_engine',
+                            'build_workers',
+                            'git_snapshot',
+                            'journal_file',
+                            'resume',
+                            'metrics_dir'
+                        ]
+                    },
+                    'verify_options': {
+                        'text': 'Wheel verification options',
+                        'required': False,
+                        'group': [
+                            'no_verify_wheels',
+                            'verify_workers',
+                            'quarantine_dir'
+                        ]
+                    },
+                    'plan_options': {
+                        'text': 'Plan options',
+                        'required': False,
+                        'group': [
+                            'plan',
+                            'plan_workers'
+                        ]
+                    },
+                    'pipeline_options': {
+                        'text': 'Pipeline options',
+                        'required': False,
+                        'group': [
+                            'build_pipeline',
+                            'pipeline_queue_size',
+                            'publish_workers'
                         ]
                     },
                     'storage_options': {
@@ -187,6 +310,79 @@ ARGUMENTS_DICT = {
                             'storage_pool'
                         ]
                     },
+                    'publish_options': {
+                        'text': 'Publish options',
+                        'required': False,
+                        'group': [
+                            'publish_root',
+                            'keep_generations',
+                            'publish_indexes',
+                            'index_state_file',
+                            'hash_cache',
+                            'index_workers',
+                            'simple_dir'
+                        ]
+                    },
+                    'shard_options': {
+                        'text': 'Shard options',
+                        'required': False,
+                        'group': [
+                            'shard',
+                            'shard_weights'
+                        ]
+                    },
+                    'limit_options': {
+                        'text': 'Build limit options',
+                        'required': False,
+                        'group': [
+                            'build_timeout',
+                            'build_cpu_limit',
+                            'build_memory_limit',
+                            'build_limits_file'
+                        ]
+                    },
+                    'build_env_options': {
+                        'text': 'Build environment options',
+                        'required': False,
+                        'group': [
+                            'build_env_dir',
+                            'build_python',
+                            'build_env_requirements'
+                        ]
+                    },
+                    'tree_cache_options': {
+                        'text': 'Tree cache options',
+                        'required': False,
+                        'group': [
+                            'tree_cache'
+                        ]
+                    },
+                    'compiler_options': {
+                        'text': 'Compiler options',
+                        'required': False,
+                        'group': [
+                            'compiler_cache',
+                            'compile_jobs'
+                        ]
+                    },
+                    'source_cache_options': {
+                        'text': 'Source cache options',
+                        'required': False,
+                        'group': [
+                            'source_cache',
+                            'prefetch_workers',
+                            'source_cache_refresh',
+                            'source_cache_offline'
+                        ]
+                    },
+                    'queue_options': {
+                        'text': 'Work queue options',
+                        'required': False,
+                        'group': [
+                            'enqueue',
+                            'queue_file'
+                        ]
+                    },
                     'pip_options': {
                         'text': 'Pip options',
                         'required': False,
@@ -224,6 +420,175 @@ ARGUMENTS_DICT = {
                             ' used.',
                     'default': None
                 },
+                'build_engine': {
+                    'commands': [
+                        '--build-engine'
+                    ],
+                    'help': 'Engine used to build wheels from local source'
+                            ' trees. The "pep517" engine calls the build'
+                            ' backend of a source tree directly within a long'
+                            ' lived worker process and falls back to pip'
+                            ' for anything it can not build, or for trees'
+                            ' with a "constraints.txt" file.'
+                            ' Default: %(default)s',
+                    'default': 'pip',
+                    'choices': ['pip', 'pep517']
+                },
+                'build_workers': {
+                    'commands': [
+                        '--build-workers'
+                    ],
+                    'help': 'Number of builds that run at the same time on'
+                            ' this host, such as "build-worker" processes'
+                            ' sharing it. Used to share out the compile jobs'
+                            ' and to estimate the wall time of a plan.'
+                            ' Default: %(default)s',
+                    'type': int,
+                    'default': 1
+                },
+                'no_verify_wheels': {
+                    'commands': [
+                        '--no-verify-wheels'
+                    ],
+                    'help': 'Publish built wheels without verifying their'
+                            ' zip CRCs, RECORD hashes and metadata.',
+                    'action': 'store_true',
+                    'default': False
+                },
+                'verify_workers': {
+                    'commands': [
+                        '--verify-workers'
+                    ],
+                    'help': 'Number of processes verifying built wheels.'
+                            ' Default: %(default)s',
+                    'type': int,
+                    'default': 4
+                },
+                'quarantine_dir': {
+                    'commands': [
+                        '--quarantine-dir'
+                    ],
+                    'help': 'Path where invalid wheels are moved instead of'
+                            ' being published. Default: %(default)s',
+                    'default': os.path.join(
+                        os.getenv('HOME'),
+                        'yaprt-quarantine'
+                    )
+                },
+                'publish_indexes': {
+                    'commands': [
+                        '--publish-indexes'
+                    ],
+                    'help': 'Create the HTML indexes of the staged'
+                            ' generation before it is made current. Used'
+                            ' with "--publish-root".',
+                    'action': 'store_true',
+                    'default': False
+                },
+                'simple_dir': {
+                    'commands': [
+                        '--simple-dir'
+                    ],
+                    'help': 'Create a PEP 503 simple index of the storage'
+                            ' pool within this directory once the wheels'
+                            ' are built. With "--publish-root" the index is'
+                            ' created within the staged generation and the'
+                            ' HTML indexes do not index it.',
+                    'default': None
+                },
+                'plan': {
+                    'commands': [
+                        '--plan'
+                    ],
+                    'help': 'Print a plan of the build instead of building.'
+                            ' Every package is shown as cached, needs-build'
+                            ' or known-failing with its estimated build'
+                            ' time, taken from "--shard-weights" or the'
+                            ' build metrics within "--metrics-dir".',
+                    'action': 'store_true',
+                    'default': False
+                },
+                'plan_workers': {
+                    'commands': [
+                        '--plan-workers'
+                    ],
+                    'help': 'Number of builds that run at the same time when'
+                            ' estimating the wall time of a plan. Default is'
+                            ' "--build-workers".',
+                    'type': int,
+                    'default': None
+                },
+                'git_snapshot': {
+                    'commands': [
+                        '--git-snapshot'
+                    ],
+                    'help': 'Build git packages from a private snapshot of'
+                            ' their branch instead of checking the branch'
+                            ' out within the shared clone. "archive" exports'
+                            ' the package directory with "git archive",'
+                            ' "worktree" adds a temporary git worktree and'
+                            ' keeps the git metadata pbr needs.',
+                    'default': None,
+                    'choices': ['archive', 'worktree']
+                },
+                'build_timeout': {
+                    'commands': [
+                        '--build-timeout'
+                    ],
+                    'help': 'Number of seconds a single build may run for'
+                            ' before all of its processes are killed.',
+                    'type': int,
+                    'default': None
+                },
+                'build_cpu_limit': {
+                    'commands': [
+                        '--build-cpu-limit'
+                    ],
+                    'help': 'Number of CPU seconds any single process of a'
+                            ' build may use.',
+                    'type': int,
+                    'default': None
+                },
+                'build_memory_limit': {
+                    'commands': [
+                        '--build-memory-limit'
+                    ],
+                    'help': 'Number of megabytes of memory any single'
+                            ' process of a build may use.',
+                    'type': int,
+                    'default': None
+                },
+                'build_limits_file': {
+                    'commands': [
+                        '--build-limits-file'
+                    ],
+                    'help': 'Path to a JSON file of package name patterns'
+                            ' and the "timeout", "cpu" and "memory" limits'
+                            ' that override the global limits for matching'
+                            ' packages.',
+                    'default': None
+                },
+                'journal_file': {
+                    'commands': [
+                        '--journal-file'
+                    ],
+                    'help': 'Path to a journal file where the outcome of'
+                            ' every package build is recorded. Wheels that'
+                            ' have been built but not stored are kept in the'
+                            ' build output when the build fails.',
+                    'default': None
+                },
+                'resume': {
+                    'commands': [
+                        '--resume'
+                    ],
+                    'help': 'Resume an interrupted build using the journal'
+                            ' file. Packages already stored from the same'
+                            ' inputs are skipped, and wheels that were built'
+                            ' but not stored are stored and linked.',
+                    'action': 'store_true',
+                    'default': False
+                },
                 'duplicate_handling': {
                     'commands': [
                         '--duplicate-handling'
@@ -244,6 +609,20 @@ ARGUMENTS_DICT = {
                     'action': 'store_true',
                     'default': False
                 },
+                'pip_bulk_bisect': {
+                    'commands': [
+                        '--pip-bulk-bisect'
+                    ],
+                    'help': 'When a bulk operation fails, split the failed'
+                            ' batch in half and build each half again until'
+                            ' the failing packages are isolated. Every'
+                            ' package that can be built is built and the'
+                            ' failures are written to "build_failures.txt"'
+                            ' within the link directory, which is removed at'
+                            ' the start of every run.',
+                    'action': 'store_true',
+                    'default': False
+                },
                 'pip_index': {
                     'commands': [
                         '--pip-index'
@@ -348,6 +727,174 @@ ARGUMENTS_DICT = {
                     'action': 'store_true',
                     'default': False
                 },
+                'shard': {
+                    'commands': [
+                        '--shard'
+                    ],
+                    'help': 'Only build the packages assigned to a given'
+                            ' shard, in the format "i/n", where "i" is the'
+                            ' shard number and "n" is the total number of'
+                            ' shards. Packages are assigned to shards by a'
+                            ' stable hash of their name.',
+                    'default': None
+                },
+                'shard_weights': {
+                    'commands': [
+                        '--shard-weights'
+                    ],
+                    'help': 'Path to a JSON file containing the historical'
+                            ' build cost of packages, by name, or to a'
+                            ' metrics directory. When set, packages are'
+                            ' assigned to shards to balance the total build'
+                            ' cost of every shard.',
+                    'default': None
+                },
+                'build_pipeline': {
+                    'commands': [
+                        '--build-pipeline'
+                    ],
+                    'help': 'Build, verify, publish and link packages as a'
+                            ' pipeline so the wheels of every package are'
+                            ' published as soon as they are built. Has no'
+                            ' effect on bulk pip operations.',
+                    'action': 'store_true',
+                    'default': False
+                },
+                'pipeline_queue_size': {
+                    'commands': [
+                        '--pipeline-queue-size'
+                    ],
+                    'help': 'Number of packages that can wait between two'
+                            ' pipeline stages. Default: %(default)s',
+                    'type': int,
+                    'default': 4
+                },
+                'publish_workers': {
+                    'commands': [
+                        '--publish-workers'
+                    ],
+                    'help': 'Number of threads verifying and publishing'
+                            ' wheels within the pipeline.'
+                            ' Default: %(default)s',
+                    'type': int,
+                    'default': 2
+                },
+                'build_env_dir': {
+                    'commands': [
+                        '--build-env-dir'
+                    ],
+                    'help': 'Path to the persistent build environments. When'
+                            ' set, packages are built with the pip of a'
+                            ' virtual environment pre-seeded with their'
+                            ' build requirements, using'
+                            ' "--no-build-isolation".',
+                    'default': None
+                },
+                'build_python': {
+                    'commands': [
+                        '--build-python'
+                    ],
+                    'help': 'Interpreter the build environments are created'
+                            ' from. Default: %(default)s',
+                    'default': 'python'
+                },
+                'build_env_requirements': {
+                    'commands': [
+                        '--build-env-requirements'
+                    ],
+                    'help': 'Requirements installed into every build'
+                            ' environment. Default: %(default)s',
+                    'nargs': '+',
+                    'default': [
+                        'setuptools',
+                        'wheel',
+                        'pbr'
+                    ]
+                },
+                'tree_cache': {
+                    'commands': [
+                        '--tree-cache'
+                    ],
+                    'help': 'Path to a persistent cache of the wheels built'
+                            ' from git packages. Wheels are cached by the'
+                            ' git tree of the package directory, so'
+                            ' unchanged branches and tags are not built'
+                            ' again.',
+                    'default': None
+                },
+                'compiler_cache': {
+                    'commands': [
+                        '--compiler-cache'
+                    ],
+                    'help': 'Path to a persistent compiler cache. When set,'
+                            ' C extensions are compiled through ccache with'
+                            ' this cache directory and in parallel.',
+                    'default': None
+                },
+                'compile_jobs': {
+                    'commands': [
+                        '--compile-jobs'
+                    ],
+                    'help': 'Number of parallel compile jobs for every'
+                            ' build. Default is the number of CPUs divided'
+                            ' by "--build-workers".',
+                    'type': int,
+                    'default': None
+                },
+                'source_cache': {
+                    'commands': [
+                        '--source-cache'
+                    ],
+                    'help': 'Path to a persistent source cache. When set,'
+                            ' the sources of every package are downloaded'
+                            ' into the cache before building and the builds'
+                            ' find them with "--find-links". Only packages'
+                            ' pinned to an exact version with "==" are'
+                            ' resolved from the cache alone, every other'
+                            ' package is resolved against the package index'
+                            ' so a newer release is always found.',
+                    'default': None
+                },
+                'prefetch_workers': {
+                    'commands': [
+                        '--prefetch-workers'
+                    ],
+                    'help': 'Number of concurrent source downloads.'
+                            ' Default: %(default)s',
+                    'type': int,
+                    'default': 8
+                },
+                'source_cache_refresh': {
+                    'commands': [
+                        '--source-cache-refresh'
+                    ],
+                    'help': 'Resolve every package against the package index'
+                            ' even when it is pinned and the source cache can'
+                            ' satisfy it.',
+                    'action': 'store_true',
+                    'default': False
+                },
+                'source_cache_offline': {
+                    'commands': [
+                        '--source-cache-offline'
+                    ],
+                    'help': 'Build with "--no-index" when the sources of'
+                            ' every package were found in, or fetched into,'
+                            ' the source cache.',
+                    'action': 'store_true',
+                    'default': False
+                },
+                'enqueue': {
+                    'commands': [
+                        '--enqueue'
+                    ],
+                    'help': 'Write a job for every package into the work'
+                            ' queue, set with "--queue-file", instead of'
+                            ' building it. The jobs are built by running'
+                            ' any number of "build-worker" processes.',
+                    'action': 'store_true',
+                    'default': False
+                },
                 'disable_version_sanity': {
                     'commands': [
                         '--disable-version-sanity'
@@ -369,9 +916,181 @@ ARGUMENTS_DICT = {
                 'git_repo_path'
             ]
         },
+        'build-worker': {
+            'help': 'Build the jobs written into a work queue by'
+                    ' "build-wheels --enqueue".',
+            'shared_args': [
+                'queue_file',
+                'metrics_dir'
+            ],
+            'optional_args': {
+                'build_output': {
+                    'commands': [
+                        '--build-output'
+                    ],
+                    'help': 'Path to the location where the built Python'
+                            ' package files will be stored. Default is the'
+                            ' path used by the producer.',
+                    'default': None
+                },
+                'build_dir': {
+                    'commands': [
+                        '--build-dir'
+                    ],
+                    'help': 'Path to temporary build directory. Default is'
+                            ' the path used by the producer.',
+                    'default': None
+                },
+                'lease_time': {
+                    'commands': [
+                        '--lease-time'
+                    ],
+                    'help': 'Number of seconds a claimed job is leased for.'
+                            ' The lease is renewed while the job is being'
+                            ' built. Jobs whose lease expires are given to'
+                            ' another worker. Default: %(default)s',
+                    'type': int,
+                    'default': 300
+                },
+                'max_attempts': {
+                    'commands': [
+                        '--max-attempts'
+                    ],
+                    'help': 'Number of times a job is claimed before it is'
+                            ' marked as failed. Default: %(default)s',
+                    'type': int,
+                    'default': 3
+                },
+                'poll_interval': {
+                    'commands': [
+                        '--poll-interval'
+                    ],
+                    'help': 'Number of seconds to wait between checks of an'
+                            ' empty queue. Default: %(default)s',
+                    'type': int,
+                    'default': 5
+                },
+                'keep_running': {
+                    'commands': [
+                        '--keep-running'
+                    ],
+                    'help': 'Keep polling the queue after all jobs have'
+                            ' been built instead of exiting.',
+                    'action': 'store_true',
+                    'default': False
+                }
+            }
+        },
+        'merge-pools': {
+            'help': 'Merge the storage pools and link directories of'
+                    ' multiple build shards.',
+            'shared_args': [
+                'hash_cache'
+            ],
+            'optional_args': {
+                'source_pools': {
+                    'commands': [
+                        '--source-pools'
+                    ],
+                    'help': 'Path to the storage pools to merge.',
+                    'nargs': '+',
+                    'required': True
+                },
+                'source_link_dirs': {
+                    'commands': [
+                        '--source-link-dirs'
+                    ],
+                    'help': 'Path to the link directories to merge.',
+                    'nargs': '+',
+                    'default': list()
+                },
+                'storage_pool': {
+                    'commands': [
+                        '--storage-pool'
+                    ],
+                    'help': 'Path to the storage pool that all of the source'
+                            ' pools will be merged into.',
+                    'required': True
+                },
+                'link_dir': {
+                    'commands': [
+                        '--link-dir'
+                    ],
+                    'help': 'Path to the link directory that all of the'
+                            ' source link directories will be merged into.',
+                    'default': None
+                },
+                'ignore_conflicts': {
+                    'commands': [
+                        '--ignore-conflicts'
+                    ],
+                    'help': 'When the same file is found with different'
+                            ' content in more than one pool, or in the'
+                            ' destination pool, keep the file already in the'
+                            ' destination pool or use the file from the'
+                            ' first pool instead of failing.',
+                    'action': 'store_true',
+                    'default': False
+                }
+            }
+        },
+        'build-stats': {
+            'help': 'Rank the packages of the latest build run by cost or'
+                    ' compare the last two runs.',
+            'optional_args': {
+                'metrics_files': {
+                    'commands': [
+                        '--metrics-files'
+                    ],
+                    'help': 'Path to the metrics files, or the metrics'
+                            ' directories, of the runs to report on.',
+                    'nargs': '+',
+                    'required': True
+                },
+                'sort': {
+                    'commands': [
+                        '--sort'
+                    ],
+                    'help': 'Metric used to rank packages.'
+                            ' Default: %(default)s',
+                    'choices': [
+                        'wall',
+                        'cpu',
+                        'rss',
+                        'bytes'
+                    ],
+                    'default': 'wall'
+                },
+                'limit': {
+                    'commands': [
+                        '--limit'
+                    ],
+                    'help': 'Number of packages to show.'
+                            ' Default: %(default)s',
+                    'type': int,
+                    'default': 25
+                },
+                'compare': {
+                    'commands': [
+                        '--compare'
+                    ],
+                    'help': 'Compare the latest run to the run before it'
+                            ' instead of ranking the latest run.',
+                    'action': 'store_true',
+                    'default': False
+                }
+            }
+        },
         'create-html-indexes': {
             'help': 'Create an HTML index file for all folders and files'
                     ' recursively within a repo path.',
+            'shared_args': [
+                'publish_root',
+                'keep_generations',
+                'index_state_file',
+                'hash_cache',
+                'index_workers'
+            ],
             'optional_args': {
                 'repo_dir': {
                     'commands': [
@@ -391,6 +1110,53 @@ ARGUMENTS_DICT = {
                     'default': list()
                 }
             }
+        },
+        'create-simple-index': {
+            'help': 'Create a PEP 503 simple index, with PEP 658 metadata'
+                    ' files, of all of the wheels within a storage pool.',
+            'shared_args': [
+                'publish_root',
+                'keep_generations',
+                'hash_cache',
+                'index_workers'
+            ],
+            'optional_args': {
+                'storage_pool': {
+                    'commands': [
+                        '--storage-pool'
+                    ],
+                    'help': 'Path to the storage pool of the wheels.',
+                    'required': True,
+                    'default': None
+                },
+                'simple_dir': {
+                    'commands': [
+                        '--simple-dir'
+                    ],
+                    'help': 'Path to the directory the simple index is'
+                            ' created within.',
+                    'required': True,
+                    'default': None
+                }
+            }
+        },
+        'rollback-publish': {
+            'help': 'Make an earlier published generation the current'
+                    ' generation.',
+            'shared_args': [
+                'publish_root'
+            ],
+            'optional_args': {
+                'generation': {
+                    'commands': [
+                        '--generation'
+                    ],
+                    'help': 'Name of the generation to make current.'
+                            ' Default is the generation before the current'
+                            ' one.',
+                    'default': None
+                }
+            }
         }
     }
 }
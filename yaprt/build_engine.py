@@ -0,0 +1,345 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""In process PEP 517 build engine.
+
+The build engine calls the ``build_wheel`` hook of a source tree's build
+backend directly from within a long lived worker process. This
+avoids starting a new ``pip`` process, and all of its index and resolver
+setup, for every package. Only local source trees whose build requirements
+are already satisfied by the running interpreter can be built by the engine,
+everything else is expected to fall back to ``pip``.
+
+Every build runs within a private copy of its source tree which is removed
+once the build has finished, so the ``build`` and ``.egg-info`` directories a
+backend writes never reach the source tree, or another build of it.
+"""
+
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from cloudlib import logger
+import pkg_resources
+
+from yaprt import supervisor
+from yaprt import tracing
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+# Backend used by PEP 517 when a source tree does not define its own.
+DEFAULT_BACKEND = 'setuptools.build_meta:__legacy__'
+
+# Build requirements assumed by PEP 518 when a source tree has no
+# ``pyproject.toml``.
+DEFAULT_REQUIRES = ['setuptools', 'wheel']
+
+
+def read_build_system(source_dir):
+    """Return the ``build-system`` table of a source tree.
+
+    Only the ``requires``, ``build-backend`` and ``backend-path`` keys are
+    read from the ``pyproject.toml`` file. If the file is not found the PEP
+    517 and PEP 518 defaults are returned.
+
+    :param source_dir: $PATH to the source tree.
+    :type source_dir: ``str``
+    :returns: ``dict``
+    """
+    build_system = {
+        'requires': list(DEFAULT_REQUIRES),
+        'build-backend': DEFAULT_BACKEND,
+        'backend-path': list()
+    }
+    pyproject = os.path.join(source_dir, 'pyproject.toml')
+    if not os.path.isfile(pyproject):
+        return build_system
+
+    with open(pyproject, 'r') as f:
+        section = re.search(
+            r'^\[build-system\]\s*$(.*?)(?=^\[|\Z)',
+            f.read(),
+            re.M | re.S
+        )
+
+    if not section:
+        return build_system
+    else:
+        section = section.group(1)
+
+    for key in ['requires', 'backend-path']:
+        value = re.search(r'^%s\s*=\s*\[(.*?)\]' % key, section, re.M | re.S)
+        if value:
+            build_system[key] = re.findall(
+                r'["\']([^"\']*)["\']',
+                value.group(1)
+            )
+
+    backend = re.search(
+        r'^build-backend\s*=\s*["\']([^"\']+)["\']',
+        section,
+        re.M
+    )
+    if backend:
+        build_system['build-backend'] = backend.group(1)
+
+    return build_system
+
+
+def requirements_satisfied(requires):
+    """Return ``True`` if all build requirements are installed.
+
+    :param requires: List of build requirements.
+    :type requires: ``list``
+    :returns: ``bol``
+    """
+    try:
+        for requirement in pkg_resources.parse_requirements(requires):
+            marker = getattr(requirement, 'marker', None)
+            if marker and not marker.evaluate():
+                continue
+            pkg_resources.get_distribution(requirement)
+    except (pkg_resources.ResolutionError, ValueError) as exp:
+        LOG.debug('Build requirements not satisfied: %s', exp)
+        return False
+    else:
+        return True
+
+
+def _load_backend(build_backend):
+    """Return the backend object for a ``build-backend`` string.
+
+    :param build_backend: Backend in "module:object" notation.
+    :type build_backend: ``str``
+    :returns: ``object``
+    """
+    module_name, _, object_path = build_backend.partition(':')
+    backend = __import__(module_name, fromlist=['__name__'])
+    if object_path:
+        for attribute in object_path.split('.'):
+            backend = getattr(backend, attribute)
+    return backend
+
+
+def _evict_modules(source_dir):
+    """Remove the modules imported from within a source tree.
+
+    In-tree backends, and the modules a ``setup.py`` imports from its own
+    tree, would otherwise be reused by the next build of the worker.
+
+    :param source_dir: $PATH to the source tree.
+    :type source_dir: ``str``
+    """
+    source_dir = os.path.join(os.path.realpath(source_dir), '')
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, '__file__', None)
+        if module_file and os.path.realpath(module_file).startswith(
+                source_dir):
+            del sys.modules[name]
+
+    for path in list(sys.path_importer_cache):
+        if os.path.join(os.path.realpath(path), '').startswith(source_dir):
+            del sys.path_importer_cache[path]
+
+
+def _reset_distutils():
+    """Forget the directories distutils has created in earlier builds.
+
+    ``distutils.dir_util`` skips creating any directory it has created
+    before, even once it has been removed, which breaks the next build
+    within the same path.
+    """
+    for name in ['distutils.dir_util', 'setuptools._distutils.dir_util']:
+        module = sys.modules.get(name)
+        if module and hasattr(module, '_path_created'):
+            module._path_created.clear()
+
+
+def _backend_build_wheel(source_dir, wheel_dir, build_backend, backend_path):
+    """Run the ``build_wheel`` hook for a source tree.
+
+    This function is run within a worker process and builds within a copy of
+    the source tree. All output written by the backend is captured in a
+    temporary file so that it can be returned when the build fails.
+
+    :param source_dir: $PATH to the source tree.
+    :type source_dir: ``str``
+    :param wheel_dir: $PATH where the built wheel will be written.
+    :type wheel_dir: ``str``
+    :param build_backend: Backend in "module:object" notation.
+    :type build_backend: ``str``
+    :param backend_path: List of in-tree paths to load the backend from.
+    :type backend_path: ``list``
+    :returns: ``tuple``
+    """
+    cwd = os.getcwd()
+    sys_path = list(sys.path)
+    saved_fds = [os.dup(1), os.dup(2)]
+    copy_dir = tempfile.mkdtemp(prefix='yaprt_engine_')
+    build_dir = os.path.join(copy_dir, os.path.basename(source_dir))
+    with tempfile.TemporaryFile() as output:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(output.fileno(), 1)
+        os.dup2(output.fileno(), 2)
+        try:
+            shutil.copytree(source_dir, build_dir, symlinks=True)
+            os.chdir(build_dir)
+            sys.path[:0] = [os.path.join(build_dir, i) for i in backend_path]
+            backend = _load_backend(build_backend=build_backend)
+            wheel_name = backend.build_wheel(wheel_dir)
+        except (Exception, SystemExit) as exp:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            output.seek(0)
+            return None, '%s, Output: %s' % (exp, output.read()[-4096:])
+        else:
+            return wheel_name, None
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            for fd in saved_fds:
+                os.close(fd)
+            sys.path[:] = sys_path
+            # Relative module paths are resolved against the original cwd.
+            os.chdir(cwd)
+            _evict_modules(source_dir=build_dir)
+            _reset_distutils()
+            shutil.rmtree(copy_dir, ignore_errors=True)
+
+
+class BuildEngine(object):
+    """Build wheels by calling PEP 517 backend hooks in a worker process.
+
+    Builds run one at a time, the worker only saves starting a new ``pip``
+    process for every package.
+
+    Example:
+        >>> engine = BuildEngine()
+        >>> if engine.can_build(source_dir='/opt/git/nova'):
+        ...     engine.build(source_dir='/opt/git/nova', wheel_dir='/tmp/w')
+        'nova-2015.1.0-py2-none-any.whl'
+        >>> engine.close()
+    """
+    def __init__(self, builds_per_worker=50):
+        """Start the worker process.
+
+        The worker is recycled after ``builds_per_worker`` builds which
+        limits the amount of module state a backend can leak between builds.
+
+        :param builds_per_worker: Number of builds before a worker restarts.
+        :type builds_per_worker: ``int``
+        """
+        self.builds_per_worker = builds_per_worker
+        self.pool = self._start_pool()
+
+    def _start_pool(self):
+        """Return a new pool of a single worker process.
+
+        :returns: ``multiprocessing.Pool``
+        """
+        return multiprocessing.Pool(
+            processes=1,
+            maxtasksperchild=self.builds_per_worker
+        )
+
+    @staticmethod
+    def can_build(source_dir):
+        """Return ``True`` if a source tree can be built by the engine.
+
+        :param source_dir: $PATH to the source tree.
+        :type source_dir: ``str``
+        :returns: ``bol``
+        """
+        if not os.path.isdir(source_dir):
+            return False
+
+        has_pyproject = os.path.isfile(
+            os.path.join(source_dir, 'pyproject.toml')
+        )
+        has_setup = os.path.isfile(os.path.join(source_dir, 'setup.py'))
+        if not has_pyproject and not has_setup:
+            return False
+
+        build_system = read_build_system(source_dir=source_dir)
+        return requirements_satisfied(requires=build_system['requires'])
+
+    def build(self, source_dir, wheel_dir, timeout=None):
+        """Build a wheel from a local source tree.
+
+        If the build does not finish within the timeout the worker is
+        killed and a new one is started.
+
+        :param source_dir: $PATH to the source tree.
+        :type source_dir: ``str``
+        :param wheel_dir: $PATH where the built wheel will be written.
+        :type wheel_dir: ``str``
+        :param timeout: Number of seconds the build may run for.
+        :type timeout: ``int``
+        :returns: ``str``
+        """
+        build_system = read_build_system(source_dir=source_dir)
+        LOG.info(
+            'Building [ %s ] with backend [ %s ]',
+            source_dir,
+            build_system['build-backend']
+        )
+        if not os.path.isdir(wheel_dir):
+            os.makedirs(wheel_dir)
+
+        result = self.pool.apply_async(
+            _backend_build_wheel,
+            (
+                os.path.abspath(source_dir),
+                os.path.abspath(wheel_dir),
+                build_system['build-backend'],
+                build_system['backend-path']
+            )
+        )
+        try:
+            with tracing.span('backend_build', 'build', source_dir=source_dir):
+                wheel_name, error = result.get(timeout)
+        except multiprocessing.TimeoutError:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = self._start_pool()
+            raise supervisor.BuildTimeout(
+                'Backend build exceeded its timeout of %s seconds: [ %s ]',
+                timeout,
+                source_dir
+            )
+
+        if error:
+            raise utils.AError(
+                'Backend build failed for [ %s ]. Error: %s',
+                source_dir,
+                error
+            )
+        else:
+            LOG.debug('Backend build success for: "%s"', wheel_name)
+            return wheel_name
+
+    def close(self):
+        """Stop the worker process."""
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,240 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Persistent virtual environments pre-seeded with build requirements.
+
+A build environment is created once for every interpreter and set of build
+requirements and is then reused by every build that needs the same set. The
+name of an environment is a hash of the interpreter version and the build
+requirements, so changing either creates a new environment and leaves the
+old one in place for builds that still use it.
+
+An environment is only used once its ``.yaprt-ready`` marker has been
+written. Creating an environment holds a lock so build workers sharing a
+host never create the same environment at the same time.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+
+from cloudlib import logger
+from cloudlib import shell
+
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+# Requirements installed into every build environment.
+DEFAULT_REQUIREMENTS = ['setuptools', 'wheel', 'pbr']
+
+READY_MARKER = '.yaprt-ready'
+
+
+class BuildEnvironments(object):
+    """Create and reuse build environments.
+
+    Example:
+        >>> envs = BuildEnvironments(envs_dir='/var/cache/yaprt/envs')
+        >>> env_dir = envs.get(requires=['cython'])
+        >>> envs.env_pip(env_dir=env_dir)
+        '/var/cache/yaprt/envs/python2.7-3f2a.../bin/pip'
+    """
+    def __init__(self, envs_dir, python='python', requirements=None,
+                 pip_args=None, debug=False):
+        """Set up the build environments.
+
+        :param envs_dir: $PATH to the directory holding the environments.
+        :type envs_dir: ``str``
+        :param python: Interpreter the environments are created from.
+        :type python: ``str``
+        :param requirements: Requirements installed into every environment.
+        :type requirements: ``list``
+        :param pip_args: Index and link arguments used when installing.
+        :type pip_args: ``list``
+        :param debug: Enable debug mode for the install commands.
+        :type debug: ``bol``
+        """
+        self.envs_dir = utils.get_abs_path(file_name=envs_dir)
+        self.python = python
+        self.requirements = requirements or list(DEFAULT_REQUIREMENTS)
+        self.pip_args = pip_args or list()
+        self.shell_cmds = shell.ShellCommands(
+            log_name='repo_builder',
+            debug=debug
+        )
+        self._interpreter = None
+        self._ready = dict()
+        if not os.path.isdir(self.envs_dir):
+            os.makedirs(self.envs_dir)
+
+    def _run(self, command):
+        """Run a command, raising ``utils.AError`` if it fails.
+
+        :param command: list object containing parts of a shell command.
+        :type command: ``list``
+        """
+        data, success = self.shell_cmds.run_command(command=' '.join(command))
+        if not success:
+            raise utils.AError(
+                'Build environment command failed [ %s ]: %s',
+                ' '.join(command),
+                data
+            )
+
+    def interpreter(self):
+        """Return the version and name of the build interpreter.
+
+        :returns: ``tuple``
+        """
+        if not self._interpreter:
+            try:
+                data = subprocess.check_output(
+                    [
+                        self.python,
+                        '-c',
+                        'import sys; print(sys.version);'
+                        ' print(sys.version_info[0]);'
+                        ' print(sys.version_info[1])'
+                    ]
+                )
+            except (OSError, subprocess.CalledProcessError) as exp:
+                raise utils.AError(
+                    'Build interpreter [ %s ] can not be run: %s',
+                    self.python,
+                    exp
+                )
+            lines = data.strip().splitlines()
+            self._interpreter = (
+                '\n'.join(lines[:-2]),
+                'python%s.%s' % (lines[-2], lines[-1])
+            )
+        return self._interpreter
+
+    def requirement_set(self, requires=None):
+        """Return the sorted build requirements of an environment.
+
+        :param requires: Build requirements on top of the default ones.
+        :type requires: ``list``
+        :returns: ``list``
+        """
+        return sorted(set(self.requirements + list(requires or list())))
+
+    def env_dir(self, requires=None):
+        """Return the path of the environment for a set of requirements.
+
+        :param requires: Build requirements on top of the default ones.
+        :type requires: ``list``
+        :returns: ``str``
+        """
+        version, name = self.interpreter()
+        key = hashlib.sha256(
+            json.dumps(
+                {
+                    'python': version,
+                    'requirements': self.requirement_set(requires=requires),
+                    'pip_args': self.pip_args
+                },
+                sort_keys=True
+            )
+        ).hexdigest()[:16]
+        return os.path.join(self.envs_dir, '%s-%s' % (name, key))
+
+    def get(self, requires=None):
+        """Return the path of a ready environment, creating it if needed.
+
+        :param requires: Build requirements on top of the default ones.
+        :type requires: ``list``
+        :returns: ``str``
+        """
+        env_dir = self.env_dir(requires=requires)
+        if env_dir in self._ready:
+            return env_dir
+
+        with open('%s.lock' % env_dir, 'wb') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.isfile(os.path.join(env_dir, READY_MARKER)):
+                    self._create(env_dir=env_dir, requires=requires)
+                else:
+                    LOG.debug('Reusing build environment [ %s ]', env_dir)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        self._ready[env_dir] = True
+        return env_dir
+
+    def _create(self, env_dir, requires=None):
+        """Create an environment and install the build requirements.
+
+        :param env_dir: $PATH of the environment.
+        :type env_dir: ``str``
+        :param requires: Build requirements on top of the default ones.
+        :type requires: ``list``
+        """
+        # A partially created environment is never reused.
+        if os.path.isdir(env_dir):
+            shutil.rmtree(env_dir)
+
+        requirements = self.requirement_set(requires=requires)
+        LOG.info(
+            'Creating build environment [ %s ] with %s', env_dir, requirements
+        )
+        try:
+            self._run(command=[self.python, '-m', 'venv', env_dir])
+        except utils.AError:
+            # Interpreters without venv, IE: python2, use virtualenv.
+            self._run(command=['virtualenv', '-p', self.python, env_dir])
+
+        command = [self.env_pip(env_dir=env_dir), 'install', '--upgrade']
+        command.extend(self.pip_args)
+        command.extend(['"%s"' % i for i in requirements])
+        self._run(command=command)
+
+        with open(os.path.join(env_dir, READY_MARKER), 'wb') as f:
+            f.write(
+                json.dumps(
+                    {
+                        'python': self.interpreter()[0],
+                        'requirements': requirements
+                    },
+                    sort_keys=True
+                )
+            )
+
+    @staticmethod
+    def env_pip(env_dir):
+        """Return the path to pip within an environment.
+
+        :param env_dir: $PATH of the environment.
+        :type env_dir: ``str``
+        :returns: ``str``
+        """
+        return os.path.join(env_dir, 'bin', 'pip')
+
+    @staticmethod
+    def env_python(env_dir):
+        """Return the path to python within an environment.
+
+        :param env_dir: $PATH of the environment.
+        :type env_dir: ``str``
+        :returns: ``str``
+        """
+        return os.path.join(env_dir, 'bin', 'python')
@@ -0,0 +1,410 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Record and report the cost of build operations.
+
+Every measured operation records its wall time, the user and system CPU time
+used by yaprt and all of the processes it waited for, the peak resident set
+size of the build commands it ran, and the number and size of the files it
+produced. All of the operations of a run are written to a single json file
+which can be ranked and compared with ``build_stats``.
+"""
+
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+from cloudlib import logger
+
+from yaprt import tracing
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+# Operations that build wheels, used to rank and estimate packages.
+BUILD_OPERATIONS = ['pip_build_wheels', 'setup_build_wheels']
+
+SORT_KEYS = {
+    'wall': 'wall_time',
+    'cpu': 'cpu_time',
+    'rss': 'peak_rss',
+    'bytes': 'bytes'
+}
+
+
+def _cpu_times():
+    """Return the user and system CPU time of this process and its children.
+
+    :returns: ``tuple``
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + children.ru_utime, own.ru_stime + children.ru_stime
+
+
+def _list_files(path):
+    """Return a ``dict`` of file names and sizes within a directory.
+
+    :param path: $PATH to a directory.
+    :type path: ``str``
+    :returns: ``dict``
+    """
+    files = dict()
+    if path and os.path.isdir(path):
+        for file_name in os.listdir(path):
+            full_path = os.path.join(path, file_name)
+            if os.path.isfile(full_path):
+                files[file_name] = os.path.getsize(full_path)
+    return files
+
+
+class BuildMetrics(object):
+    """Measure build operations and write them to a metrics file.
+
+    Example:
+        >>> metrics = BuildMetrics(metrics_dir='/var/log/yaprt')
+        >>> with metrics.measure('pip_build_wheels', package='six',
+        ...                      output_dir='/tmp/output'):
+        ...     build_things()
+        >>> metrics.save()
+    """
+    def __init__(self, metrics_dir=None):
+        """Start a new run.
+
+        When no metrics directory is given nothing is measured or written.
+
+        :param metrics_dir: $PATH to the directory where metrics are written.
+        :type metrics_dir: ``str``
+        """
+        self.enabled = bool(metrics_dir)
+        self.started = time.time()
+        if self.enabled:
+            self.metrics_dir = utils.get_abs_path(file_name=metrics_dir)
+            self.metrics_file = os.path.join(
+                self.metrics_dir,
+                'build-metrics-%s-%d.json' % (
+                    time.strftime('%Y%m%d%H%M%S', time.gmtime(self.started)),
+                    os.getpid()
+                )
+            )
+        self.operations = list()
+        # Compiler cache usage of the run, set when a compiler cache is used.
+        self.compiler_cache = None
+        self._local = threading.local()
+
+    @property
+    def _active(self):
+        """Return the ``list`` of operations being measured by this thread.
+
+        :returns: ``list``
+        """
+        if not hasattr(self._local, 'active'):
+            self._local.active = list()
+        return self._local.active
+
+    @contextlib.contextmanager
+    def measure(self, operation, package=None, name=None, output_dir=None):
+        """Measure an operation.
+
+        New files found within the output directory once the operation has
+        finished are counted as the files it produced. The yielded ``dict``
+        can be updated by the operation to add to what was measured. Every
+        operation is also traced, even when metrics are not enabled.
+
+        :param operation: Name of the operation.
+        :type operation: ``str``
+        :param package: Package, or requirements file, being operated on.
+        :type package: ``str``
+        :param name: Name of the package being operated on.
+        :type name: ``str``
+        :param output_dir: $PATH to where the operation writes files.
+        :type output_dir: ``str``
+        """
+        entry = {
+            'operation': operation,
+            'package': package,
+            'name': name,
+            'success': True,
+            'peak_rss': 0,
+            'wheels': 0,
+            'bytes': 0,
+            'depth': len(self._active)
+        }
+        with tracing.span(operation, 'build', package=package):
+            if self.enabled:
+                with self._measure(entry=entry, output_dir=output_dir):
+                    yield entry
+            else:
+                yield entry
+
+    @contextlib.contextmanager
+    def _measure(self, entry, output_dir):
+        """Measure the resources used while an operation runs.
+
+        :param entry: Operation being measured.
+        :type entry: ``dict``
+        :param output_dir: $PATH to where the operation writes files.
+        :type output_dir: ``str``
+        """
+        before = _list_files(path=output_dir)
+        utime, stime = _cpu_times()
+        start = time.time()
+        self._active.append(entry)
+        try:
+            yield entry
+        except (Exception, SystemExit) as exp:
+            entry['success'] = False
+            entry['failure'] = getattr(exp, 'failure_class', 'error')
+            raise
+        finally:
+            self._active.remove(entry)
+            end_utime, end_stime = _cpu_times()
+            entry['start'] = start
+            entry['wall_time'] = time.time() - start
+            entry['user_time'] = end_utime - utime
+            entry['system_time'] = end_stime - stime
+            entry['cpu_time'] = entry['user_time'] + entry['system_time']
+            if output_dir:
+                after = _list_files(path=output_dir)
+                new_files = [i for i in after if after[i] != before.get(i)]
+                entry['wheels'] += len(new_files)
+                entry['bytes'] += sum([after[i] for i in new_files])
+            self.operations.append(entry)
+
+    def add_usage(self, usage):
+        """Add the resource usage of a finished command.
+
+        The usage is added to every operation that is being measured.
+
+        :param usage: Resource usage returned by ``os.wait4``.
+        :type usage: ``resource.struct_rusage``
+        """
+        # ru_maxrss is reported in kilobytes on Linux.
+        peak_rss = usage.ru_maxrss * 1024
+        for entry in self._active:
+            entry['peak_rss'] = max(entry['peak_rss'], peak_rss)
+
+    def save(self):
+        """Write all of the measured operations to the metrics file."""
+        if not self.enabled or not self.operations:
+            return
+
+        if not os.path.isdir(self.metrics_dir):
+            os.makedirs(self.metrics_dir)
+
+        run = {
+            'started': self.started,
+            'finished': time.time(),
+            'argv': sys.argv,
+            'operations': self.operations
+        }
+        if self.compiler_cache:
+            run['compiler_cache'] = self.compiler_cache
+        with open(self.metrics_file, 'wb') as f:
+            f.write(json.dumps(run, indent=2, sort_keys=True))
+        LOG.info('Build metrics written to [ %s ]', self.metrics_file)
+
+
+def load_runs(paths):
+    """Return a ``list`` of runs loaded from metrics files, oldest first.
+
+    :param paths: List of metrics files or directories that contain them.
+    :type paths: ``list``
+    :returns: ``list``
+    """
+    metrics_files = list()
+    for path in paths:
+        path = utils.get_abs_path(file_name=path)
+        if os.path.isdir(path):
+            metrics_files.extend(
+                [
+                    os.path.join(path, i) for i in os.listdir(path)
+                    if i.startswith('build-metrics-') and i.endswith('.json')
+                ]
+            )
+        else:
+            metrics_files.append(path)
+
+    runs = list()
+    for metrics_file in metrics_files:
+        with open(metrics_file, 'rb') as f:
+            run = json.loads(f.read())
+        run['metrics_file'] = metrics_file
+        runs.append(run)
+
+    return sorted(runs, key=lambda i: i['started'])
+
+
+def package_totals(run):
+    """Return a ``dict`` of package names and the cost of building them.
+
+    Operations run within another operation are not counted twice, only the
+    outermost operation is used.
+
+    :param run: Loaded metrics run.
+    :type run: ``dict``
+    :returns: ``dict``
+    """
+    totals = dict()
+    for entry in run['operations']:
+        if entry['operation'] not in BUILD_OPERATIONS or entry['depth']:
+            continue
+
+        name = entry['name'] or entry['package']
+        total = totals.setdefault(
+            name,
+            {
+                'name': name,
+                'wall_time': 0.0,
+                'cpu_time': 0.0,
+                'peak_rss': 0,
+                'wheels': 0,
+                'bytes': 0,
+                'success': True
+            }
+        )
+        total['peak_rss'] = max(total['peak_rss'], entry['peak_rss'])
+        total['success'] = total['success'] and entry['success']
+        for key in ['wall_time', 'cpu_time', 'wheels', 'bytes']:
+            total[key] += entry[key]
+
+    return totals
+
+
+def package_costs(paths):
+    """Return a ``dict`` of package names and their average build time.
+
+    :param paths: List of metrics files or directories that contain them.
+    :type paths: ``list``
+    :returns: ``dict``
+    """
+    costs = dict()
+    for run in load_runs(paths=paths):
+        for name, total in package_totals(run=run).items():
+            costs.setdefault(name, list()).append(total['wall_time'])
+
+    return dict([(k, sum(v) / len(v)) for k, v in costs.items()])
+
+
+def package_failures(paths):
+    """Return a ``set`` of the package names whose latest build failed.
+
+    :param paths: List of metrics files or directories that contain them.
+    :type paths: ``list``
+    :returns: ``set``
+    """
+    latest = dict()
+    for run in load_runs(paths=paths):
+        for name, total in package_totals(run=run).items():
+            latest[name] = total['success']
+
+    return set([k for k, v in latest.items() if not v])
+
+
+def _format_size(size):
+    """Return a human readable size.
+
+    :param size: Size in bytes.
+    :type size: ``int``
+    :returns: ``str``
+    """
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(size) < 1024.0:
+            return '%.1f%s' % (size, unit)
+        size /= 1024.0
+    return '%.1fTB' % size
+
+
+def build_stats(args):
+    """Rank the packages of the latest run or compare the last two runs.
+
+    :param args: Parsed arguments in dictionary format.
+    :type args: ``dict``
+    """
+    runs = load_runs(paths=args['metrics_files'])
+    if not runs:
+        raise utils.AError('No build metrics were found.')
+
+    sort_key = SORT_KEYS[args['sort']]
+    latest = package_totals(run=runs[-1])
+    lines = list()
+    if args['compare']:
+        if len(runs) < 2:
+            raise utils.AError('Comparing runs requires two metrics files.')
+
+        previous = package_totals(run=runs[-2])
+        rows = list()
+        for name in set(latest.keys()) | set(previous.keys()):
+            new = latest.get(name, dict()).get(sort_key, 0)
+            old = previous.get(name, dict()).get(sort_key, 0)
+            rows.append((new - old, old, new, name))
+
+        rows.sort(key=lambda i: abs(i[0]), reverse=True)
+        lines.append('Comparing [ %s ] to [ %s ] by %s' % (
+            runs[-2]['metrics_file'], runs[-1]['metrics_file'], args['sort']
+        ))
+        lines.append('%-40s %14s %14s %14s' % ('name', 'old', 'new', 'delta'))
+        for delta, old, new, name in rows[:args['limit']]:
+            if sort_key in ['peak_rss', 'bytes']:
+                old, new, delta = [_format_size(i) for i in [old, new, delta]]
+            else:
+                old, new, delta = ['%.2f' % i for i in [old, new, delta]]
+            lines.append('%-40s %14s %14s %14s' % (name, old, new, delta))
+    else:
+        rows = sorted(
+            latest.values(),
+            key=lambda i: i[sort_key],
+            reverse=True
+        )
+        total_wall = sum([i['wall_time'] for i in rows]) or 1
+        lines.append('Ranking [ %s ] by %s' % (
+            runs[-1]['metrics_file'], args['sort']
+        ))
+        lines.append(
+            '%-40s %10s %7s %10s %10s %10s %6s' % (
+                'name', 'wall(s)', 'wall%', 'cpu(s)', 'peak rss', 'bytes',
+                'status'
+            )
+        )
+        for row in rows[:args['limit']]:
+            lines.append(
+                '%-40s %10.2f %6.1f%% %10.2f %10s %10s %6s' % (
+                    row['name'],
+                    row['wall_time'],
+                    row['wall_time'] * 100 / total_wall,
+                    row['cpu_time'],
+                    _format_size(row['peak_rss']),
+                    _format_size(row['bytes']),
+                    'ok' if row['success'] else 'failed'
+                )
+            )
+
+    compiler_usage = runs[-1].get('compiler_cache')
+    if compiler_usage:
+        lines.append(
+            'Compiler cache hits: %s, misses: %s, hit rate: %s%%' % (
+                compiler_usage['hits'],
+                compiler_usage['misses'],
+                compiler_usage['hit_rate']
+            )
+        )
+
+    print('\n'.join(lines))
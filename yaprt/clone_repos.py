@@ -21,6 +21,7 @@ import os
 from cloudlib import logger
 
 import yaprt
+from yaprt import tracing
 from yaprt import utils
 
 
@@ -214,4 +215,5 @@ class CloneGitRepos(utils.RepoBaseClass):
         # Sort and store any git repositories from within the list.
         for repo, branch in repo_list:
             LOG.debug('Repo to clone: [ %s ]', repo)
-            self._store_git_repos(git_repo=repo, git_branch=branch)
+            with tracing.span('store_git_repo', 'git', repo=repo, ref=branch):
+                self._store_git_repos(git_repo=repo, git_branch=branch)
@@ -0,0 +1,174 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Compiler caching and parallel compilation for C extension builds.
+
+Builds are given an environment that runs the C and C++ compilers through
+``ccache`` with a cache directory managed by yaprt, so an unchanged source
+file is compiled only once across runs. The environment also sets the
+parallel compile options understood by the common build systems, with the
+number of jobs shared out between the build workers:
+
+* ``MAKEFLAGS`` for make based builds.
+* ``MAX_JOBS`` and ``NPY_NUM_BUILD_JOBS`` for torch and numpy style builds.
+* ``DIST_EXTRA_CONFIG`` pointing at a config file which sets
+  ``build_ext --parallel`` for setuptools builds.
+
+The hit rate of a run is computed from the ``ccache`` statistics taken
+before and after it.
+"""
+
+import multiprocessing
+import os
+import subprocess
+from distutils import spawn
+
+from cloudlib import logger
+
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+# ccache statistics counted as hits and as misses.
+HIT_STATS = ['direct_cache_hit', 'preprocessed_cache_hit']
+MISS_STATS = ['cache_miss']
+
+
+class CompilerCache(object):
+    """Build environment for cached and parallel compilation.
+
+    Example:
+        >>> cache = CompilerCache(cache_dir='/var/cache/yaprt/ccache')
+        >>> env = cache.environment()
+        >>> env['CC']
+        'ccache cc'
+        >>> cache.usage()
+        {'hits': 120, 'misses': 8, 'hit_rate': 93.75, 'jobs': 8}
+    """
+    def __init__(self, cache_dir, jobs=None, workers=1, base_dir=None):
+        """Set up the compiler cache directory.
+
+        :param cache_dir: $PATH to the compiler cache directory.
+        :type cache_dir: ``str``
+        :param jobs: Number of parallel compile jobs for every build. By
+                     default the CPUs are shared out between the workers.
+        :type jobs: ``int``
+        :param workers: Number of builds that run at the same time.
+        :type workers: ``int``
+        :param base_dir: Absolute paths below this directory are cached as
+                         relative paths, so builds in different directories
+                         share the cache.
+        :type base_dir: ``str``
+        """
+        self.cache_dir = utils.get_abs_path(file_name=cache_dir)
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        if not jobs:
+            jobs = multiprocessing.cpu_count() // max(int(workers), 1)
+        self.jobs = max(int(jobs), 1)
+        self.base_dir = base_dir or '/'
+
+        self.ccache = spawn.find_executable('ccache')
+        if not self.ccache:
+            LOG.warn(
+                'ccache was not found, C extensions will be compiled in'
+                ' parallel without a compiler cache.'
+            )
+
+        self.config_file = os.path.join(self.cache_dir, 'build_ext.cfg')
+        with open(self.config_file, 'wb') as f:
+            f.write('[build_ext]\nparallel = %s\n' % self.jobs)
+
+        self._started = self.stats()
+
+    def environment(self):
+        """Return the environment for build commands.
+
+        :returns: ``dict``
+        """
+        env = os.environ.copy()
+        if self.ccache:
+            for key, compiler in [('CC', 'cc'), ('CXX', 'c++')]:
+                compiler = env.get(key, compiler)
+                if not compiler.startswith(self.ccache):
+                    env[key] = '%s %s' % (self.ccache, compiler)
+            env['CCACHE_DIR'] = self.cache_dir
+            env['CCACHE_BASEDIR'] = self.base_dir
+            env['CCACHE_NOHASHDIR'] = 'true'
+
+        jobs = str(self.jobs)
+        env['MAKEFLAGS'] = ' '.join(
+            [i for i in [env.get('MAKEFLAGS'), '-j%s' % jobs] if i]
+        )
+        env['MAX_JOBS'] = jobs
+        env['NPY_NUM_BUILD_JOBS'] = jobs
+        env['DIST_EXTRA_CONFIG'] = self.config_file
+        return env
+
+    def stats(self):
+        """Return the ccache statistics of the cache directory.
+
+        :returns: ``dict``
+        """
+        if not self.ccache:
+            return dict()
+
+        env = os.environ.copy()
+        env['CCACHE_DIR'] = self.cache_dir
+        try:
+            with open(os.devnull, 'wb') as devnull:
+                data = subprocess.check_output(
+                    [self.ccache, '--print-stats'],
+                    env=env,
+                    stderr=devnull
+                )
+        except (OSError, subprocess.CalledProcessError) as exp:
+            LOG.debug('Failed to read the ccache statistics: %s', exp)
+            return dict()
+
+        stats = dict()
+        for line in data.splitlines():
+            parts = line.split('\t')
+            if len(parts) == 2 and parts[1].strip().isdigit():
+                stats[parts[0].strip()] = int(parts[1])
+        return stats
+
+    def usage(self):
+        """Return the cache hits and misses since the cache was set up.
+
+        :returns: ``dict``
+        """
+        stats = self.stats()
+
+        def _count(names):
+            return sum(
+                [stats.get(i, 0) - self._started.get(i, 0) for i in names]
+            )
+
+        hits = _count(HIT_STATS)
+        misses = _count(MISS_STATS)
+        if hits + misses:
+            hit_rate = round(hits * 100.0 / (hits + misses), 2)
+        else:
+            hit_rate = 0.0
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hit_rate,
+            'jobs': self.jobs
+        }
@@ -37,9 +37,25 @@ This tool can:
     * Store the git sources from the report into a specific location. If the
       source code already exists within the targeted location the git repo will
       be updated with any changes that may have been made upstream.
+    * Distribute the wheel builds of a report between any number of build
+      workers using a shared work queue.
+    * Merge the storage pools and link directories built by multiple build
+      shards, using ``build-wheels --shard``, into a single pool and link
+      directory.
+    * Record the wall time, CPU time, peak memory and output size of every
+      build operation and rank or compare build runs from those metrics.
+    * Export the phase durations and counts of every run for the Prometheus
+      node exporter textfile collector.
+    * Trace the phases, git operations, builds and commands of a run into a
+      Chrome trace file.
+    * Roll a repository published as generations, using
+      ``build-wheels --publish-root``, back to an earlier generation.
     * Create a static html index for all files within a directory. Because
       this is a recursive function, each index will be created within the
       directory and only reference files within that directory.
+    * Create a PEP 503 simple index of a storage pool, with the hash of every
+      wheel and its metadata extracted for pip to resolve without
+      downloading whole wheels.
 """
 
 import os
@@ -131,6 +147,7 @@ def _ensure_repos(args, organize_data):
         (i.get('git_url'), i.get('branch')) for i in organize_data.values()
         if i.get('git_url')
     ]
+    _importer('yaprt.exporter', 'add')(name='repos', value=len(repos))
     _importer('yaprt.clone_repos', 'store_repos')(args=args, repo_list=repos)
 
 
@@ -148,20 +165,24 @@ def runner(args, module, method, process_data=False, args_only=False):
     :param args_only: force method args to be user_args only
     :type args_only: ``bol``
     """
+    phase = _importer('yaprt.exporter', 'phase')
     function_args = [args]
     if process_data:
-        organize_data = _importer('yaprt.data_process', 'organize_data')(
-            args=args
-        )
+        with phase(name='organize_data'):
+            organize_data = _importer('yaprt.data_process', 'organize_data')(
+                args=args
+            )
         function_args.append(organize_data)
-        _ensure_repos(*function_args)
+        with phase(name='ensure_repos'):
+            _ensure_repos(*function_args)
 
     if module and method:
         action = _importer(module, method)
         if args_only:
             function_args = [args]
 
-        action(*function_args)
+        with phase(name=method):
+            action(*function_args)
 
 
 def main():
@@ -188,6 +209,36 @@ def main():
                 'create_html_indexes',
                 False
             ]
+        elif args['parsed_command'] == 'create-simple-index':
+            function_args = [
+                'yaprt.simple_index',
+                'create_simple_index',
+                False
+            ]
+        elif args['parsed_command'] == 'build-worker':
+            function_args = [
+                'yaprt.wheel_builder',
+                'build_worker',
+                False
+            ]
+        elif args['parsed_command'] == 'merge-pools':
+            function_args = [
+                'yaprt.sharding',
+                'merge_pools',
+                False
+            ]
+        elif args['parsed_command'] == 'build-stats':
+            function_args = [
+                'yaprt.build_metrics',
+                'build_stats',
+                False
+            ]
+        elif args['parsed_command'] == 'rollback-publish':
+            function_args = [
+                'yaprt.publisher',
+                'rollback_publish',
+                False
+            ]
         elif args['parsed_command'] == 'store-repos':
             function_args = [None, None, True]
         else:
@@ -198,7 +249,19 @@ def main():
                 'No known parsed command, Current Args: "%s"', args
             )
 
-        runner(args, *function_args)
+        exporter = _importer('yaprt.exporter', 'EXPORTER')
+        exporter.configure(
+            textfile_dir=args['prometheus_textfile_dir'],
+            command=args['parsed_command']
+        )
+        tracer = _importer('yaprt.tracing', 'TRACER')
+        tracer.configure(
+            trace_file=args['trace_file'],
+            command=args['parsed_command']
+        )
+        with tracer.run():
+            with exporter.run():
+                runner(args, *function_args)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,255 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Export run metrics for the Prometheus node exporter textfile collector.
+
+The metrics of a run are written to ``yaprt_<command>.prom`` within the
+textfile directory whenever a phase starts or finishes and once more when
+the run has finished. The file is written to a temporary file and renamed
+into place so the collector never reads a partially written file.
+
+The exporter does nothing until it has been configured with a textfile
+directory, so phases can be measured and counts added from anywhere.
+"""
+
+import collections
+import contextlib
+import os
+import tempfile
+import threading
+import time
+
+from cloudlib import logger
+
+from yaprt import tracing
+
+
+LOG = logger.getLogger('repo_builder')
+
+# Counts exported for every run, even when nothing was counted.
+COUNTS = collections.OrderedDict(
+    [
+        ('repos', 'Number of git repositories used by the run.'),
+        ('wheels_built', 'Number of wheels built by the run.'),
+        ('wheels_skipped', 'Number of wheels that did not need building.'),
+        ('wheels_failed', 'Number of packages that failed to build.'),
+        ('wheels_quarantined', 'Number of invalid wheels quarantined instead'
+                               ' of being published.'),
+        ('tree_cache_hits', 'Number of git packages whose wheels were found'
+                            ' in the tree cache.'),
+        ('sources_cached', 'Number of requirements found in the source'
+                           ' cache.'),
+        ('sources_fetched', 'Number of requirements downloaded into the'
+                            ' source cache.'),
+        ('published_bytes', 'Number of bytes copied into the storage pool.'),
+        ('indexes_written', 'Number of HTML index files written.'),
+        ('indexes_skipped', 'Number of HTML index files that were unchanged'
+                            ' and not written.'),
+        ('hash_cache_hits', 'Number of file hashes found in the hash'
+                            ' cache.'),
+        ('hash_cache_misses', 'Number of files read to compute their'
+                              ' hash.'),
+        ('compiler_cache_hits', 'Number of compiles served by the compiler'
+                                ' cache.'),
+        ('compiler_cache_misses', 'Number of compiles missed by the compiler'
+                                  ' cache.')
+    ]
+)
+
+
+class TextfileExporter(object):
+    """Collect phase durations and counts and write them as a textfile."""
+    def __init__(self):
+        self.textfile = None
+        self.command = None
+        self.started = time.time()
+        self.durations = collections.OrderedDict()
+        self.running = collections.OrderedDict()
+        self.counts = dict([(i, 0) for i in COUNTS])
+        self.success = None
+        self._lock = threading.Lock()
+
+    def configure(self, textfile_dir, command):
+        """Enable the exporter.
+
+        :param textfile_dir: $PATH to the textfile collector directory.
+        :type textfile_dir: ``str``
+        :param command: Name of the command being run.
+        :type command: ``str``
+        """
+        if not textfile_dir:
+            return
+
+        textfile_dir = os.path.abspath(os.path.expanduser(textfile_dir))
+        if not os.path.isdir(textfile_dir):
+            os.makedirs(textfile_dir)
+
+        self.command = command
+        self.textfile = os.path.join(
+            textfile_dir,
+            'yaprt_%s.prom' % command.replace('-', '_')
+        )
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Measure the wall time of a phase.
+
+        The time of a phase that runs more than once is added up. Every
+        phase is also traced.
+
+        :param name: Name of the phase.
+        :type name: ``str``
+        """
+        self.durations.setdefault(name, 0.0)
+        self.running[name] = self.running.get(name, 0) + 1
+        self.write()
+        start = time.time()
+        try:
+            with tracing.span(name, 'phase'):
+                yield
+        finally:
+            self.durations[name] += time.time() - start
+            self.running[name] -= 1
+            self.write()
+
+    @contextlib.contextmanager
+    def run(self):
+        """Record the outcome of a run and write the final metrics."""
+        try:
+            yield
+        except (Exception, SystemExit, KeyboardInterrupt):
+            self.success = False
+            raise
+        else:
+            self.success = True
+        finally:
+            self.write()
+
+    def add(self, name, value=1):
+        """Add to a count.
+
+        :param name: Name of the count, one of ``COUNTS``.
+        :type name: ``str``
+        :param value: Value added to the count.
+        :type value: ``int``
+        """
+        with self._lock:
+            self.counts[name] += value
+
+    def _lines(self):
+        """Return a ``list`` of lines in the Prometheus text format.
+
+        :returns: ``list``
+        """
+        command = 'command="%s"' % self.command
+        lines = [
+            '# HELP yaprt_run_start_time_seconds Time the run started.',
+            '# TYPE yaprt_run_start_time_seconds gauge',
+            'yaprt_run_start_time_seconds{%s} %f' % (command, self.started),
+            '# HELP yaprt_run_duration_seconds Wall time of the run so far.',
+            '# TYPE yaprt_run_duration_seconds gauge',
+            'yaprt_run_duration_seconds{%s} %f' % (
+                command, time.time() - self.started
+            )
+        ]
+        if self.success is not None:
+            lines.extend(
+                [
+                    '# HELP yaprt_run_success Whether the run succeeded.',
+                    '# TYPE yaprt_run_success gauge',
+                    'yaprt_run_success{%s} %d' % (command, self.success)
+                ]
+            )
+
+        lines.extend(
+            [
+                '# HELP yaprt_phase_duration_seconds Wall time spent in a'
+                ' phase.',
+                '# TYPE yaprt_phase_duration_seconds gauge'
+            ]
+        )
+        for name, duration in self.durations.items():
+            lines.append(
+                'yaprt_phase_duration_seconds{%s,phase="%s"} %f' % (
+                    command, name, duration
+                )
+            )
+
+        lines.extend(
+            [
+                '# HELP yaprt_phase_running Whether a phase is running.',
+                '# TYPE yaprt_phase_running gauge'
+            ]
+        )
+        for name, running in self.running.items():
+            lines.append(
+                'yaprt_phase_running{%s,phase="%s"} %d' % (
+                    command, name, bool(running)
+                )
+            )
+
+        for name, help_text in COUNTS.items():
+            lines.extend(
+                [
+                    '# HELP yaprt_%s %s' % (name, help_text),
+                    '# TYPE yaprt_%s gauge' % name,
+                    'yaprt_%s{%s} %d' % (name, command, self.counts[name])
+                ]
+            )
+        return lines
+
+    def write(self):
+        """Write all of the metrics to the textfile."""
+        if not self.textfile:
+            return
+
+        fd, temp_file = tempfile.mkstemp(
+            prefix='.yaprt_',
+            dir=os.path.dirname(self.textfile)
+        )
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write('%s\n' % '\n'.join(self._lines()))
+            os.chmod(temp_file, 0o644)
+            os.rename(temp_file, self.textfile)
+        except (IOError, OSError) as exp:
+            LOG.warn('Failed to write metrics textfile: %s', exp)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+
+# Exporter shared by every module of a run.
+EXPORTER = TextfileExporter()
+
+
+def phase(name):
+    """Measure the wall time of a phase with the shared exporter.
+
+    :param name: Name of the phase.
+    :type name: ``str``
+    """
+    return EXPORTER.phase(name=name)
+
+
+def add(name, value=1):
+    """Add to a count of the shared exporter.
+
+    :param name: Name of the count, one of ``COUNTS``.
+    :type name: ``str``
+    :param value: Value added to the count.
+    :type value: ``int``
+    """
+    EXPORTER.add(name=name, value=value)
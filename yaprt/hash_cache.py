@@ -0,0 +1,208 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Persistent cache of file digests.
+
+Digests are stored within a SQLite database keyed by the device, inode, size
+and mtime of the file they were computed from, along with the hash
+algorithm. A file whose stat has not changed is never read again, and since
+the key has no path, the hard linked copies of a file within every published
+generation share a single entry. Replacing a file, by writing it in place or
+by renaming a new file over it, changes its key.
+"""
+
+import os
+import sqlite3
+import threading
+
+from cloudlib import logger
+
+from yaprt import exporter
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+# Digests computed whenever a file is read, so a file is read only once for
+# every hash used by the indexer and the pool operations.
+ALGORITHMS = ('md5', 'sha256')
+
+
+def _mtime_ns(stat):
+    """Return the mtime of a stat in nanoseconds.
+
+    :param stat: Result of ``os.stat``.
+    :type stat: ``object``
+    :returns: ``int``
+    """
+    mtime_ns = getattr(stat, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(stat.st_mtime * 1000000000)
+    return mtime_ns
+
+
+class HashCache(object):
+    """Look up and store file digests by the stat of the file.
+
+    Example:
+        >>> cache = HashCache(cache_file='/var/lib/yaprt/hashes.sqlite')
+        >>> cache.digest(local_file='/var/www/repo/pool/six/six.whl',
+        ...              hash_type='md5')
+        'c2d0a8a4f6d5e2a1b7f3b69c0e1f9d4a'
+        >>> cache.close()
+    """
+    def __init__(self, cache_file):
+        """Open the cache database, creating it if it does not exist.
+
+        :param cache_file: $PATH to the SQLite database.
+        :type cache_file: ``str``
+        """
+        self.cache_file = utils.get_abs_path(file_name=cache_file)
+        cache_dir = os.path.dirname(self.cache_file)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.cache_file,
+            timeout=60,
+            check_same_thread=False
+        )
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS hashes ('
+                ' dev INTEGER, inode INTEGER, size INTEGER,'
+                ' mtime_ns INTEGER, algorithm TEXT, digest TEXT,'
+                ' PRIMARY KEY (dev, inode, size, mtime_ns, algorithm))'
+            )
+
+    @staticmethod
+    def _key(stat):
+        """Return the cache key of a stat.
+
+        :param stat: Result of ``os.stat``.
+        :type stat: ``object``
+        :returns: ``tuple``
+        """
+        return stat.st_dev, stat.st_ino, stat.st_size, _mtime_ns(stat)
+
+    def digests(self, local_file, hash_types=ALGORITHMS):
+        """Return the hex digests of a file, reading it only when not cached.
+
+        When a digest is not cached the file is read once to compute every
+        digest asked for along with every digest of ``ALGORITHMS``, so other
+        callers never read it again.
+
+        :param local_file: $PATH to the file.
+        :type local_file: ``str``
+        :param hash_types: Types of hash to use. IE: md5, sha256
+        :type hash_types: ``list``
+        :returns: ``dict``
+        """
+        local_file = utils.get_abs_path(file_name=local_file)
+        try:
+            stat = os.stat(local_file)
+        except OSError:
+            return None
+
+        key = self._key(stat=stat)
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT algorithm, digest FROM hashes WHERE dev = ? AND'
+                ' inode = ? AND size = ? AND mtime_ns = ?',
+                key
+            ).fetchall()
+            cached = dict([(str(k), str(v)) for k, v in rows])
+            if not [i for i in hash_types if i not in cached]:
+                self.hits += 1
+                return dict([(i, cached[i]) for i in hash_types])
+            self.misses += 1
+
+        digests = utils.hash_digests(
+            local_file=local_file,
+            hash_types=list(set(hash_types) | set(ALGORITHMS))
+        )
+        try:
+            # A file changed while it was read is not cached.
+            changed = self._key(stat=os.stat(local_file)) != key
+        except OSError:
+            changed = True
+        if digests and not changed:
+            with self._lock:
+                with self._db:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO hashes VALUES'
+                        ' (?, ?, ?, ?, ?, ?)',
+                        [key + i for i in sorted(digests.items())]
+                    )
+        if digests:
+            return dict([(i, digests[i]) for i in hash_types])
+
+    def digest(self, local_file, hash_type='sha256'):
+        """Return the hex digest of a file, reading it only when not cached.
+
+        :param local_file: $PATH to the file.
+        :type local_file: ``str``
+        :param hash_type: Type of hash to use. IE: md5, sha256
+        :type hash_type: ``str``
+        :returns: ``str``
+        """
+        digests = self.digests(local_file=local_file, hash_types=[hash_type])
+        if digests:
+            return digests[hash_type]
+
+    def close(self):
+        """Close the cache database."""
+        LOG.info(
+            'Hash cache hits: %s, misses: %s', self.hits, self.misses
+        )
+        exporter.add(name='hash_cache_hits', value=self.hits)
+        exporter.add(name='hash_cache_misses', value=self.misses)
+        self._db.close()
+
+
+def hash_digests(local_file, hash_types=ALGORITHMS, cache=None):
+    """Return the hashes of a file through a cache, when there is one.
+
+    :param local_file: $PATH to the file.
+    :type local_file: ``str``
+    :param hash_types: Types of hash to use. IE: md5, sha256
+    :type hash_types: ``list``
+    :param cache: Hash cache, or ``None`` to always read the file.
+    :type cache: ``object``
+    :returns: ``dict``
+    """
+    if cache:
+        return cache.digests(local_file=local_file, hash_types=hash_types)
+    return utils.hash_digests(local_file=local_file, hash_types=hash_types)
+
+
+def hash_return(local_file, hash_type='sha256', cache=None):
+    """Return the hash of a file through a cache, when there is one.
+
+    :param local_file: $PATH to the file.
+    :type local_file: ``str``
+    :param hash_type: Type of hash to use. IE: md5, sha256
+    :type hash_type: ``str``
+    :param cache: Hash cache, or ``None`` to always read the file.
+    :type cache: ``object``
+    :returns: ``str``
+    """
+    if cache:
+        return cache.digest(local_file=local_file, hash_type=hash_type)
+    return utils.hash_return(local_file=local_file, hash_type=hash_type)
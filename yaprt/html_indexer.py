@@ -25,24 +25,31 @@ import base64
 import os
 
 from cloudlib import logger
-import html
 
+from yaprt import exporter
+from yaprt import hash_cache
+from yaprt import html_writer
+from yaprt import index_state
+from yaprt import publisher
 from yaprt import utils
 
 
 LOG = logger.getLogger('repo_builder')
 
 
-def return_hash(src_file):
+def return_hash(src_file, cache=None):
     """Return a hash for a given file.
 
     :param src_file: Name of the file that will be hashed.
     :type src_file: ``str``
+    :param cache: Hash cache, or ``None`` to always read the file.
+    :type cache: ``object``
     :returns: ``str``
     """
-    hash_sum = utils.hash_return(
+    hash_sum = hash_cache.hash_return(
         local_file=src_file,
-        hash_type='md5'
+        hash_type='md5',
+        cache=cache
     )
     if hash_sum:
         return base64.b64encode(hash_sum)
@@ -60,53 +67,186 @@ def create_html_indexes(args):
     full_path = utils.get_abs_path(file_name=args['repo_dir'])
     excludes = [utils.get_abs_path(file_name=i) for i in args['dir_exclude']]
 
+    if args.get('index_state_file'):
+        state = index_state.IndexState(
+            state_file=utils.get_abs_path(file_name=args['index_state_file'])
+        )
+    else:
+        state = None
+
+    if args.get('hash_cache'):
+        cache = hash_cache.HashCache(cache_file=args['hash_cache'])
+    else:
+        cache = None
+
+    try:
+        if not args.get('publish_root'):
+            return _create_html_indexes(
+                full_path=full_path,
+                excludes=excludes,
+                state=state,
+                cache=cache,
+                workers=args.get('index_workers') or 1
+            )
+
+        # Index a staged generation and make it current once every index
+        # exists.
+        with publisher.staged_generation(
+                publish_root=args['publish_root'],
+                keep=args['keep_generations']) as staged:
+            _create_html_indexes(
+                full_path=staged.path(path=full_path),
+                excludes=[staged.path(path=i) for i in excludes],
+                state=state,
+                cache=cache,
+                workers=args.get('index_workers') or 1
+            )
+    finally:
+        if cache:
+            cache.close()
+
+
+def _index_directory(fpath, afolders, afiles, hashes, cache=None):
+    """Write the HTML index of a directory.
+
+    The index is streamed to disk one link at a time and is only replaced
+    when its content has changed.
+
+    :param fpath: $PATH to the directory.
+    :type fpath: ``str``
+    :param afolders: Names of the directories within the directory.
+    :type afolders: ``list``
+    :param afiles: Names of the files within the directory.
+    :type afiles: ``list``
+    :param hashes: $PATHs of the files and their hashes.
+    :type hashes: ``dict``
+    :param cache: Hash cache used to hash the existing index, or ``None``.
+    :type cache: ``object``
+    """
+    LOG.debug('Path Found: "%s"', fpath)
+    _title = html_writer.escape('links for "%s"' % os.path.basename(fpath))
+    index_file = os.path.join(fpath, 'index.html')
+    with html_writer.PageWriter(page_file=index_file, cache=cache) as index:
+        index.write(
+            '<html>\n<head><title>%s</title></head>\n<body>\n<h1>%s</h1>' % (
+                _title, _title
+            )
+        )
+
+        # Links are made relative to the directory without changing the
+        # working directory, which is shared by every indexing thread.
+        LOG.debug('Folders Found: "%d"', len(afolders))
+        for afolder in sorted(afolders):
+            full_folder_path = os.path.join(fpath, afolder)
+            index.write(
+                '\n<a href="%s" rel="internal">%s</a>\n<br>' % (
+                    html_writer.escape(
+                        os.path.relpath(full_folder_path, fpath),
+                        quote=True
+                    ),
+                    html_writer.escape(os.path.basename(full_folder_path))
+                )
+            )
+
+        LOG.debug('Files Found: "%d"', len(afiles))
+        for afile in sorted(afiles):
+            if afile == 'index.html':
+                continue
+
+            full_file_path = os.path.join(fpath, afile)
+            md5_hash = hashes.get(full_file_path)
+            try:
+                if md5_hash:
+                    index.write(
+                        '\n<a md="%s" href="%s" rel="internal">%s</a>'
+                        '\n<br>' % (
+                            html_writer.escape(
+                                'md5:%s' % md5_hash,
+                                quote=True
+                            ),
+                            html_writer.escape(
+                                os.path.relpath(full_file_path, fpath),
+                                quote=True
+                            ),
+                            html_writer.escape(
+                                os.path.basename(full_file_path).split('#')[0]
+                            )
+                        )
+                    )
+            # If anything bad happens in the link creation process LOG
+            #  the exception and skip.
+            except Exception as exp:
+                LOG.warn(str(exp))
+                pass
+
+        index.write('\n</body>\n</html>')
+
+    if index.changed:
+        LOG.info('Index file [ %s ] created.', index_file)
+
+
+def _create_html_indexes(full_path, excludes, state=None, cache=None,
+                         workers=1):
+    """Create an HTML index within every directory of a path.
+
+    Directories are found first, then the files of every directory being
+    indexed are hashed and the indexes are written, both by ``workers``
+    threads. Every index only depends on its own directory, so the indexes
+    written are the same for any number of workers.
+
+    :param full_path: $PATH to the repository directory.
+    :type full_path: ``str``
+    :param excludes: List of $PATHs to directories that are not indexed.
+    :type excludes: ``list``
+    :param state: State of an earlier run, directories that have not
+                  changed since are not indexed again.
+    :type state: ``object``
+    :param cache: Hash cache, or ``None`` to always read every file.
+    :type cache: ``object``
+    :param workers: Number of threads hashing files and writing indexes.
+    :type workers: ``int``
+    """
+    directories = list()
     for fpath, afolders, afiles in os.walk(full_path):
+        relative = os.path.relpath(fpath, full_path)
         # Skip excluded directories.
         if [i for i in excludes if fpath.startswith(i)]:
             continue
+        elif state and not state.changed(fpath, relative, afolders, afiles):
+            LOG.debug('Index of "%s" is unchanged.', fpath)
+            continue
         else:
-            LOG.debug('Path Found: "%s"', fpath)
-            _title = 'links for "%s"' % os.path.basename(fpath)
-            index = html.HTML('html')
-            head = index.head()
-            head.title(_title)
-            body = index.body(newlines=True)
-            body.h1(_title)
-
-            with utils.ChangeDir(fpath):
-                LOG.debug('Folders Found: "%d"', len(afolders))
-                for afolder in sorted(afolders):
-                    full_folder_path = os.path.join(fpath, afolder)
-                    body.a(
-                        os.path.basename(full_folder_path),
-                        href=os.path.relpath(full_folder_path),
-                        rel="internal"
-                    )
-                    body.br()
-
-                LOG.debug('Files Found: "%d"', len(afiles))
-                for afile in sorted(afiles):
-                    if afile == 'index.html':
-                        continue
-
-                    full_file_path = os.path.join(fpath, afile)
-                    md5_hash = return_hash(full_file_path)
-                    try:
-                        if md5_hash:
-                            body.a(
-                                os.path.basename(full_file_path).split('#')[0],
-                                href=os.path.relpath(full_file_path),
-                                rel="internal",
-                                md='md5:%s' % md5_hash
-                            )
-                            body.br()
-                    # If anything bad happens in the link creation process LOG
-                    #  the exception and skip.
-                    except Exception as exp:
-                        LOG.warn(str(exp))
-                        pass
-                else:
-                    index_file = os.path.join(fpath, 'index.html')
-                    with open(index_file, 'wb') as f:
-                        f.write(str(index))
-                    LOG.info('Index file [ %s ] created.', index_file)
+            directories.append((fpath, relative, afolders, afiles))
+
+    files = [
+        os.path.join(i[0], afile) for i in directories
+        for afile in sorted(i[3]) if afile != 'index.html'
+    ]
+    hashes = dict(
+        zip(
+            files,
+            utils.thread_map(
+                function=lambda i: return_hash(i, cache=cache),
+                items=files,
+                workers=workers
+            )
+        )
+    )
+    utils.thread_map(
+        function=lambda i: _index_directory(
+            fpath=i[0],
+            afolders=i[2],
+            afiles=i[3],
+            hashes=hashes,
+            cache=cache
+        ),
+        items=directories,
+        workers=workers
+    )
+
+    if state:
+        for fpath, relative, afolders, afiles in directories:
+            state.record(fpath, relative, afolders, afiles)
+        LOG.info('Unchanged indexes skipped: %s', state.skipped)
+        exporter.add(name='indexes_skipped', value=state.skipped)
+        state.save()
@@ -0,0 +1,120 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Stream HTML pages to disk and replace them only when they change.
+
+Pages are written piece by piece to a temporary file next to the page, so
+memory does not grow with the size of a directory, while the content is
+hashed. Once written, the temporary file is renamed over the page, so a
+page is never read partially written and hard linked copies of it are never
+changed. When the new content has the same hash as the page the temporary
+file is removed instead, which keeps the mtime, inode and ETag of the page,
+and with them the cache validators of static servers and CDNs.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from cloudlib import logger
+
+from yaprt import exporter
+from yaprt import hash_cache
+
+
+LOG = logger.getLogger('repo_builder')
+
+
+def escape(value, quote=False):
+    """Return a value with the characters special to HTML escaped.
+
+    :param value: Text to escape.
+    :type value: ``str``
+    :param quote: Escape double quotes too, for attribute values.
+    :type quote: ``bol``
+    :returns: ``str``
+    """
+    value = value.replace('&', '&amp;')
+    value = value.replace('<', '&lt;').replace('>', '&gt;')
+    if quote:
+        value = value.replace('"', '&quot;')
+    return value
+
+
+class PageWriter(object):
+    """Write a page through a temporary file renamed into place.
+
+    Example:
+        >>> with PageWriter(page_file='/var/www/repo/index.html') as page:
+        ...     page.write('<html>\\n')
+        ...     page.write('</html>')
+        >>> page.changed
+        True
+    """
+    def __init__(self, page_file, cache=None):
+        """Set up the writer, nothing is written until it is entered.
+
+        :param page_file: $PATH to the page.
+        :type page_file: ``str``
+        :param cache: Hash cache used to hash the existing page, or ``None``
+                      to read it.
+        :type cache: ``object``
+        """
+        self.page_file = page_file
+        self.cache = cache
+        self.changed = False
+        self._hash = hashlib.sha256()
+        self._file = None
+        self._temp_file = None
+
+    def __enter__(self):
+        fd, self._temp_file = tempfile.mkstemp(
+            prefix='.%s.' % os.path.basename(self.page_file),
+            dir=os.path.dirname(self.page_file)
+        )
+        self._file = os.fdopen(fd, 'wb')
+        return self
+
+    def write(self, data):
+        """Write data to the page.
+
+        :param data: Data to write.
+        :type data: ``str``
+        """
+        self._hash.update(data)
+        self._file.write(data)
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self._file.close()
+        if exc_type:
+            os.remove(self._temp_file)
+            return False
+
+        existing = hash_cache.hash_return(
+            local_file=self.page_file,
+            hash_type='sha256',
+            cache=self.cache
+        )
+        if existing == self._hash.hexdigest():
+            os.remove(self._temp_file)
+            exporter.add(name='indexes_skipped')
+            LOG.debug('Page [ %s ] is unchanged.', self.page_file)
+        else:
+            os.chmod(self._temp_file, 0o644)
+            os.rename(self._temp_file, self.page_file)
+            self.changed = True
+            exporter.add(name='indexes_written')
+        return False
@@ -0,0 +1,185 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Persisted state of the HTML indexes of a repository.
+
+The index of a directory only depends on the names of its directories and
+the names and content of its files. For every indexed directory the state
+keeps a signature of those entries, made from the name, size, mtime and
+inode of every file, and the inode, size and mtime of the ``index.html``
+written for them. A directory is indexed again only when its signature or
+its ``index.html`` has changed, so an unchanged directory costs a stat of
+its entries and no reads.
+
+Directories are recorded relative to the repository directory, so the state
+stays valid for every generation of a published repository, whose files
+are hard links sharing their inodes.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from cloudlib import logger
+
+
+LOG = logger.getLogger('repo_builder')
+
+STATE_VERSION = 1
+
+
+def _stat(path):
+    """Return the inode, size and mtime of a path or ``None``.
+
+    Symlinks are followed, the index of a link depends on its target.
+
+    :param path: $PATH to the file.
+    :type path: ``str``
+    :returns: ``list``
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    else:
+        return [stat.st_ino, stat.st_size, stat.st_mtime]
+
+
+class IndexState(object):
+    """Signatures of indexed directories, persisted between runs.
+
+    Example:
+        >>> state = IndexState(state_file='/var/lib/yaprt/index-state.json')
+        >>> if state.changed(directory, relative, folders, files):
+        ...     # Write the index of the directory.
+        ...     state.record(directory, relative, folders, files)
+        >>> state.save()
+    """
+    def __init__(self, state_file):
+        """Load the state of an earlier run, if there is one.
+
+        :param state_file: $PATH to the state file.
+        :type state_file: ``str``
+        """
+        self.state_file = state_file
+        self.directories = dict()
+        self.seen = set()
+        self.skipped = 0
+        if os.path.isfile(self.state_file):
+            try:
+                with open(self.state_file, 'rb') as f:
+                    state = json.loads(f.read())
+            except (IOError, ValueError) as exp:
+                LOG.warn(
+                    'Index state [ %s ] can not be read, every directory'
+                    ' will be indexed: %s',
+                    self.state_file,
+                    exp
+                )
+            else:
+                if state.get('version') == STATE_VERSION:
+                    self.directories = state.get('directories', dict())
+
+    @staticmethod
+    def signature(directory, folders, files):
+        """Return the signature of the entries of a directory.
+
+        :param directory: $PATH to the directory.
+        :type directory: ``str``
+        :param folders: Names of the directories within the directory.
+        :type folders: ``list``
+        :param files: Names of the files within the directory.
+        :type files: ``list``
+        :returns: ``str``
+        """
+        entries = [[i] for i in sorted(folders)]
+        entries.extend(
+            [
+                [i, _stat(os.path.join(directory, i))]
+                for i in sorted(files) if i != 'index.html'
+            ]
+        )
+        return hashlib.sha256(json.dumps(entries)).hexdigest()
+
+    def changed(self, directory, relative, folders, files):
+        """Return ``True`` when the index of a directory must be written.
+
+        :param directory: $PATH to the directory.
+        :type directory: ``str``
+        :param relative: Path of the directory within the repository.
+        :type relative: ``str``
+        :param folders: Names of the directories within the directory.
+        :type folders: ``list``
+        :param files: Names of the files within the directory.
+        :type files: ``list``
+        :returns: ``bol``
+        """
+        self.seen.add(relative)
+        recorded = self.directories.get(relative)
+        if not recorded:
+            return True
+        elif recorded['index'] != _stat(os.path.join(directory, 'index.html')):
+            return True
+        elif recorded['entries'] != self.signature(directory, folders, files):
+            return True
+        else:
+            self.skipped += 1
+            return False
+
+    def record(self, directory, relative, folders, files):
+        """Record the signature of a directory whose index was written.
+
+        :param directory: $PATH to the directory.
+        :type directory: ``str``
+        :param relative: Path of the directory within the repository.
+        :type relative: ``str``
+        :param folders: Names of the directories within the directory.
+        :type folders: ``list``
+        :param files: Names of the files within the directory.
+        :type files: ``list``
+        """
+        self.directories[relative] = {
+            'entries': self.signature(directory, folders, files),
+            'index': _stat(os.path.join(directory, 'index.html'))
+        }
+
+    def save(self):
+        """Write the state, forgetting directories that were not seen."""
+        directories = dict(
+            [(k, v) for k, v in self.directories.items() if k in self.seen]
+        )
+        state_dir = os.path.dirname(os.path.abspath(self.state_file))
+        if not os.path.isdir(state_dir):
+            os.makedirs(state_dir)
+
+        fd, temp_file = tempfile.mkstemp(prefix='.yaprt_', dir=state_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(
+                    json.dumps(
+                        {
+                            'version': STATE_VERSION,
+                            'directories': directories
+                        },
+                        sort_keys=True
+                    )
+                )
+            os.rename(temp_file, self.state_file)
+        except (IOError, OSError) as exp:
+            LOG.warn('Failed to write index state: %s', exp)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
@@ -0,0 +1,128 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Append only journal of package build outcomes.
+
+Every outcome is written as a single line of json and synced to disk before
+the build moves on, so the journal survives the build process being killed
+at any point. The last entry recorded for a package is its current state.
+"""
+
+import json
+import os
+import time
+
+from cloudlib import logger
+
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+BUILT = 'built'
+STORED = 'stored'
+FAILED = 'failed'
+
+
+class BuildJournal(object):
+    """Record and look up the outcome of package builds.
+
+    Example:
+        >>> journal = BuildJournal(journal_file='/var/lib/yaprt/journal')
+        >>> journal.record(package='six', inputs='abc', state=STORED,
+        ...                wheels=['six-1.9.0-py2.py3-none-any.whl'])
+        >>> journal.completed(package='six', inputs='abc')
+        {'state': 'stored', ...}
+    """
+    def __init__(self, journal_file):
+        """Load all existing entries from a journal file.
+
+        :param journal_file: $PATH to the journal file.
+        :type journal_file: ``str``
+        """
+        self.journal_file = utils.get_abs_path(file_name=journal_file)
+        self.entries = dict()
+
+        journal_dir = os.path.dirname(self.journal_file)
+        if not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+
+        if os.path.isfile(self.journal_file):
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A partially written last line from a killed run.
+                        LOG.warn('Skipping corrupt journal entry: %s', line)
+                    else:
+                        self.entries[entry['package']] = entry
+
+            LOG.info(
+                'Loaded %d journal entries from [ %s ]',
+                len(self.entries),
+                self.journal_file
+            )
+
+    def record(self, package, inputs, state, wheels=None, error=None,
+               failure=None):
+        """Append the outcome of a package build to the journal.
+
+        :param package: Name of the package.
+        :type package: ``str``
+        :param inputs: Hash of the inputs the package was built from.
+        :type inputs: ``str``
+        :param state: Outcome of the build, built, stored or failed.
+        :type state: ``str``
+        :param wheels: List of wheel file names built for the package.
+        :type wheels: ``list``
+        :param error: Reason the build failed.
+        :type error: ``str``
+        :param failure: Class of the failure, IE: error, timeout, memory.
+        :type failure: ``str``
+        """
+        entry = {
+            'package': package,
+            'inputs': inputs,
+            'state': state,
+            'wheels': wheels,
+            'error': error,
+            'failure': failure,
+            'time': time.time()
+        }
+        self.entries[package] = entry
+        with open(self.journal_file, 'ab') as f:
+            f.write('%s\n' % json.dumps(entry, sort_keys=True))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def completed(self, package, inputs, state=STORED):
+        """Return the entry of a package if it reached a state.
+
+        The entry is only returned if the package was built from the same
+        inputs.
+
+        :param package: Name of the package.
+        :type package: ``str``
+        :param inputs: Hash of the inputs the package is built from.
+        :type inputs: ``str``
+        :param state: State the package must have reached.
+        :type state: ``str``
+        :returns: ``dict`` or ``None``
+        """
+        entry = self.entries.get(package)
+        if entry and entry['inputs'] == inputs and entry['state'] == state:
+            return entry
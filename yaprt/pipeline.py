@@ -0,0 +1,155 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Run items through stages of worker threads connected by bounded queues.
+
+Every stage takes an item from its input queue, runs its function on the
+item and puts the result on the input queue of the next stage. Because the
+queues are bounded a fast stage can only get a few items ahead of a slow
+one, and because every stage has its own workers slow I/O stages overlap the
+stages that are busy with the CPU.
+
+When a stage fails the first error is kept and no new items are started by
+the stages that do not drain. Items that have already passed those stages
+still run through the rest of the pipeline, so finished work is never
+thrown away, and the first error is raised once the pipeline is empty.
+"""
+
+import Queue
+import threading
+
+from cloudlib import logger
+
+
+LOG = logger.getLogger('repo_builder')
+
+# Marks the end of the items within a queue.
+_DONE = object()
+
+
+class Stage(object):
+    """A named step of a pipeline.
+
+    :param name: Name of the stage.
+    :type name: ``str``
+    :param function: Called with an item, returns the item for the next
+                     stage or ``None`` to drop the item.
+    :type function: ``object``
+    :param workers: Number of worker threads.
+    :type workers: ``int``
+    :param drain: Keep processing items after another stage has failed.
+    :type drain: ``bol``
+    """
+    def __init__(self, name, function, workers=1, drain=False):
+        self.name = name
+        self.function = function
+        self.workers = max(int(workers), 1)
+        self.drain = drain
+
+
+class Pipeline(object):
+    """Run items through a list of stages.
+
+    Example:
+        >>> stages = [Stage('build', build), Stage('publish', publish, 4)]
+        >>> Pipeline(stages=stages, queue_size=4).run(items=packages)
+    """
+    def __init__(self, stages, queue_size=4):
+        """Connect the stages with bounded queues.
+
+        :param stages: List of ``Stage`` objects, in order.
+        :type stages: ``list``
+        :param queue_size: Number of items that can wait for every stage.
+        :type queue_size: ``int``
+        """
+        self.stages = stages
+        self.queues = [
+            Queue.Queue(maxsize=max(int(queue_size), 1)) for _ in stages
+        ]
+        self.errors = list()
+        self._abort = threading.Event()
+        self._lock = threading.Lock()
+        self._running = [i.workers for i in stages]
+
+    def _worker(self, index):
+        """Process the items of a stage until the end of its queue.
+
+        :param index: Index of the stage.
+        :type index: ``int``
+        """
+        stage = self.stages[index]
+        while True:
+            item = self.queues[index].get()
+            if item is _DONE:
+                break
+
+            if self._abort.is_set() and not stage.drain:
+                continue
+
+            try:
+                item = stage.function(item)
+            except (Exception, SystemExit) as exp:
+                LOG.error('Pipeline stage "%s" failed: %s', stage.name, exp)
+                with self._lock:
+                    self.errors.append(exp)
+                self._abort.set()
+                continue
+
+            if item is not None and index + 1 < len(self.stages):
+                self.queues[index + 1].put(item)
+
+        with self._lock:
+            self._running[index] -= 1
+            last_worker = not self._running[index]
+
+        # The last worker of a stage ends the queue of the next stage.
+        if last_worker and index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                self.queues[index + 1].put(_DONE)
+
+    def run(self, items):
+        """Run all items through the pipeline.
+
+        :param items: List of items for the first stage.
+        :type items: ``list``
+        """
+        threads = list()
+        for index, stage in enumerate(self.stages):
+            for number in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(index,),
+                    name='%s-%d' % (stage.name, number)
+                )
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            if self._abort.is_set():
+                break
+            self.queues[0].put(item)
+
+        for _ in range(self.stages[0].workers):
+            self.queues[0].put(_DONE)
+
+        for thread in threads:
+            # Joining with a timeout keeps the main thread interruptible.
+            while thread.is_alive():
+                thread.join(1)
+
+        if self.errors:
+            raise self.errors[0]
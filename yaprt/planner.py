@@ -0,0 +1,147 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Plan a build from the historical cost of building every package.
+
+The build time of a package is estimated from past build metrics, packages
+that have never been measured are given the average known time. Work is
+ordered longest processing time first, which keeps the slowest builds from
+being started last and leaving the other workers idle at the end of a run.
+The wall time of a plan is estimated by assigning that order to the least
+loaded worker.
+"""
+
+from cloudlib import logger
+
+
+LOG = logger.getLogger('repo_builder')
+
+CACHED = 'cached'
+BUILD = 'needs-build'
+FAILING = 'known-failing'
+
+
+def estimate(name, costs):
+    """Return the estimated build time of a package and if it is known.
+
+    :param name: Name of the package.
+    :type name: ``str``
+    :param costs: Package names and their average build time.
+    :type costs: ``dict``
+    :returns: ``tuple``
+    """
+    if name in costs:
+        return costs[name], True
+    elif costs:
+        return sum(costs.values()) / len(costs), False
+    else:
+        return 0.0, False
+
+
+def lpt_order(packages, costs, name_function):
+    """Return packages ordered longest processing time first.
+
+    Packages of equal cost keep their order.
+
+    :param packages: List of packages.
+    :type packages: ``list``
+    :param costs: Package names and their average build time.
+    :type costs: ``dict``
+    :param name_function: Returns the name of a package.
+    :type name_function: ``object``
+    :returns: ``list``
+    """
+    if not costs:
+        return packages
+
+    return sorted(
+        packages,
+        key=lambda i: -estimate(name=name_function(i), costs=costs)[0]
+    )
+
+
+def schedule(durations, workers):
+    """Return the estimated wall time of durations run on workers.
+
+    Durations are assigned longest first to the least loaded worker.
+
+    :param durations: List of build times.
+    :type durations: ``list``
+    :param workers: Number of builds that run at the same time.
+    :type workers: ``int``
+    :returns: ``float``
+    """
+    loads = [0.0] * max(int(workers), 1)
+    for duration in sorted(durations, reverse=True):
+        loads[loads.index(min(loads))] += duration
+    return max(loads)
+
+
+def plan_lines(items, workers):
+    """Return the lines of a build plan.
+
+    :param items: List of planned packages, as returned by
+                  ``WheelBuilder.plan_packages``.
+    :type items: ``list``
+    :param workers: Number of builds that run at the same time.
+    :type workers: ``int``
+    :returns: ``list``
+    """
+    lines = [
+        '%-50s %-14s %12s' % ('package', 'state', 'estimate(s)')
+    ]
+    for item in items:
+        lines.append(
+            '%-50s %-14s %11.1f%s' % (
+                item['package'][:50],
+                item['state'],
+                item['estimate'],
+                '' if item['known'] else '?'
+            )
+        )
+
+    builds = [i for i in items if i['state'] == BUILD]
+    durations = [i['estimate'] for i in builds]
+    counts = dict([(i, 0) for i in [CACHED, BUILD, FAILING]])
+    for item in items:
+        counts[item['state']] += 1
+
+    lines.append('')
+    lines.append(
+        'Packages: %s, cached: %s, needs-build: %s, known-failing: %s' % (
+            len(items), counts[CACHED], counts[BUILD], counts[FAILING]
+        )
+    )
+    if builds:
+        critical = max(builds, key=lambda i: i['estimate'])
+        lines.append(
+            'Critical path: %s (%.1fs)' % (
+                critical['package'], critical['estimate']
+            )
+        )
+        lines.append(
+            'Total build time: %.1fs, estimated wall time with %s'
+            ' workers: %.1fs' % (
+                sum(durations), workers, schedule(durations, workers)
+            )
+        )
+    unknown = len([i for i in builds if not i['known']])
+    if unknown:
+        lines.append(
+            'Packages without build metrics, estimated from the average'
+            ' (?): %s' % unknown
+        )
+    return lines
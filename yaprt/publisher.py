@@ -0,0 +1,344 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Publish a repository as atomically swapped generations.
+
+Every run stages a new generation of the repository, its storage pool,
+links and indexes, next to the generation being served. The staged
+generation starts as a copy of the current one made of hard links, so
+unchanged content is never copied. Once the run has finished the
+``current`` symlink is swapped to the new generation with a single rename,
+so clients only ever see a complete generation. Earlier generations are
+kept for rollback.
+
+Files within a generation are never written in place, they are always
+replaced by renaming a new file over them, so the hard links shared with
+other generations are never changed.
+
+Layout of the publish root::
+
+    current -> generations/20150601120000-1234
+    generations/20150601120000-1234/pool/
+    generations/20150601120000-1234/links/
+    generations/20150601110000-1180/
+"""
+
+import contextlib
+import os
+import shutil
+import time
+
+from cloudlib import logger
+
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+STAGING_PREFIX = '.staging-'
+
+
+class GenerationPublisher(object):
+    """Stage, commit and roll back generations of a repository.
+
+    Example:
+        >>> publisher = GenerationPublisher(publish_root='/var/www/repo')
+        >>> staging_dir = publisher.stage()
+        >>> # Write the pool, links and indexes within staging_dir.
+        >>> publisher.commit(staging_dir=staging_dir)
+        '/var/www/repo/generations/20150601120000-1234'
+    """
+    def __init__(self, publish_root, keep=5):
+        """Create the publish root if it does not exist.
+
+        :param publish_root: $PATH to the publish root.
+        :type publish_root: ``str``
+        :param keep: Number of generations kept, including the current one.
+        :type keep: ``int``
+        """
+        publish_root = utils.get_abs_path(file_name=publish_root)
+        self.publish_root = os.path.realpath(publish_root)
+        # Paths may be given through a symlinked parent of the root.
+        self._root_paths = [publish_root, self.publish_root]
+        self.generations_dir = os.path.join(self.publish_root, 'generations')
+        self.current_link = os.path.join(self.publish_root, 'current')
+        self.keep = max(int(keep), 1)
+        if not os.path.isdir(self.generations_dir):
+            os.makedirs(self.generations_dir)
+
+    def generations(self):
+        """Return the ``list`` of committed generations, oldest first.
+
+        :returns: ``list``
+        """
+        return sorted(
+            [
+                i for i in os.listdir(self.generations_dir)
+                if not i.startswith(STAGING_PREFIX)
+            ]
+        )
+
+    def current(self):
+        """Return the name of the current generation or ``None``.
+
+        :returns: ``str``
+        """
+        if os.path.islink(self.current_link):
+            return os.path.basename(os.readlink(self.current_link))
+        return None
+
+    @staticmethod
+    def _clone(src, dst, excludes=None):
+        """Copy a directory tree using hard links for every file.
+
+        Symlinks are copied as symlinks, which keeps the relative links of a
+        link directory pointing within the new tree.
+
+        :param src: $PATH to the tree being copied.
+        :type src: ``str``
+        :param dst: $PATH to the new tree.
+        :type dst: ``str``
+        :param excludes: Names within the top of the tree not copied.
+        :type excludes: ``list``
+        """
+        for dir_path, dir_names, file_names in os.walk(src):
+            if dir_path == src and excludes:
+                dir_names[:] = [i for i in dir_names if i not in excludes]
+                file_names = [i for i in file_names if i not in excludes]
+
+            target_dir = os.path.join(dst, os.path.relpath(dir_path, src))
+            if not os.path.isdir(target_dir):
+                os.makedirs(target_dir)
+
+            for name in dir_names + file_names:
+                src_path = os.path.join(dir_path, name)
+                dst_path = os.path.join(target_dir, name)
+                if os.path.islink(src_path):
+                    os.symlink(os.readlink(src_path), dst_path)
+                elif os.path.isfile(src_path):
+                    os.link(src_path, dst_path)
+
+    def stage(self):
+        """Return the $PATH to a new generation staged from the current one.
+
+        :returns: ``str``
+        """
+        generation = '%s-%d' % (
+            time.strftime('%Y%m%d%H%M%S', time.gmtime()),
+            os.getpid()
+        )
+        # Generations staged by a process within the same second are
+        # numbered, which keeps them sorted oldest first.
+        name, count = generation, 0
+        while [
+            i for i in [name, STAGING_PREFIX + name]
+            if os.path.exists(os.path.join(self.generations_dir, i))
+        ]:
+            count += 1
+            name = '%s-%03d' % (generation, count)
+        staging_dir = os.path.join(self.generations_dir, STAGING_PREFIX + name)
+        os.makedirs(staging_dir)
+
+        current = self.current()
+        if current:
+            LOG.info('Staging a new generation from [ %s ]', current)
+            self._clone(
+                src=os.path.join(self.generations_dir, current),
+                dst=staging_dir
+            )
+        else:
+            # The first generation starts from a repository published in
+            # place, if there is one.
+            self._clone(
+                src=self.publish_root,
+                dst=staging_dir,
+                excludes=['generations', 'current']
+            )
+        return staging_dir
+
+    def staged_path(self, path, staging_dir):
+        """Return where a path of the publish root is within a generation.
+
+        Paths can be given within the publish root or within its current
+        generation.
+
+        :param path: $PATH within the publish root.
+        :type path: ``str``
+        :param staging_dir: $PATH to the staged generation.
+        :type staging_dir: ``str``
+        :returns: ``str``
+        """
+        path = utils.get_abs_path(file_name=path)
+        relative = '..'
+        for root_path in self._root_paths:
+            if path == root_path or path.startswith(root_path + os.sep):
+                relative = os.path.relpath(path, root_path)
+                break
+
+        if relative.split(os.sep)[0] in ['..', 'generations']:
+            raise utils.AError(
+                'Path [ %s ] is not within the publish root [ %s ]',
+                path,
+                self.publish_root
+            )
+        elif relative.split(os.sep)[0] == 'current':
+            relative = os.path.relpath(relative, 'current')
+        return os.path.normpath(os.path.join(staging_dir, relative))
+
+    def _swap(self, generation):
+        """Point the current symlink at a generation with a single rename.
+
+        :param generation: Name of the generation.
+        :type generation: ``str``
+        """
+        temp_link = '%s.%d.tmp' % (self.current_link, os.getpid())
+        if os.path.islink(temp_link):
+            os.remove(temp_link)
+        os.symlink(os.path.join('generations', generation), temp_link)
+        os.rename(temp_link, self.current_link)
+        LOG.info('Current generation is now [ %s ]', generation)
+
+    def commit(self, staging_dir):
+        """Make a staged generation the current generation.
+
+        :param staging_dir: $PATH to the staged generation.
+        :type staging_dir: ``str``
+        :returns: ``str``
+        """
+        generation = os.path.basename(staging_dir)[len(STAGING_PREFIX):]
+        generation_dir = os.path.join(self.generations_dir, generation)
+        os.rename(staging_dir, generation_dir)
+        self._swap(generation=generation)
+        self.prune()
+        return generation_dir
+
+    @staticmethod
+    def abort(staging_dir):
+        """Remove a staged generation that will not be committed.
+
+        :param staging_dir: $PATH to the staged generation.
+        :type staging_dir: ``str``
+        """
+        LOG.warn('Removing uncommitted generation [ %s ]', staging_dir)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def prune(self):
+        """Remove the oldest generations beyond the number kept."""
+        current = self.current()
+        generations = [i for i in self.generations() if i != current]
+        for generation in generations[:max(len(generations) - self.keep + 1,
+                                           0)]:
+            LOG.info('Removing old generation [ %s ]', generation)
+            shutil.rmtree(
+                os.path.join(self.generations_dir, generation),
+                ignore_errors=True
+            )
+
+    def rollback(self, generation=None):
+        """Make an earlier generation the current generation.
+
+        :param generation: Name of the generation, by default the generation
+                           before the current one.
+        :type generation: ``str``
+        :returns: ``str``
+        """
+        generations = self.generations()
+        if not generation:
+            current = self.current()
+            if current not in generations:
+                raise utils.AError('No current generation to roll back from.')
+
+            index = generations.index(current)
+            if not index:
+                raise utils.AError(
+                    'Generation [ %s ] is the oldest generation kept.',
+                    current
+                )
+            generation = generations[index - 1]
+        elif generation not in generations:
+            raise utils.AError(
+                'Generation [ %s ] was not found within [ %s ]',
+                generation,
+                self.generations_dir
+            )
+
+        self._swap(generation=generation)
+        return generation
+
+
+class StagedGeneration(object):
+    """A staged generation, as yielded by ``staged_generation``."""
+    def __init__(self, publisher, staging_dir):
+        """Keep the publisher the generation was staged by.
+
+        :param publisher: Publisher of the generation.
+        :type publisher: ``object``
+        :param staging_dir: $PATH to the staged generation.
+        :type staging_dir: ``str``
+        """
+        self.publisher = publisher
+        self.staging_dir = staging_dir
+
+    def path(self, path):
+        """Return where a path of the publish root is within the generation.
+
+        :param path: $PATH within the publish root.
+        :type path: ``str``
+        :returns: ``str``
+        """
+        return self.publisher.staged_path(
+            path=path,
+            staging_dir=self.staging_dir
+        )
+
+
+@contextlib.contextmanager
+def staged_generation(publish_root, keep=5):
+    """Stage a generation, commit it on success and remove it on failure.
+
+    Example:
+        >>> with staged_generation(publish_root='/var/www/repo') as staged:
+        ...     # Write within staged.staging_dir.
+        ...     index_dir = staged.path(path='/var/www/repo/current/simple')
+
+    :param publish_root: $PATH to the publish root.
+    :type publish_root: ``str``
+    :param keep: Number of generations kept, including the current one.
+    :type keep: ``int``
+    """
+    generations = GenerationPublisher(publish_root=publish_root, keep=keep)
+    staging_dir = generations.stage()
+    staged = StagedGeneration(publisher=generations, staging_dir=staging_dir)
+    try:
+        yield staged
+    except (Exception, SystemExit):
+        generations.abort(staging_dir=staging_dir)
+        raise
+    else:
+        generations.commit(staging_dir=staging_dir)
+
+
+def rollback_publish(args):
+    """Roll the current generation of a publish root back.
+
+    :param args: Parsed arguments in dictionary format.
+    :type args: ``dict``
+    """
+    if not args['publish_root']:
+        raise utils.AError('Rolling back requires "--publish-root".')
+
+    publisher = GenerationPublisher(publish_root=args['publish_root'])
+    publisher.rollback(generation=args['generation'])
@@ -0,0 +1,343 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Split a build across multiple nodes and merge the results.
+
+Packages are assigned to shards using a stable hash of the package name so
+that every node, given the same report, computes the same partition without
+any coordination. When the historical build cost of packages is known the
+packages are instead assigned longest first to the least loaded shard.
+
+Each shard stores its wheels in its own storage pool and link directory which
+are then combined with ``merge_pools``.
+"""
+
+import hashlib
+import json
+import os
+
+from cloudlib import logger
+
+from yaprt import build_metrics
+from yaprt import hash_cache
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+
+def parse_shard(shard):
+    """Return a ``tuple`` of shard index and shard count.
+
+    Shards are written as "i/n" where "i" is the one based index of the
+    shard and "n" is the total number of shards.
+
+    :param shard: Shard string.
+    :type shard: ``str``
+    :returns: ``tuple``
+    """
+    try:
+        index, count = [int(i) for i in shard.split('/')]
+        assert 0 < index <= count
+    except (AssertionError, ValueError):
+        raise utils.AError(
+            'The shard "%s" is not valid. Shards must be in the format'
+            ' "i/n" where 1 <= i <= n.', shard
+        )
+    else:
+        return index, count
+
+
+def load_weights(weights_file):
+    """Return a ``dict`` of package names and their historical build cost.
+
+    A directory of build metrics, as written by ``--metrics-dir``, can be
+    used in place of the json file.
+
+    :param weights_file: $PATH to a json file of package name to cost.
+    :type weights_file: ``str``
+    :returns: ``dict``
+    """
+    if not weights_file:
+        return dict()
+
+    weights_file = utils.get_abs_path(file_name=weights_file)
+    if os.path.isdir(weights_file):
+        return build_metrics.package_costs(paths=[weights_file])
+
+    with open(weights_file, 'rb') as f:
+        weights = json.loads(f.read())
+
+    return dict([(k, float(v)) for k, v in weights.items()])
+
+
+def stable_hash(name):
+    """Return a stable integer hash for a name.
+
+    The built in ``hash`` can change between interpreters and platforms so
+    an md5 digest is used instead.
+
+    :param name: Name to hash.
+    :type name: ``str``
+    :returns: ``int``
+    """
+    return int(hashlib.md5(name).hexdigest(), 16)
+
+
+def assign_shards(names, shard_count, weights=None):
+    """Return a ``dict`` of names and the zero based shard they belong to.
+
+    :param names: List of names to assign.
+    :type names: ``list``
+    :param shard_count: Number of shards.
+    :type shard_count: ``int``
+    :param weights: Historical build cost for names.
+    :type weights: ``dict``
+    :returns: ``dict``
+    """
+    names = sorted(set(names))
+    if not weights:
+        return dict([(i, stable_hash(i) % shard_count) for i in names])
+
+    # Names without a known cost are given the average known cost.
+    default_cost = sum(weights.values()) / len(weights)
+    costs = [(weights.get(i, default_cost), i) for i in names]
+    costs.sort(key=lambda i: (-i[0], stable_hash(i[1])))
+
+    loads = [0.0] * shard_count
+    assignments = dict()
+    for cost, name in costs:
+        shard = loads.index(min(loads))
+        assignments[name] = shard
+        loads[shard] += cost
+
+    LOG.debug('Estimated shard loads: %s', loads)
+    return assignments
+
+
+def shard_packages(packages, shard, name_function, weights=None):
+    """Return the packages that belong to a given shard.
+
+    The original order of the packages is preserved.
+
+    :param packages: List of packages.
+    :type packages: ``list``
+    :param shard: Shard string in the format "i/n".
+    :type shard: ``str``
+    :param name_function: Function that returns the name of a package.
+    :type name_function: ``function``
+    :param weights: Historical build cost for package names.
+    :type weights: ``dict``
+    :returns: ``list``
+    """
+    index, count = parse_shard(shard=shard)
+    names = [(name_function(i), i) for i in packages]
+    assignments = assign_shards(
+        names=[i[0] for i in names],
+        shard_count=count,
+        weights=weights
+    )
+    selected = [i[1] for i in names if assignments[i[0]] == index - 1]
+    LOG.info(
+        'Shard %s selected %d of %d packages', shard, len(selected),
+        len(packages)
+    )
+    return selected
+
+
+def _merge_text_file(src, dst):
+    """Merge the unique lines of a source text file into a destination file.
+
+    :param src: $PATH to source file.
+    :type src: ``str``
+    :param dst: $PATH to destination file.
+    :type dst: ``str``
+    """
+    lines = set()
+    for file_name in [src, dst]:
+        if os.path.isfile(file_name):
+            with open(file_name, 'rb') as f:
+                lines.update([i.strip() for i in f.readlines() if i.strip()])
+
+    with open(dst, 'wb') as f:
+        f.writelines(['%s\n' % i for i in sorted(lines)])
+
+
+def _link_wheel(pool_file, link_dir):
+    """Create a relative symlink to a pool file within a link directory.
+
+    :param pool_file: $PATH to a wheel within a storage pool.
+    :type pool_file: ``str``
+    :param link_dir: $PATH to the link directory.
+    :type link_dir: ``str``
+    """
+    link_path = os.path.join(link_dir, os.path.basename(pool_file))
+    if os.path.islink(link_path):
+        if os.path.realpath(link_path) == os.path.realpath(pool_file):
+            return
+        os.remove(link_path)
+
+    os.symlink(os.path.relpath(pool_file, link_dir), link_path)
+
+
+def _same_content(file_a, file_b, cache=None):
+    """Return ``True`` if two files have the same content.
+
+    :param file_a: $PATH to a file.
+    :type file_a: ``str``
+    :param file_b: $PATH to a file.
+    :type file_b: ``str``
+    :param cache: Hash cache, or ``None`` to always read the files.
+    :type cache: ``object``
+    :returns: ``bol``
+    """
+    if os.path.getsize(file_a) != os.path.getsize(file_b):
+        return False
+
+    return hash_cache.hash_return(
+        local_file=file_a,
+        cache=cache
+    ) == hash_cache.hash_return(
+        local_file=file_b,
+        cache=cache
+    )
+
+
+def _find_conflicts(source_pools, storage_pool, cache=None):
+    """Return a ``tuple`` of merge sources and conflicting files.
+
+    Files already within the destination storage pool are checked as if the
+    destination was the first pool.
+
+    :param source_pools: List of storage pool paths.
+    :type source_pools: ``list``
+    :param storage_pool: $PATH to the destination storage pool.
+    :type storage_pool: ``str``
+    :param cache: Hash cache, or ``None`` to always read the files.
+    :type cache: ``object``
+    :returns: ``tuple``
+    """
+    sources = dict()
+    conflicts = dict()
+    for pool in source_pools:
+        for file_name in sorted(utils.get_file_names(path=pool)):
+            rel_name = os.path.relpath(file_name, pool)
+            if rel_name not in sources:
+                sources[rel_name] = file_name
+                continue
+
+            existing = sources[rel_name]
+            if not _same_content(existing, file_name, cache=cache):
+                conflicts.setdefault(rel_name, [existing]).append(file_name)
+
+    for rel_name, src_file in sorted(sources.items()):
+        dst_file = os.path.join(storage_pool, rel_name)
+        if os.path.isfile(dst_file):
+            if not _same_content(dst_file, src_file, cache=cache):
+                conflicts[rel_name] = [dst_file] + conflicts.get(
+                    rel_name, [src_file]
+                )
+
+    return sources, conflicts
+
+
+def merge_pools(args):
+    """Merge the storage pools and link directories of multiple shards.
+
+    Wheels with the same name in more than one pool, or already within the
+    destination pool, must have the same content, otherwise the merge will
+    stop before anything is written unless conflicts are being ignored, in
+    which case the destination pool and then the first pool wins.
+
+    :param args: Parsed arguments in dictionary format.
+    :type args: ``dict``
+    """
+    source_pools = [utils.get_abs_path(i) for i in args['source_pools']]
+    storage_pool = utils.get_abs_path(file_name=args['storage_pool'])
+    if args.get('hash_cache'):
+        cache = hash_cache.HashCache(cache_file=args['hash_cache'])
+    else:
+        cache = None
+    try:
+        sources, conflicts = _find_conflicts(
+            source_pools=source_pools,
+            storage_pool=storage_pool,
+            cache=cache
+        )
+    finally:
+        if cache:
+            cache.close()
+    if conflicts and not args['ignore_conflicts']:
+        raise utils.AError(
+            'Found %s conflicting files while merging pools: %s',
+            len(conflicts),
+            json.dumps(conflicts, indent=4, sort_keys=True)
+        )
+    elif conflicts:
+        LOG.warn(
+            'Ignoring %d conflicting files, the destination pool or the first'
+            ' pool will be used: %s',
+            len(conflicts),
+            sorted(conflicts.keys())
+        )
+
+    for rel_name, src_file in sorted(sources.items()):
+        dst_file = os.path.join(storage_pool, rel_name)
+        if os.path.isfile(dst_file):
+            # The same file, or a conflict the destination wins.
+            continue
+
+        dst_dir = os.path.dirname(dst_file)
+        if not os.path.isdir(dst_dir):
+            os.makedirs(dst_dir)
+        utils.copy_file(src=src_file, dst=dst_file)
+
+    LOG.info('Merged %d files into [ %s ]', len(sources), storage_pool)
+
+    if not args['link_dir']:
+        return
+
+    link_dir = args['link_dir']
+    if not os.path.isdir(link_dir):
+        os.makedirs(link_dir)
+
+    pool_files = dict(
+        [
+            (os.path.basename(i), os.path.join(storage_pool, i))
+            for i in sources.keys()
+        ]
+    )
+    for source_link_dir in args['source_link_dirs'] or list():
+        source_link_dir = utils.get_abs_path(file_name=source_link_dir)
+        for file_name in sorted(os.listdir(source_link_dir)):
+            src_path = os.path.join(source_link_dir, file_name)
+            if os.path.islink(src_path):
+                if file_name in pool_files:
+                    _link_wheel(
+                        pool_file=pool_files[file_name],
+                        link_dir=link_dir
+                    )
+                else:
+                    LOG.warn(
+                        'The link [ %s ] has no matching file in the merged'
+                        ' storage pool and was skipped.', src_path
+                    )
+            elif os.path.isfile(src_path):
+                # Files such as "build_reqs.txt" are written by every shard.
+                _merge_text_file(
+                    src=src_path,
+                    dst=os.path.join(link_dir, file_name)
+                )
@@ -0,0 +1,330 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Create a PEP 503 simple repository from a storage pool.
+
+Every wheel within the storage pool is listed on the page of its normalised
+project name, ``<simple-dir>/<project>/index.html``, and the root page lists
+every project. Links carry the ``#sha256=`` of the wheel, so pip checks
+every download, and the ``data-dist-info-metadata`` hash of the
+``METADATA`` of the wheel, which is extracted next to it as
+``<wheel>.metadata`` (PEP 658). Resolving against the index only downloads
+the metadata of the versions pip considers, not the whole wheels.
+
+Wheels are linked into the project directories with relative symlinks into
+the storage pool, so the simple repository is served from its own directory
+and the storage pool is never changed.
+
+Layout of the simple directory::
+
+    index.html
+    python-foo/index.html
+    python-foo/python_foo-1.0.0-py2-none-any.whl -> ../../pool/...
+    python-foo/python_foo-1.0.0-py2-none-any.whl.metadata
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import zipfile
+import zlib
+
+from cloudlib import logger
+
+from yaprt import hash_cache
+from yaprt import html_writer
+from yaprt import publisher
+from yaprt import utils
+from yaprt import wheel_verify
+
+
+LOG = logger.getLogger('repo_builder')
+
+
+def normalize(name):
+    """Return a project name normalised as required by PEP 503.
+
+    :param name: Project name.
+    :type name: ``str``
+    :returns: ``str``
+    """
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def _write_page(page_file, title, links, cache=None):
+    """Write a simple repository page, replacing it only when changed.
+
+    :param page_file: $PATH to the page.
+    :type page_file: ``str``
+    :param title: Title of the page.
+    :type title: ``str``
+    :param links: List of anchor lines.
+    :type links: ``list``
+    :param cache: Hash cache used to hash the existing page, or ``None``.
+    :type cache: ``object``
+    """
+    with html_writer.PageWriter(page_file=page_file, cache=cache) as page:
+        page.write(
+            '<!DOCTYPE html>\n<html>\n<head>\n'
+            '<meta name="pypi:repository-version" content="1.0">\n'
+            '<title>%s</title>\n</head>\n<body>\n<h1>%s</h1>\n' % (
+                html_writer.escape(title), html_writer.escape(title)
+            )
+        )
+        for link in links:
+            page.write('%s\n' % link)
+        page.write('</body>\n</html>\n')
+
+
+def _extract_metadata(wheel_file, metadata_file):
+    """Extract the ``METADATA`` of a wheel, returning its content.
+
+    A metadata file newer than its wheel is read instead of the wheel.
+
+    :param wheel_file: $PATH to the wheel.
+    :type wheel_file: ``str``
+    :param metadata_file: $PATH to the extracted metadata.
+    :type metadata_file: ``str``
+    :returns: ``str``
+    """
+    if os.path.isfile(metadata_file):
+        if os.path.getmtime(metadata_file) >= os.path.getmtime(wheel_file):
+            with open(metadata_file, 'rb') as f:
+                return f.read()
+
+    try:
+        with zipfile.ZipFile(wheel_file) as archive:
+            names = [
+                i for i in archive.namelist()
+                if i.count('/') == 1 and i.endswith('.dist-info/METADATA')
+            ]
+            if len(names) != 1:
+                LOG.warn(
+                    'Wheel [ %s ] has %s METADATA files, metadata is not'
+                    ' published for it.',
+                    wheel_file,
+                    len(names)
+                )
+                return None
+            metadata = archive.read(names[0])
+    except (zipfile.BadZipfile, zlib.error, IOError) as exp:
+        LOG.warn('Wheel [ %s ] can not be read: %s', wheel_file, exp)
+        return None
+
+    temp_file = '%s.%d.tmp' % (metadata_file, os.getpid())
+    with open(temp_file, 'wb') as f:
+        f.write(metadata)
+    os.rename(temp_file, metadata_file)
+    return metadata
+
+
+def _requires_python(metadata):
+    """Return the ``Requires-Python`` of wheel metadata or ``None``.
+
+    :param metadata: Content of a ``METADATA`` file.
+    :type metadata: ``str``
+    :returns: ``str``
+    """
+    for key, value in wheel_verify.headers(metadata):
+        if key.lower() == 'requires-python' and value:
+            return value
+    return None
+
+
+def _link_wheel(wheel_file, project_dir, cache):
+    """Link a wheel into its project directory and return its anchor line.
+
+    :param wheel_file: $PATH to the wheel within the storage pool.
+    :type wheel_file: ``str``
+    :param project_dir: $PATH to the project directory.
+    :type project_dir: ``str``
+    :param cache: Hash cache, or ``None`` to always read the wheel.
+    :type cache: ``object``
+    :returns: ``str``
+    """
+    wheel_name = os.path.basename(wheel_file)
+    link_path = os.path.join(project_dir, wheel_name)
+    target = os.path.relpath(wheel_file, project_dir)
+    if not os.path.islink(link_path) or os.readlink(link_path) != target:
+        temp_link = '%s.%d.tmp' % (link_path, os.getpid())
+        os.symlink(target, temp_link)
+        os.rename(temp_link, link_path)
+
+    digest = hash_cache.hash_return(
+        local_file=wheel_file,
+        hash_type='sha256',
+        cache=cache
+    )
+    attributes = [
+        ('href', '%s#sha256=%s' % (wheel_name, digest))
+    ]
+
+    metadata = _extract_metadata(
+        wheel_file=wheel_file,
+        metadata_file='%s.metadata' % link_path
+    )
+    if metadata is not None:
+        requires_python = _requires_python(metadata=metadata)
+        if requires_python:
+            attributes.append(('data-requires-python', requires_python))
+        metadata_hash = 'sha256=%s' % hashlib.sha256(metadata).hexdigest()
+        # PEP 714 renamed the attribute, both are written for older pips.
+        attributes.append(('data-dist-info-metadata', metadata_hash))
+        attributes.append(('data-core-metadata', metadata_hash))
+
+    return '<a %s>%s</a><br/>' % (
+        ' '.join(
+            [
+                '%s="%s"' % (k, html_writer.escape(v, quote=True))
+                for k, v in attributes
+            ]
+        ),
+        html_writer.escape(wheel_name)
+    )
+
+
+def _remove_stale(directory, expected):
+    """Remove the entries of a directory that are no longer published.
+
+    :param directory: $PATH to the directory.
+    :type directory: ``str``
+    :param expected: Names of the entries that are published.
+    :type expected: ``list``
+    """
+    expected = set(expected)
+    for name in os.listdir(directory):
+        if name in expected:
+            continue
+
+        path = os.path.join(directory, name)
+        LOG.debug('Removing stale simple index entry [ %s ]', path)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def _create_simple_index(storage_pool, simple_dir, cache=None, workers=1):
+    """Create the simple repository of a storage pool.
+
+    :param storage_pool: $PATH to the storage pool.
+    :type storage_pool: ``str``
+    :param simple_dir: $PATH to the simple repository directory.
+    :type simple_dir: ``str``
+    :param cache: Hash cache, or ``None`` to always read every wheel.
+    :type cache: ``object``
+    :param workers: Number of threads hashing wheels and writing pages.
+    :type workers: ``int``
+    """
+    projects = dict()
+    for wheel_file in sorted(utils.get_file_names(path=storage_pool)):
+        match = wheel_verify.WHEEL_NAME.match(os.path.basename(wheel_file))
+        if match:
+            projects.setdefault(
+                normalize(match.group('name')), list()
+            ).append(wheel_file)
+
+    if not os.path.isdir(simple_dir):
+        os.makedirs(simple_dir)
+
+    def _project_page(project):
+        project_dir = os.path.join(simple_dir, project)
+        if not os.path.isdir(project_dir):
+            os.makedirs(project_dir)
+
+        wheel_files = sorted(
+            projects[project],
+            key=lambda i: os.path.basename(i)
+        )
+        links = [
+            _link_wheel(wheel_file=i, project_dir=project_dir, cache=cache)
+            for i in wheel_files
+        ]
+        expected = ['index.html']
+        for wheel_file in wheel_files:
+            expected.append(os.path.basename(wheel_file))
+            expected.append('%s.metadata' % os.path.basename(wheel_file))
+        _remove_stale(directory=project_dir, expected=expected)
+        _write_page(
+            page_file=os.path.join(project_dir, 'index.html'),
+            title='Links for %s' % project,
+            links=links,
+            cache=cache
+        )
+
+    utils.thread_map(
+        function=_project_page,
+        items=sorted(projects),
+        workers=workers
+    )
+
+    _remove_stale(
+        directory=simple_dir,
+        expected=['index.html'] + sorted(projects)
+    )
+    _write_page(
+        page_file=os.path.join(simple_dir, 'index.html'),
+        title='Simple index',
+        links=[
+            '<a href="%s/">%s</a><br/>' % (
+                html_writer.escape(i, quote=True), html_writer.escape(i)
+            )
+            for i in sorted(projects)
+        ],
+        cache=cache
+    )
+    LOG.info(
+        'Simple index of %s projects created within [ %s ]',
+        len(projects),
+        simple_dir
+    )
+
+
+def create_simple_index(args):
+    """Create a PEP 503 simple repository of a storage pool.
+
+    :param args: Parsed arguments in dictionary format.
+    :type args: ``dict``
+    """
+    storage_pool = utils.get_abs_path(file_name=args['storage_pool'])
+    simple_dir = utils.get_abs_path(file_name=args['simple_dir'])
+    if args.get('hash_cache'):
+        cache = hash_cache.HashCache(cache_file=args['hash_cache'])
+    else:
+        cache = None
+
+    try:
+        if not args.get('publish_root'):
+            return _create_simple_index(
+                storage_pool=storage_pool,
+                simple_dir=simple_dir,
+                cache=cache,
+                workers=args.get('index_workers') or 1
+            )
+
+        with publisher.staged_generation(
+                publish_root=args['publish_root'],
+                keep=args['keep_generations']) as staged:
+            _create_simple_index(
+                storage_pool=staged.path(path=storage_pool),
+                simple_dir=staged.path(path=simple_dir),
+                cache=cache,
+                workers=args.get('index_workers') or 1
+            )
+    finally:
+        if cache:
+            cache.close()
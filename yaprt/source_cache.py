@@ -0,0 +1,264 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Persistent content addressed cache of package sources.
+
+Sources, sdists and wheels, are downloaded by ``pip download`` into the
+cache before any package is built. Every file is stored once under the
+sha256 of its content within the ``objects`` directory and is linked, by its
+file name, from the ``links`` directory which builds use with
+``--find-links``. Objects keep their file name because pip resolves the
+links and uses the name to tell sdists from wheels. A requirement pinned to
+an exact version with ``==`` that can be resolved from the cache alone is not
+downloaded again. Any other requirement is always resolved against the
+package index, so a newer release is never hidden by an older cached one.
+
+Layout of the cache directory::
+
+    objects/e3/e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca4959.../
+        six-1.9.0.tar.gz
+    links/six-1.9.0.tar.gz -> ../objects/e3/e3b0c442.../six-1.9.0.tar.gz
+    tmp/
+"""
+
+import errno
+import os
+import shutil
+import tempfile
+import threading
+from multiprocessing import pool
+
+from cloudlib import logger
+from cloudlib import shell
+import pkg_resources
+
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+CACHED = 'cached'
+FETCHED = 'fetched'
+FAILED = 'failed'
+
+
+def exact_pin(requirement):
+    """Return ``True`` if a requirement is pinned to a single version.
+
+    :param requirement: Requirement to check.
+    :type requirement: ``str``
+    :returns: ``bol``
+    """
+    try:
+        specs = pkg_resources.Requirement.parse(requirement).specs
+    except ValueError:
+        return False
+
+    if len(specs) != 1:
+        return False
+    operator, version = specs[0]
+    return operator in ['==', '==='] and '*' not in version
+
+
+class SourceCache(object):
+    """Download package sources into a content addressed cache.
+
+    Example:
+        >>> cache = SourceCache(cache_dir='/var/cache/yaprt/sources')
+        >>> cache.prefetch(requirements=['six', 'pbr>=1.3'], pip_args=[])
+        {'cached': ['six'], 'fetched': ['pbr>=1.3'], 'failed': []}
+        >>> cache.links_dir
+        '/var/cache/yaprt/sources/links'
+    """
+    def __init__(self, cache_dir, workers=4, refresh=False, debug=False):
+        """Create the cache directories if they do not exist.
+
+        :param cache_dir: $PATH to the cache directory.
+        :type cache_dir: ``str``
+        :param workers: Number of concurrent downloads.
+        :type workers: ``int``
+        :param refresh: Resolve every requirement against the package index
+                        even if it is pinned and the cache can satisfy it.
+        :type refresh: ``bol``
+        :param debug: Enable debug mode for the download commands.
+        :type debug: ``bol``
+        """
+        self.cache_dir = utils.get_abs_path(file_name=cache_dir)
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.links_dir = os.path.join(self.cache_dir, 'links')
+        self.tmp_dir = os.path.join(self.cache_dir, 'tmp')
+        self.workers = workers
+        self.refresh = refresh
+        self.shell_cmds = shell.ShellCommands(
+            log_name='repo_builder',
+            debug=debug
+        )
+        for directory in [self.objects_dir, self.links_dir, self.tmp_dir]:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+    def _store(self, file_path):
+        """Move a downloaded file into the cache and link it by name.
+
+        :param file_path: $PATH to the downloaded file.
+        :type file_path: ``str``
+        """
+        file_name = os.path.basename(file_path)
+        digest = utils.hash_return(local_file=file_path, hash_type='sha256')
+        object_path = os.path.join(
+            self.objects_dir,
+            digest[:2],
+            digest,
+            file_name
+        )
+        if not os.path.isfile(object_path):
+            object_dir = os.path.dirname(object_path)
+            if not os.path.isdir(object_dir):
+                try:
+                    os.makedirs(object_dir)
+                except OSError:
+                    # Created by a concurrent download.
+                    pass
+            os.rename(file_path, object_path)
+
+        link_path = os.path.join(self.links_dir, file_name)
+        if os.path.realpath(link_path) == os.path.realpath(object_path):
+            return
+
+        if os.path.exists(link_path):
+            LOG.warn(
+                'Source [ %s ] changed upstream, linking the new content.',
+                file_name
+            )
+
+        # Replace the link atomically so builds never see a missing file.
+        # Every thread of every process uses its own temporary link.
+        target = os.path.relpath(object_path, self.links_dir)
+        temp_link = '%s.%d.%d.tmp' % (
+            link_path,
+            os.getpid(),
+            threading.current_thread().ident
+        )
+        try:
+            os.symlink(target, temp_link)
+        except OSError as exp:
+            if exp.errno != errno.EEXIST:
+                raise
+            elif os.path.realpath(link_path) == os.path.realpath(object_path):
+                return
+            # Left behind by an earlier process with the same pid.
+            os.remove(temp_link)
+            os.symlink(target, temp_link)
+        os.rename(temp_link, link_path)
+
+    def _download(self, requirement, pip_args, offline=False):
+        """Download a requirement and store all of its files.
+
+        :param requirement: Requirement to download.
+        :type requirement: ``str``
+        :param pip_args: Index, link and dependency arguments for pip.
+        :type pip_args: ``list``
+        :param offline: Only resolve the requirement from the cache.
+        :type offline: ``bol``
+        :returns: ``bol``
+        """
+        dest_dir = tempfile.mkdtemp(prefix='download_', dir=self.tmp_dir)
+        try:
+            command = ['pip', 'download', '--dest', dest_dir]
+            if offline:
+                command.extend(['--no-index', '--find-links', self.links_dir])
+                command.extend(
+                    [i for i in pip_args if i in ['--pre', '--no-deps']]
+                )
+            else:
+                command.extend(pip_args)
+            command.append('"%s"' % utils.stip_quotes(item=requirement))
+
+            _, success = self.shell_cmds.run_command(
+                command=' '.join(command)
+            )
+            if success:
+                for file_name in os.listdir(dest_dir):
+                    self._store(file_path=os.path.join(dest_dir, file_name))
+            return success
+        finally:
+            shutil.rmtree(dest_dir, ignore_errors=True)
+
+    def fetch(self, requirement, pip_args):
+        """Make sure the sources of a requirement are within the cache.
+
+        Only a requirement pinned to an exact version is resolved from the
+        cache alone first, unless the cache is being refreshed.
+
+        :param requirement: Requirement to fetch.
+        :type requirement: ``str``
+        :param pip_args: Index, link and dependency arguments for pip.
+        :type pip_args: ``list``
+        :returns: ``str``
+        """
+        if not self.refresh and exact_pin(requirement=requirement):
+            cached = self._download(
+                requirement=requirement,
+                pip_args=pip_args,
+                offline=True
+            )
+            if cached:
+                return CACHED
+
+        if self._download(requirement=requirement, pip_args=pip_args):
+            return FETCHED
+        else:
+            LOG.warn('Failed to prefetch sources for "%s"', requirement)
+            return FAILED
+
+    def prefetch(self, requirements, pip_args):
+        """Fetch the sources of all requirements concurrently.
+
+        The returned ``dict`` has the requirements that were found in the
+        cache, fetched and that failed to fetch.
+
+        :param requirements: List of requirements to fetch.
+        :type requirements: ``list``
+        :param pip_args: Index, link and dependency arguments for pip.
+        :type pip_args: ``list``
+        :returns: ``dict``
+        """
+        results = dict([(i, list()) for i in [CACHED, FETCHED, FAILED]])
+        if not requirements:
+            return results
+
+        worker_pool = pool.ThreadPool(
+            processes=min(self.workers, len(requirements))
+        )
+        try:
+            states = worker_pool.map(
+                lambda i: self.fetch(requirement=i, pip_args=pip_args),
+                requirements
+            )
+        finally:
+            worker_pool.close()
+            worker_pool.join()
+
+        for requirement, state in zip(requirements, states):
+            results[state].append(requirement)
+
+        LOG.info(
+            'Prefetched sources, cached: %d, fetched: %d, failed: %d',
+            len(results[CACHED]),
+            len(results[FETCHED]),
+            len(results[FAILED])
+        )
+        return results
@@ -0,0 +1,335 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Run build commands with a wall clock timeout and resource limits.
+
+Every supervised command is started in its own process group. When the wall
+clock timeout is reached the entire process group is killed. CPU time and
+memory are limited with ``setrlimit`` and are applied to every process that
+is started by the command. The kernel only stops the process that breached a
+limit, so once the command has exited with a breach the rest of its process
+group is killed too. Breaches are classified from the exit status and the
+resource usage of the command. A process that reaches the memory limit is
+not killed, its allocations fail, so the allocation errors written by
+compilers and python are also looked for when a memory limit is set.
+
+Limits are set globally and can be overridden for packages whose name
+matches a shell style pattern, for example::
+
+    {
+        "lxml": {"timeout": 3600, "memory": 4096},
+        "python-*client": {"timeout": 300}
+    }
+
+The ``timeout`` and ``cpu`` limits are in seconds and ``memory`` is in
+megabytes. The first matching pattern is used.
+"""
+
+import collections
+import fnmatch
+import json
+import os
+import resource
+import signal
+import subprocess
+import tempfile
+import threading
+
+from cloudlib import logger
+
+from yaprt import tracing
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+LIMIT_KEYS = ['timeout', 'cpu', 'memory']
+
+# Output written by compilers and python when an allocation fails.
+MEMORY_ERRORS = [
+    'MemoryError',
+    'Cannot allocate memory',
+    'out of memory',
+    'virtual memory exhausted'
+]
+
+# Share of the memory limit the largest process of a failed command must
+# have had resident for the failure to be counted as running out of memory.
+# The limit is on address space, which is never all resident.
+MEMORY_RESIDENT_SHARE = 0.8
+
+
+class LimitExceeded(utils.AError):
+    """A build exceeded one of its limits."""
+
+    failure_class = 'limit'
+
+
+class BuildTimeout(LimitExceeded):
+    """A build exceeded its wall clock timeout."""
+
+    failure_class = 'timeout'
+
+
+class CPULimitExceeded(LimitExceeded):
+    """A build exceeded its CPU time limit."""
+
+    failure_class = 'cpu'
+
+
+class MemoryLimitExceeded(LimitExceeded):
+    """A build exceeded its memory limit."""
+
+    failure_class = 'memory'
+
+
+def load_limits(args):
+    """Return a ``tuple`` of the default limits and the package limits.
+
+    :param args: User defined arguments.
+    :type args: ``dict``
+    :returns: ``tuple``
+    """
+    default_limits = {
+        'timeout': args.get('build_timeout'),
+        'cpu': args.get('build_cpu_limit'),
+        'memory': args.get('build_memory_limit')
+    }
+
+    package_limits = collections.OrderedDict()
+    limits_file = args.get('build_limits_file')
+    if limits_file:
+        with open(utils.get_abs_path(file_name=limits_file), 'rb') as f:
+            package_limits = json.loads(
+                f.read(),
+                object_pairs_hook=collections.OrderedDict
+            )
+
+    return default_limits, package_limits
+
+
+def limits_for(name, default_limits, package_limits):
+    """Return the limits for a package name.
+
+    :param name: Name of the package.
+    :type name: ``str``
+    :param default_limits: Limits used when no pattern overrides them.
+    :type default_limits: ``dict``
+    :param package_limits: Package name patterns and their limits.
+    :type package_limits: ``dict``
+    :returns: ``dict``
+    """
+    limits = default_limits.copy()
+    for pattern, pattern_limits in package_limits.items():
+        if fnmatch.fnmatch(name, pattern):
+            for key in LIMIT_KEYS:
+                if key in pattern_limits:
+                    limits[key] = pattern_limits[key]
+            break
+    return limits
+
+
+def has_limits(limits):
+    """Return ``True`` if any limit is set.
+
+    :param limits: Build limits.
+    :type limits: ``dict``
+    :returns: ``bol``
+    """
+    return any([limits.get(i) for i in LIMIT_KEYS])
+
+
+def _signal_number(status):
+    """Return the signal that ended a command or ``None``.
+
+    Signals that ended the last process started by the shell are returned
+    by the shell as an exit status of 128 plus the signal number.
+
+    :param status: Status returned by ``os.wait4``.
+    :type status: ``int``
+    :returns: ``int``
+    """
+    if os.WIFSIGNALED(status):
+        return os.WTERMSIG(status)
+    elif os.WEXITSTATUS(status) > 128:
+        return os.WEXITSTATUS(status) - 128
+    return None
+
+
+def limit_breached(status, usage, limits, output=''):
+    """Return the limit a failed command breached or ``None``.
+
+    The CPU limit was breached when the command was ended by ``SIGXCPU``,
+    or when its processes used at least the limit in CPU time, which the
+    hard limit's ``SIGKILL`` is only sent after. The memory limit was
+    breached when the command was otherwise killed, an allocation failed
+    within it, or its largest process had most of the limit resident.
+
+    :param status: Status returned by ``os.wait4``.
+    :type status: ``int``
+    :param usage: Resource usage returned by ``os.wait4``.
+    :type usage: ``object``
+    :param limits: Build limits.
+    :type limits: ``dict``
+    :param output: Output of the command.
+    :type output: ``str``
+    :returns: ``str``
+    """
+    signal_number = _signal_number(status=status)
+    cpu_limit = limits.get('cpu')
+    if cpu_limit:
+        if signal_number == signal.SIGXCPU:
+            return 'cpu'
+        elif usage.ru_utime + usage.ru_stime >= float(cpu_limit):
+            return 'cpu'
+
+    memory_limit = limits.get('memory')
+    if memory_limit:
+        if signal_number == signal.SIGKILL:
+            return 'memory'
+        elif [i for i in MEMORY_ERRORS if i in output]:
+            return 'memory'
+
+        # ``ru_maxrss`` is in kilobytes.
+        memory_kb = int(memory_limit) * 1024
+        if usage.ru_maxrss >= memory_kb * MEMORY_RESIDENT_SHARE:
+            return 'memory'
+    return None
+
+
+def run_command(command, limits, env=None, usage_callback=None):
+    """Run a shell command within the limits given.
+
+    :param command: list object containing parts of a shell command.
+    :type command: ``list``
+    :param limits: Build limits.
+    :type limits: ``dict``
+    :param env: Environment of the command.
+    :type env: ``dict``
+    :param usage_callback: Called with the resource usage of the command.
+    :type usage_callback: ``object``
+    :returns: ``tuple``
+    """
+    command = ' '.join(command)
+    LOG.info('Supervised command: [ %s ], Limits: %s', command, limits)
+    cpu_limit = limits.get('cpu')
+    memory_limit = limits.get('memory')
+
+    def _preexec():
+        """Start a new process group and set the resource limits."""
+        os.setsid()
+        if cpu_limit:
+            # The soft limit sends SIGXCPU and the hard limit SIGKILL.
+            resource.setrlimit(
+                resource.RLIMIT_CPU,
+                (int(cpu_limit), int(cpu_limit) + 5)
+            )
+        if memory_limit:
+            memory_bytes = int(memory_limit) * 1024 * 1024
+            resource.setrlimit(
+                resource.RLIMIT_AS,
+                (memory_bytes, memory_bytes)
+            )
+
+    with tempfile.TemporaryFile() as output:
+        process = subprocess.Popen(
+            command,
+            stdout=output,
+            stderr=subprocess.STDOUT,
+            executable='/bin/bash',
+            env=env,
+            shell=True,
+            preexec_fn=_preexec
+        )
+
+        timed_out = threading.Event()
+
+        def _kill():
+            """Kill the whole process group of the command."""
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+        def _timeout():
+            """Kill the command once its timeout has been reached."""
+            timed_out.set()
+            _kill()
+
+        timer = None
+        if limits.get('timeout'):
+            timer = threading.Timer(float(limits['timeout']), _timeout)
+            timer.daemon = True
+            timer.start()
+        try:
+            # wait4 returns the resource usage of the command and of all of
+            # the processes it waited for.
+            with tracing.span('command', 'command', command=command,
+                              cwd=os.getcwd(), limits=limits):
+                _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            if timer:
+                timer.cancel()
+                timer.join()
+
+        output.seek(0)
+        data = output.read()
+
+        breached = None
+        if not timed_out.is_set() and status:
+            breached = limit_breached(
+                status=status,
+                usage=usage,
+                limits=limits,
+                output=data
+            )
+            if breached:
+                # Processes of the group which did not breach the limit are
+                # still running.
+                _kill()
+
+        if os.WIFSIGNALED(status):
+            return_code = -os.WTERMSIG(status)
+        else:
+            return_code = os.WEXITSTATUS(status)
+        process.returncode = return_code
+        if usage_callback:
+            usage_callback(usage)
+
+    LOG.debug('Command Output: %s, Return Code: %s', data, return_code)
+    if timed_out.is_set():
+        raise BuildTimeout(
+            'Command exceeded its timeout of %s seconds: [ %s ]',
+            limits['timeout'],
+            command
+        )
+    elif return_code == 0:
+        return data, True
+
+    if breached == 'cpu':
+        raise CPULimitExceeded(
+            'Command exceeded its CPU limit of %s seconds: [ %s ]',
+            limits['cpu'],
+            command
+        )
+    elif breached == 'memory':
+        raise MemoryLimitExceeded(
+            'Command exceeded its memory limit of %s MB: [ %s ]',
+            limits['memory'],
+            command
+        )
+    else:
+        return data, False
@@ -0,0 +1,104 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from yaprt import build_engine
+
+
+SETUP = """from setuptools import setup
+setup(name='%(name)s', version='1.0', packages=['%(name)s'])
+"""
+
+PYPROJECT = """[build-system]
+requires = []
+build-backend = "backend"
+backend-path = ["_backend"]
+"""
+
+BACKEND = """import os
+def build_wheel(wheel_directory, *args, **kwargs):
+    name = '%(name)s-1.0-py2-none-any.whl'
+    open(os.path.join(wheel_directory, name), 'w').close()
+    return name
+"""
+
+
+class TestBuildEngine(unittest.TestCase):
+    """Builds within a single long lived worker."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.wheel_dir = os.path.join(self.work_dir, 'wheels')
+        self.engine = build_engine.BuildEngine()
+
+    def tearDown(self):
+        self.engine.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _write(self, path, content):
+        path = os.path.join(self.work_dir, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    @unittest.skipUnless(
+        build_engine.requirements_satisfied(requires=['setuptools', 'wheel']),
+        'setuptools and wheel are required'
+    )
+    def test_rebuild_source_tree(self):
+        for name in ['pkg_a', 'pkg_b']:
+            self._write('%s/setup.py' % name, SETUP % {'name': name})
+            self._write('%s/%s/__init__.py' % (name, name), '')
+
+        for name in ['pkg_a', 'pkg_b', 'pkg_a']:
+            source_dir = os.path.join(self.work_dir, name)
+            self.assertEqual(
+                self.engine.build(
+                    source_dir=source_dir,
+                    wheel_dir=self.wheel_dir
+                ),
+                '%s-1.0-py2-none-any.whl' % name
+            )
+            # Nothing is written within the source tree.
+            self.assertEqual(
+                sorted(os.listdir(source_dir)),
+                [name, 'setup.py']
+            )
+
+    def test_in_tree_backends(self):
+        for name in ['pkg_a', 'pkg_b']:
+            self._write('%s/pyproject.toml' % name, PYPROJECT)
+            self._write(
+                '%s/_backend/backend.py' % name,
+                BACKEND % {'name': name}
+            )
+
+        for name in ['pkg_a', 'pkg_b']:
+            self.assertEqual(
+                self.engine.build(
+                    source_dir=os.path.join(self.work_dir, name),
+                    wheel_dir=self.wheel_dir
+                ),
+                '%s-1.0-py2-none-any.whl' % name
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from yaprt import hash_cache
+
+
+class TestHashCache(unittest.TestCase):
+    """Digests are read from the cache until the file changes."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.local_file = os.path.join(self.work_dir, 'six.whl')
+        self.cache = hash_cache.HashCache(
+            cache_file=os.path.join(self.work_dir, 'hashes.sqlite')
+        )
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _write(self, content, mtime):
+        with open(self.local_file, 'wb') as f:
+            f.write(content)
+        os.utime(self.local_file, (mtime, mtime))
+
+    def test_hit_and_miss(self):
+        self._write(content='six', mtime=1000000000)
+        for _ in range(2):
+            self.assertEqual(
+                self.cache.digest(local_file=self.local_file,
+                                  hash_type='md5'),
+                hashlib.md5('six').hexdigest()
+            )
+        # Every digest of ALGORITHMS is stored on the first read.
+        self.assertEqual(
+            self.cache.digest(local_file=self.local_file),
+            hashlib.sha256('six').hexdigest()
+        )
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_changed_file(self):
+        self._write(content='six', mtime=1000000000)
+        self.cache.digest(local_file=self.local_file)
+        self._write(content='pbr', mtime=1000000001)
+        self.assertEqual(
+            self.cache.digest(local_file=self.local_file),
+            hashlib.sha256('pbr').hexdigest()
+        )
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_missing_file(self):
+        self.assertIsNone(self.cache.digest(local_file=self.local_file))
+        self.assertIsNone(hash_cache.hash_return(local_file=self.local_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from yaprt import html_writer
+
+
+class TestHtmlWriter(unittest.TestCase):
+    """Pages are escaped and only replaced when their content changes."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.page_file = os.path.join(self.work_dir, 'index.html')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _write_page(self, content):
+        with html_writer.PageWriter(page_file=self.page_file) as page:
+            page.write(content)
+        return page
+
+    def test_escape(self):
+        self.assertEqual(
+            html_writer.escape(value='<a&"b">'),
+            '&lt;a&amp;"b"&gt;'
+        )
+        self.assertEqual(
+            html_writer.escape(value='<a&"b">', quote=True),
+            '&lt;a&amp;&quot;b&quot;&gt;'
+        )
+
+    def test_unchanged_page(self):
+        self.assertTrue(self._write_page(content='<html></html>').changed)
+        inode = os.stat(self.page_file).st_ino
+
+        self.assertFalse(self._write_page(content='<html></html>').changed)
+        self.assertEqual(os.stat(self.page_file).st_ino, inode)
+
+        self.assertTrue(self._write_page(content='<html>six</html>').changed)
+        with open(self.page_file) as f:
+            self.assertEqual(f.read(), '<html>six</html>')
+        self.assertEqual(os.listdir(self.work_dir), ['index.html'])
+
+    def test_failed_write(self):
+        try:
+            with html_writer.PageWriter(page_file=self.page_file) as page:
+                page.write('<html>')
+                raise ValueError('failed')
+        except ValueError:
+            pass
+        self.assertEqual(os.listdir(self.work_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from yaprt import journal
+
+
+class TestBuildJournal(unittest.TestCase):
+    """Outcomes survive a reload and are matched on their inputs."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.journal_file = os.path.join(self.work_dir, 'state', 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_completed(self):
+        build_journal = journal.BuildJournal(journal_file=self.journal_file)
+        build_journal.record(package='six', inputs='abc', state=journal.BUILT)
+        build_journal.record(
+            package='six',
+            inputs='abc',
+            state=journal.STORED,
+            wheels=['six-1.9.0-py2.py3-none-any.whl']
+        )
+
+        build_journal = journal.BuildJournal(journal_file=self.journal_file)
+        entry = build_journal.completed(package='six', inputs='abc')
+        self.assertEqual(entry['wheels'], ['six-1.9.0-py2.py3-none-any.whl'])
+        self.assertIsNone(build_journal.completed(package='six', inputs='x'))
+        self.assertIsNone(
+            build_journal.completed(
+                package='six',
+                inputs='abc',
+                state=journal.FAILED
+            )
+        )
+
+    def test_corrupt_entry(self):
+        build_journal = journal.BuildJournal(journal_file=self.journal_file)
+        build_journal.record(package='six', inputs='abc', state=journal.FAILED)
+        # The last line of a build that was killed while writing it.
+        with open(self.journal_file, 'ab') as f:
+            f.write('{"package": "pbr", "inp')
+
+        build_journal = journal.BuildJournal(journal_file=self.journal_file)
+        self.assertEqual(list(build_journal.entries), ['six'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import unittest
+
+from yaprt import planner
+
+
+class TestPlanner(unittest.TestCase):
+    """Builds are ordered and scheduled from their recorded build times."""
+    def test_estimate(self):
+        costs = {'nova': 90.0, 'six': 10.0}
+        self.assertEqual(planner.estimate(name='nova', costs=costs),
+                         (90.0, True))
+        self.assertEqual(planner.estimate(name='pbr', costs=costs),
+                         (50.0, False))
+        self.assertEqual(planner.estimate(name='pbr', costs={}),
+                         (0.0, False))
+
+    def test_lpt_order(self):
+        packages = ['six', 'pbr', 'nova', 'mock']
+        self.assertEqual(
+            planner.lpt_order(
+                packages=packages,
+                costs={'nova': 90.0, 'six': 10.0, 'mock': 10.0},
+                name_function=lambda i: i
+            ),
+            ['nova', 'pbr', 'six', 'mock']
+        )
+        self.assertEqual(
+            planner.lpt_order(
+                packages=packages,
+                costs={},
+                name_function=lambda i: i
+            ),
+            packages
+        )
+
+    def test_schedule(self):
+        self.assertEqual(
+            planner.schedule(durations=[3.0, 6.0, 4.0, 5.0], workers=2),
+            9.0
+        )
+        self.assertEqual(
+            planner.schedule(durations=[1.0, 2.0], workers=0),
+            3.0
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
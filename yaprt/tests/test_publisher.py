@@ -0,0 +1,84 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from yaprt import publisher
+from yaprt import wheel_builder
+
+
+class TestStagedWrites(unittest.TestCase):
+    """Files written within a staged generation never change earlier ones."""
+    def setUp(self):
+        self.publish_root = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.publisher = publisher.GenerationPublisher(
+            publish_root=self.publish_root
+        )
+        staging_dir = self.publisher.stage()
+        os.makedirs(os.path.join(staging_dir, 'links'))
+        for name in ['build_reqs.txt', 'build_failures.txt']:
+            with open(os.path.join(staging_dir, 'links', name), 'wb') as f:
+                f.write('previous\n')
+        self.previous = self.publisher.commit(staging_dir=staging_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.publish_root, ignore_errors=True)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_rewrite_keeps_previous_generation(self):
+        staging_dir = self.publisher.stage()
+        link_dir = self.publisher.staged_path(
+            path=os.path.join(self.publish_root, 'current', 'links'),
+            staging_dir=staging_dir
+        )
+        for name in ['build_reqs.txt', 'build_failures.txt']:
+            staged_file = os.path.join(link_dir, name)
+            previous_file = os.path.join(self.previous, 'links', name)
+            # The staged generation starts as hard links of the previous one.
+            self.assertEqual(
+                os.stat(staged_file).st_ino,
+                os.stat(previous_file).st_ino
+            )
+
+            wheel_builder.WheelBuilder._write_lines(
+                dst_file=staged_file,
+                lines=[u'six', u'pbr']
+            )
+            self.assertEqual(self._read(staged_file), 'six\npbr\n')
+            self.assertEqual(self._read(previous_file), 'previous\n')
+
+        self.publisher.commit(staging_dir=staging_dir)
+        self.assertEqual(
+            self._read(
+                os.path.join(self.publish_root, 'current', 'links',
+                             'build_reqs.txt')
+            ),
+            'six\npbr\n'
+        )
+        self.assertEqual(
+            self._read(os.path.join(self.previous, 'links', 'build_reqs.txt')),
+            'previous\n'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
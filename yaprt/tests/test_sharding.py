@@ -0,0 +1,126 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from yaprt import sharding
+from yaprt import utils
+
+
+class TestShards(unittest.TestCase):
+    """Packages are assigned to shards deterministically."""
+    def test_parse_shard(self):
+        self.assertEqual(sharding.parse_shard(shard='2/3'), (2, 3))
+        for shard in ['0/3', '4/3', 'a/b', '3']:
+            self.assertRaises(utils.AError, sharding.parse_shard, shard)
+
+    def test_every_package_in_one_shard(self):
+        packages = ['package-%d' % i for i in range(50)]
+        selected = list()
+        for index in range(1, 4):
+            selected.extend(
+                sharding.shard_packages(
+                    packages=packages,
+                    shard='%d/3' % index,
+                    name_function=lambda i: i
+                )
+            )
+        self.assertEqual(sorted(selected), sorted(packages))
+
+    def test_weighted_shards(self):
+        assignments = sharding.assign_shards(
+            names=['nova', 'six', 'pbr', 'mock'],
+            shard_count=2,
+            weights={'nova': 100.0, 'six': 1.0, 'pbr': 1.0, 'mock': 1.0}
+        )
+        nova_shard = assignments.pop('nova')
+        self.assertEqual(
+            set(assignments.values()),
+            set([1 - nova_shard])
+        )
+
+
+class TestMergePools(unittest.TestCase):
+    """Pools are merged only when files of the same name are identical."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.storage_pool = os.path.join(self.work_dir, 'pool')
+        self.args = {
+            'source_pools': [
+                os.path.join(self.work_dir, 'shard-1'),
+                os.path.join(self.work_dir, 'shard-2')
+            ],
+            'storage_pool': self.storage_pool,
+            'hash_cache': None,
+            'ignore_conflicts': False,
+            'link_dir': None,
+            'source_link_dirs': None
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _write(self, pool, content, name='six/six-1.9.0-py2-none-any.whl'):
+        path = os.path.join(self.work_dir, pool, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_merge(self):
+        self._write('shard-1', 'six')
+        self._write('shard-2', 'six')
+        self._write('shard-2', 'pbr', name='pbr/pbr-1.0-py2-none-any.whl')
+        sharding.merge_pools(args=self.args)
+        self.assertEqual(
+            sorted(os.listdir(self.storage_pool)),
+            ['pbr', 'six']
+        )
+
+    def test_conflict_between_pools(self):
+        self._write('shard-1', 'six-a')
+        self._write('shard-2', 'six-b')
+        self.assertRaises(utils.AError, sharding.merge_pools, self.args)
+        self.assertFalse(os.path.exists(self.storage_pool))
+
+    def test_conflict_with_destination(self):
+        self._write('shard-1', 'six-a')
+        # The same size as the source, but not the same content.
+        dst_file = self._write('pool', 'six-b')
+        self.assertRaises(utils.AError, sharding.merge_pools, self.args)
+        self.assertEqual(self._read(dst_file), 'six-b')
+
+        self.args['ignore_conflicts'] = True
+        sharding.merge_pools(args=self.args)
+        self.assertEqual(self._read(dst_file), 'six-b')
+
+    def test_identical_destination(self):
+        self._write('shard-1', 'six')
+        dst_file = self._write('pool', 'six')
+        sharding.merge_pools(args=self.args)
+        self.assertEqual(self._read(dst_file), 'six')
+
+
+if __name__ == '__main__':
+    unittest.main()
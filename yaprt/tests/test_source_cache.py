@@ -0,0 +1,108 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from yaprt import source_cache
+
+
+class _RecordedCache(source_cache.SourceCache):
+    """Source cache recording downloads instead of running pip."""
+    def __init__(self, *args, **kwargs):
+        super(_RecordedCache, self).__init__(*args, **kwargs)
+        self.downloads = list()
+
+    def _download(self, requirement, pip_args, offline=False):
+        self.downloads.append((requirement, offline))
+        return True
+
+
+class TestSourceCache(unittest.TestCase):
+    """Sources are stored once and resolved from the cache when pinned."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.cache_dir = os.path.join(self.work_dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_exact_pin(self):
+        for requirement in ['six==1.9.0', 'six===1.9.0']:
+            self.assertTrue(source_cache.exact_pin(requirement=requirement))
+        for requirement in ['six', 'six>=1.9', 'six==1.*', 'six>=1,<2',
+                            'git+https://example.com/six']:
+            self.assertFalse(source_cache.exact_pin(requirement=requirement))
+
+    def test_fetch_offline_only_when_pinned(self):
+        cache = _RecordedCache(cache_dir=self.cache_dir)
+        self.assertEqual(
+            cache.fetch(requirement='six==1.9.0', pip_args=[]),
+            source_cache.CACHED
+        )
+        self.assertEqual(
+            cache.fetch(requirement='six>=1.9', pip_args=[]),
+            source_cache.FETCHED
+        )
+        self.assertEqual(
+            cache.downloads,
+            [('six==1.9.0', True), ('six>=1.9', False)]
+        )
+
+    def test_concurrent_store(self):
+        cache = source_cache.SourceCache(cache_dir=self.cache_dir)
+        names = ['six-1.%d.0.tar.gz' % i for i in range(50)]
+        download_dirs = list()
+        for number in range(8):
+            download_dir = os.path.join(self.work_dir, str(number))
+            os.makedirs(download_dir)
+            for name in names:
+                with open(os.path.join(download_dir, name), 'wb') as f:
+                    f.write(name)
+            download_dirs.append(download_dir)
+
+        start = threading.Event()
+        errors = list()
+
+        def _store(download_dir):
+            start.wait()
+            for name in names:
+                try:
+                    cache._store(file_path=os.path.join(download_dir, name))
+                except Exception as exp:
+                    errors.append(exp)
+
+        threads = [
+            threading.Thread(target=_store, args=(i,)) for i in download_dirs
+        ]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(os.listdir(cache.links_dir)), sorted(names))
+        for name in names:
+            with open(os.path.join(cache.links_dir, name)) as f:
+                self.assertEqual(f.read(), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
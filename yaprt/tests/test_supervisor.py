@@ -0,0 +1,99 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from yaprt import supervisor
+
+
+class TestRunCommand(unittest.TestCase):
+    """Commands are stopped and classified by the limit they breach."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_success(self):
+        data, success = supervisor.run_command(
+            command=['echo', 'built'],
+            limits={'timeout': 30, 'cpu': 30, 'memory': 1024}
+        )
+        self.assertTrue(success)
+        self.assertEqual(data.strip(), 'built')
+
+    def test_failure(self):
+        # An exit status of ENOMEM is not taken as running out of memory.
+        data, success = supervisor.run_command(
+            command=['exit', '12'],
+            limits={'memory': 1024}
+        )
+        self.assertFalse(success)
+
+    def test_timeout(self):
+        self.assertRaises(
+            supervisor.BuildTimeout,
+            supervisor.run_command,
+            command=['sleep', '30'],
+            limits={'timeout': 1}
+        )
+
+    def test_memory_error(self):
+        self.assertRaises(
+            supervisor.MemoryLimitExceeded,
+            supervisor.run_command,
+            command=[
+                sys.executable, '-c', '"x = \' \' * (1024 ** 3)"'
+            ],
+            limits={'memory': 256}
+        )
+
+    def test_cpu_limit_kills_process_group(self):
+        pid_file = os.path.join(self.work_dir, 'pid')
+        self.assertRaises(
+            supervisor.CPULimitExceeded,
+            supervisor.run_command,
+            command=[
+                'sleep', '300', '&', 'echo', '$!', '>', pid_file, ';',
+                'while', ':;', 'do', ':;', 'done'
+            ],
+            limits={'cpu': 1}
+        )
+
+        with open(pid_file) as f:
+            pid = f.read().strip()
+        # The background process is killed, at most a zombie is left.
+        deadline = time.time() + 5
+        state = None
+        while time.time() < deadline:
+            try:
+                with open('/proc/%s/status' % pid) as f:
+                    state = [i for i in f if i.startswith('State:')][0]
+            except IOError:
+                state = None
+            if not state or 'zombie' in state:
+                break
+            time.sleep(0.1)
+        self.assertTrue(not state or 'zombie' in state, state)
+
+
+if __name__ == '__main__':
+    unittest.main()
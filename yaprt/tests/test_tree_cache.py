@@ -0,0 +1,89 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from yaprt import tree_cache
+
+
+class TestTreeCache(unittest.TestCase):
+    """Wheels are keyed on the git tree and, when versioned from git, tags."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.repo_path = os.path.join(self.work_dir, 'repo')
+        os.makedirs(self.repo_path)
+        self._git('init', '-q')
+        self.cache = tree_cache.TreeCache(
+            cache_dir=os.path.join(self.work_dir, 'cache')
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _git(self, *command):
+        subprocess.check_call(
+            ['git', '-c', 'user.name=yaprt', '-c',
+             'user.email=yaprt@localhost', '-C', self.repo_path] +
+            list(command)
+        )
+
+    def _commit(self, setup):
+        with open(os.path.join(self.repo_path, 'setup.py'), 'w') as f:
+            f.write(setup)
+        self._git('add', 'setup.py')
+        self._git('commit', '-q', '--allow-empty', '-m', 'commit')
+
+    def _key(self):
+        return self.cache.key(
+            repo_path=self.repo_path,
+            rev='HEAD',
+            subdir='',
+            environment={'python': '2.7'}
+        )
+
+    def test_plain_project(self):
+        self._commit(setup="setup(name='six', version='1.9.0')")
+        key = self._key()
+        self._git('tag', '1.9.0')
+        self._git('commit', '-q', '--allow-empty', '-m', 'empty')
+        self.assertEqual(self._key(), key)
+
+    def test_pbr_project(self):
+        self._commit(setup='setup(setup_requires=[\'pbr\'], pbr=True)')
+        key = self._key()
+        self._git('tag', '1.0.0')
+        self.assertNotEqual(self._key(), key)
+
+    def test_put_and_get(self):
+        self._commit(setup="setup(name='six', version='1.9.0')")
+        key = self._key()
+        self.assertIsNone(self.cache.get(key=key))
+
+        wheel = os.path.join(self.work_dir, 'six-1.9.0-py2-none-any.whl')
+        open(wheel, 'w').close()
+        self.cache.put(key=key, wheels=[wheel])
+        self.assertEqual(
+            [os.path.basename(i) for i in self.cache.get(key=key)],
+            ['six-1.9.0-py2-none-any.whl']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
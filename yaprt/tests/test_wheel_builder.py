@@ -0,0 +1,188 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import yaprt
+from yaprt import wheel_builder
+
+
+def _build_args(**kwargs):
+    """Return the default arguments of build-wheels with overrides."""
+    arguments = yaprt.ARGUMENTS_DICT
+    command = arguments['subparsed_args']['build-wheels']
+    args = dict(
+        [(i, arguments['shared_args'][i].get('default'))
+         for i in command['shared_args']]
+    )
+    for options in [arguments['optional_args'], command['optional_args']]:
+        for key, value in options.items():
+            if isinstance(value, dict) and 'commands' in value:
+                args[key] = value.get('default')
+    args.update(kwargs)
+    return args
+
+
+class TestPipCommands(unittest.TestCase):
+    """The pip commands built for builds and build environments."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _wheel_builder(self, **kwargs):
+        wb = wheel_builder.WheelBuilder(
+            user_args=_build_args(
+                build_output=self.work_dir,
+                no_verify_wheels=True,
+                **kwargs
+            )
+        )
+        self.addCleanup(wb.close)
+        return wb
+
+    def test_env_pip_command(self):
+        command = [
+            'pip', 'wheel', '--timeout', '120', '--wheel-dir', '/tmp/out',
+            '--allow-all-external', '--index-url', 'http://pypi/simple',
+            '--build', '/tmp/build', '"six"'
+        ]
+        self.assertEqual(
+            wheel_builder.WheelBuilder._env_pip_command(
+                command=command,
+                env_pip='/envs/py27/bin/pip'
+            ),
+            [
+                '/envs/py27/bin/pip', 'wheel', '--no-build-isolation',
+                '--timeout', '120', '--wheel-dir', '/tmp/out',
+                '--index-url', 'http://pypi/simple', '"six"'
+            ]
+        )
+
+    def test_env_seeding_without_deps(self):
+        wb = self._wheel_builder(
+            pip_no_deps=True,
+            pip_index='http://pypi.example.com/simple',
+            pip_extra_link_dirs=['/var/www/links'],
+            build_env_dir=self.work_dir
+        )
+        self.assertIn('--no-deps', wb._pip_source_args())
+        self.assertEqual(
+            wb.build_envs.pip_args,
+            [
+                '--find-links', '/var/www/links',
+                '--index-url', 'http://pypi.example.com/simple',
+                '--trusted-host', 'pypi.example.com'
+            ]
+        )
+
+
+class TestLinks(unittest.TestCase):
+    """Links are shared by the build workers of a link directory."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.link_dir = os.path.join(self.work_dir, 'links')
+        os.makedirs(self.link_dir)
+        self.wheel_file = os.path.join(
+            self.work_dir, 'pool', 'six-1.9.0-py2.py3-none-any.whl'
+        )
+        os.makedirs(os.path.dirname(self.wheel_file))
+        open(self.wheel_file, 'wb').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_link_created_concurrently(self):
+        wb = wheel_builder.WheelBuilder(
+            user_args=_build_args(
+                link_dir=self.link_dir,
+                no_verify_wheels=True
+            )
+        )
+        self.addCleanup(wb.close)
+        wheel_name = os.path.basename(self.wheel_file)
+        wb._create_link(full_wheel_path=self.wheel_file, wheel_name=wheel_name)
+
+        # Another worker creates the link after it was checked for.
+        with mock.patch('os.path.islink', return_value=False):
+            wb._create_link(
+                full_wheel_path=self.wheel_file,
+                wheel_name=wheel_name
+            )
+        self.assertEqual(
+            os.path.realpath(os.path.join(self.link_dir, wheel_name)),
+            os.path.realpath(self.wheel_file)
+        )
+
+
+class _FailingBuilder(wheel_builder.WheelBuilder):
+    """Wheel builder whose builds fail for any batch with a bad package."""
+    def _pip_build_wheels(self, packages_file=None, **kwargs):
+        with open(packages_file) as f:
+            if [i for i in f if i.startswith('bad')]:
+                raise SystemExit('Build failed')
+
+
+class TestBuildFailures(unittest.TestCase):
+    """The build failure report only lists failures of the current run."""
+    def setUp(self):
+        self.link_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.failure_file = os.path.join(self.link_dir, 'build_failures.txt')
+        self.wb = _FailingBuilder(
+            user_args=_build_args(
+                link_dir=self.link_dir,
+                no_verify_wheels=True
+            )
+        )
+
+    def tearDown(self):
+        self.wb.close()
+        shutil.rmtree(self.link_dir, ignore_errors=True)
+
+    def _read(self):
+        with open(self.failure_file) as f:
+            return f.read()
+
+    def test_stale_report_removed(self):
+        with open(self.failure_file, 'w') as f:
+            f.write('old\n')
+        self.wb.clear_build_failures()
+        self.assertFalse(os.path.exists(self.failure_file))
+
+        self.assertEqual(
+            self.wb._bisect_build_wheels(packages=['six', 'pbr']),
+            []
+        )
+        self.assertFalse(os.path.exists(self.failure_file))
+
+    def test_report_lists_run_failures(self):
+        self.wb.clear_build_failures()
+        self.assertEqual(
+            self.wb._bisect_build_wheels(packages=['six', 'bad-a', 'pbr']),
+            ['bad-a']
+        )
+        self.wb._bisect_build_wheels(packages=['bad-b'])
+        self.assertEqual(self._read(), 'bad-a\nbad-b\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from yaprt import wheel_verify
+
+
+MODULE = 'import os\n'
+
+
+def _record_hash(content, algorithm='sha256'):
+    digest = base64.urlsafe_b64encode(
+        hashlib.new(algorithm, content).digest()
+    ).rstrip('=')
+    return '%s=%s' % (algorithm, digest)
+
+
+class TestVerifyWheel(unittest.TestCase):
+    """Wheels are checked against their RECORD."""
+    def setUp(self):
+        self.wheel_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.wheel_dir, ignore_errors=True)
+
+    def _wheel(self, record_algorithm='sha256', content=MODULE):
+        """Write a wheel as written by bdist_wheel, returning its path."""
+        wheel_file = os.path.join(
+            self.wheel_dir,
+            'cloudlib-0.5.0-cp27-none-any.whl'
+        )
+        dist_info = 'cloudlib-0.5.0.dist-info'
+        files = [
+            ('cloudlib/__init__.py', content),
+            (
+                '%s/METADATA' % dist_info,
+                'Metadata-Version: 2.1\nName: cloudlib\nVersion: 0.5.0\n'
+            ),
+            (
+                '%s/WHEEL' % dist_info,
+                'Wheel-Version: 1.0\nGenerator: bdist_wheel (0.37.1)\n'
+                'Root-Is-Purelib: true\nTag: cp27-none-any\n'
+            )
+        ]
+        record = [
+            '%s,%s,%d' % (
+                name,
+                _record_hash(MODULE if name.endswith('.py') else data),
+                len(data)
+            )
+            for name, data in files
+        ]
+        # Python 2 names the algorithm in upper case, IE: SHA256=...
+        record = [
+            i.replace('sha256=', '%s=' % record_algorithm) for i in record
+        ]
+        record.append('%s/RECORD,,' % dist_info)
+
+        with zipfile.ZipFile(wheel_file, 'w') as archive:
+            for name, data in files:
+                archive.writestr(name, data)
+            archive.writestr('%s/RECORD' % dist_info, '\n'.join(record))
+        return wheel_file
+
+    def test_lower_case_record(self):
+        self.assertEqual(wheel_verify.verify_wheel(self._wheel()), [])
+
+    def test_upper_case_record(self):
+        self.assertEqual(
+            wheel_verify.verify_wheel(self._wheel(record_algorithm='SHA256')),
+            []
+        )
+
+    def test_changed_member(self):
+        problems = wheel_verify.verify_wheel(
+            self._wheel(record_algorithm='SHA256', content='import sys\n')
+        )
+        self.assertEqual(
+            problems,
+            ['cloudlib/__init__.py does not match its RECORD hash']
+        )
+
+    def test_unsupported_algorithm(self):
+        problems = wheel_verify.verify_wheel(
+            self._wheel(record_algorithm='MD5')
+        )
+        self.assertIn(
+            'cloudlib/__init__.py is hashed with unsupported md5',
+            problems
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
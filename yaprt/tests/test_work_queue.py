@@ -0,0 +1,101 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from yaprt import work_queue
+
+
+class TestSQLiteJobQueue(unittest.TestCase):
+    """Jobs are claimed, leased, retried and finished."""
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='yaprt_test_')
+        self.queue = work_queue.SQLiteJobQueue(
+            queue_file=os.path.join(self.work_dir, 'queue.db')
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_args(self):
+        self.queue.set_args(args={'link_dir': '/var/www/links'})
+        self.assertEqual(
+            self.queue.get_args(),
+            {'link_dir': '/var/www/links'}
+        )
+
+    def test_claim_in_order(self):
+        self.queue.put(packages=['six', 'pbr'], clean_first=True)
+        job = self.queue.claim(worker='a', lease_time=60, max_attempts=3)
+        self.assertEqual(job['package'], 'six')
+        self.assertTrue(job['clean_first'])
+        self.assertEqual(job['attempts'], 1)
+
+        self.queue.complete(job_id=job['id'], worker='a')
+        job = self.queue.claim(worker='b', lease_time=60, max_attempts=3)
+        self.queue.fail(job_id=job['id'], worker='b', error='boom')
+
+        self.assertIsNone(
+            self.queue.claim(worker='a', lease_time=60, max_attempts=3)
+        )
+        self.assertEqual(
+            self.queue.counts(),
+            {'pending': 0, 'leased': 0, 'done': 1, 'failed': 1}
+        )
+        self.assertEqual(self.queue.failures(), [('pbr', 'boom')])
+
+    def test_finish_requires_lease(self):
+        self.queue.put(packages=['six'])
+        job = self.queue.claim(worker='a', lease_time=60, max_attempts=3)
+        self.queue.complete(job_id=job['id'], worker='b')
+        self.assertEqual(self.queue.counts()['leased'], 1)
+
+    def test_expired_lease(self):
+        self.queue.put(packages=['six'])
+        self.queue.claim(worker='a', lease_time=-1, max_attempts=2)
+        job = self.queue.claim(worker='b', lease_time=-1, max_attempts=2)
+        self.assertEqual(job['attempts'], 2)
+
+        self.assertIsNone(
+            self.queue.claim(worker='c', lease_time=60, max_attempts=2)
+        )
+        self.assertEqual(self.queue.failures(), [('six', 'Lease expired')])
+
+    def test_lease_keeper(self):
+        self.queue.put(packages=['six'])
+        job = self.queue.claim(worker='a', lease_time=1, max_attempts=1)
+        keeper = work_queue.LeaseKeeper(
+            self.queue,
+            job_id=job['id'],
+            worker='a',
+            lease_time=1
+        )
+        keeper.start()
+        try:
+            time.sleep(2.5)
+            self.assertIsNone(
+                self.queue.claim(worker='b', lease_time=60, max_attempts=1)
+            )
+        finally:
+            keeper.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Trace the phases and commands of a run.
+
+Spans are recorded as complete events of the Chrome trace event format and
+written to a json file once the run has finished. The file can be opened in
+``chrome://tracing`` or any other trace viewer that reads the format. Spans
+started within another span, on the same thread, are shown nested within it.
+
+The tracer does nothing until it has been configured with a trace file, so
+spans can be added anywhere at almost no cost.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+from cloudlib import logger
+
+
+LOG = logger.getLogger('repo_builder')
+
+
+class Tracer(object):
+    """Record spans and write them as Chrome trace events."""
+    def __init__(self):
+        self.trace_file = None
+        self.command = None
+        self.events = list()
+        self._lock = threading.Lock()
+
+    def configure(self, trace_file, command):
+        """Enable the tracer.
+
+        :param trace_file: $PATH to the trace file.
+        :type trace_file: ``str``
+        :param command: Name of the command being run.
+        :type command: ``str``
+        """
+        if not trace_file:
+            return
+
+        self.trace_file = os.path.abspath(os.path.expanduser(trace_file))
+        self.command = command
+
+    @contextlib.contextmanager
+    def span(self, name, category='yaprt', **attributes):
+        """Record the wall time of a block of work.
+
+        :param name: Name of the span.
+        :type name: ``str``
+        :param category: Category of the span, IE: phase, command, git.
+        :type category: ``str``
+        :param attributes: Attributes shown with the span, IE: repo, package.
+        :type attributes: ``dict``
+        """
+        if not self.trace_file:
+            yield
+            return
+
+        start = time.time()
+        try:
+            yield
+        except (Exception, SystemExit) as exp:
+            attributes['error'] = str(exp)[-1024:]
+            raise
+        finally:
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': int(start * 1000000),
+                'dur': int((time.time() - start) * 1000000),
+                'pid': os.getpid(),
+                'tid': threading.current_thread().ident,
+                'args': attributes
+            }
+            with self._lock:
+                self.events.append(event)
+
+    @contextlib.contextmanager
+    def run(self):
+        """Record the whole run as a span and write the trace file."""
+        try:
+            with self.span(name=self.command or 'run', category='run'):
+                yield
+        finally:
+            self.write()
+
+    def write(self):
+        """Write all of the recorded spans to the trace file."""
+        if not self.trace_file:
+            return
+
+        trace_dir = os.path.dirname(self.trace_file)
+        if not os.path.isdir(trace_dir):
+            os.makedirs(trace_dir)
+
+        metadata = {
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': os.getpid(),
+            'args': {
+                'name': 'yaprt %s' % self.command
+            }
+        }
+        with self._lock:
+            events = [metadata] + sorted(self.events, key=lambda i: i['ts'])
+
+        with open(self.trace_file, 'wb') as f:
+            f.write(
+                json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
+            )
+        LOG.info('Trace written to [ %s ]', self.trace_file)
+
+
+# Tracer shared by every module of a run.
+TRACER = Tracer()
+
+
+def span(name, category='yaprt', **attributes):
+    """Record a span with the shared tracer.
+
+    :param name: Name of the span.
+    :type name: ``str``
+    :param category: Category of the span, IE: phase, command, git.
+    :type category: ``str``
+    :param attributes: Attributes shown with the span, IE: repo, package.
+    :type attributes: ``dict``
+    """
+    return TRACER.span(name, category, **attributes)
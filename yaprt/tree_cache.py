@@ -0,0 +1,205 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Cache of the wheels built from git trees.
+
+The wheels of a git package are stored under a key made from the git tree
+SHA of the package directory and the environment the package was built in.
+The tree SHA only changes when a file within the package directory changes,
+so a branch that has not moved, a tag, or two branches that point at the
+same tree all share the wheels of a single build.
+
+Packages versioned from git history by pbr or setuptools_scm also key on
+``git describe --tags`` of the revision, since their version changes when
+the commit is tagged or moved even if the tree does not.
+
+Layout of the cache directory::
+
+    3f/3f2a.../python_foo-1.0.0-py2-none-any.whl
+    tmp/
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from cloudlib import logger
+
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+# Files naming the tools that version a package from its git history.
+VERSION_FILES = ['setup.py', 'setup.cfg', 'pyproject.toml']
+
+# Tools that version a package from its git tags and history.
+GIT_VERSION_TOOLS = ['pbr', 'setuptools_scm', 'setuptools-scm']
+
+
+def git_versioned(repo_path, rev, subdir):
+    """Return ``True`` if a package is versioned from its git history.
+
+    :param repo_path: $PATH to the git repository.
+    :type repo_path: ``str``
+    :param rev: Revision the package is built from.
+    :type rev: ``str``
+    :param subdir: Directory of the package within the repository.
+    :type subdir: ``str``
+    :returns: ``bol``
+    """
+    for file_name in VERSION_FILES:
+        content = utils.git_output(
+            repo_path=repo_path,
+            command=[
+                'cat-file', '-p', '%s:%s' % (rev, os.path.join(subdir,
+                                                               file_name))
+            ]
+        )
+        if content and [i for i in GIT_VERSION_TOOLS if i in content]:
+            return True
+    return False
+
+
+class TreeCache(object):
+    """Store and look up wheels by the git tree they were built from.
+
+    Example:
+        >>> cache = TreeCache(cache_dir='/var/cache/yaprt/trees')
+        >>> key = cache.key(repo_path='/opt/git/nova', rev='stable/kilo',
+        ...                 subdir='', environment={'python': '2.7.6'})
+        >>> cache.get(key=key)
+        ['/var/cache/yaprt/trees/8c/8c1a.../nova-2015.1.1-py2-none-any.whl']
+    """
+    def __init__(self, cache_dir):
+        """Create the cache directory if it does not exist.
+
+        :param cache_dir: $PATH to the cache directory.
+        :type cache_dir: ``str``
+        """
+        self.cache_dir = utils.get_abs_path(file_name=cache_dir)
+        self.tmp_dir = os.path.join(self.cache_dir, 'tmp')
+        if not os.path.isdir(self.tmp_dir):
+            os.makedirs(self.tmp_dir)
+
+    @staticmethod
+    def key(repo_path, rev, subdir, environment):
+        """Return the cache key of a package or ``None`` if not found.
+
+        :param repo_path: $PATH to the git repository.
+        :type repo_path: ``str``
+        :param rev: Revision the package is built from.
+        :type rev: ``str``
+        :param subdir: Directory of the package within the repository.
+        :type subdir: ``str``
+        :param environment: Everything, other than the source, that changes
+                            the wheels built.
+        :type environment: ``dict``
+        :returns: ``str``
+        """
+        if subdir in ['', '.']:
+            subdir = ''
+        tree = utils.git_rev_parse(
+            repo_path=repo_path,
+            rev='%s:%s' % (rev, subdir)
+        )
+        if not tree:
+            return None
+
+        entry = {
+            'tree': tree,
+            'environment': environment
+        }
+        if git_versioned(repo_path=repo_path, rev=rev, subdir=subdir):
+            describe = utils.git_output(
+                repo_path=repo_path,
+                command=[
+                    'describe', '--tags', '--long', '--always', '--abbrev=40',
+                    '%s^{commit}' % rev
+                ]
+            )
+            if not describe:
+                return None
+            entry['describe'] = describe
+
+        return hashlib.sha256(
+            json.dumps(entry, sort_keys=True)
+        ).hexdigest()
+
+    def _entry_dir(self, key):
+        """Return the directory holding the wheels of a key.
+
+        :param key: Cache key.
+        :type key: ``str``
+        :returns: ``str``
+        """
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        """Return the cached wheels of a key or ``None`` if not cached.
+
+        :param key: Cache key.
+        :type key: ``str``
+        :returns: ``list``
+        """
+        entry_dir = self._entry_dir(key=key)
+        if not os.path.isdir(entry_dir):
+            return None
+
+        return sorted(
+            [os.path.join(entry_dir, i) for i in os.listdir(entry_dir)]
+        )
+
+    def put(self, key, wheels):
+        """Store the wheels built for a key.
+
+        The wheels are copied into a temporary directory that is renamed into
+        place, so an entry is either complete or not found.
+
+        :param key: Cache key.
+        :type key: ``str``
+        :param wheels: List of $PATHs to the built wheels.
+        :type wheels: ``list``
+        """
+        if not wheels:
+            return
+
+        entry_dir = self._entry_dir(key=key)
+        if os.path.isdir(entry_dir):
+            return
+
+        temp_dir = tempfile.mkdtemp(prefix='entry_', dir=self.tmp_dir)
+        try:
+            for wheel in wheels:
+                utils.copy_file(
+                    src=wheel,
+                    dst=os.path.join(temp_dir, os.path.basename(wheel))
+                )
+
+            if not os.path.isdir(os.path.dirname(entry_dir)):
+                try:
+                    os.makedirs(os.path.dirname(entry_dir))
+                except OSError:
+                    # Created by a concurrent build.
+                    pass
+            os.rename(temp_dir, entry_dir)
+        except OSError as exp:
+            # Another build stored the same key first.
+            LOG.debug('Tree cache entry [ %s ] not stored: %s', key, exp)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
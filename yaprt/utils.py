@@ -22,14 +22,21 @@ import functools
 import hashlib
 import json
 import os
+import subprocess
 import time
+from multiprocessing import pool
 
 from cloudlib import logger
 from cloudlib import shell
 
+from yaprt import tracing
+
 
 LOG = logger.getLogger('repo_builder')
 
+# Size of the buffer files are read into while they are hashed.
+HASH_BUFFER_SIZE = 1024 * 1024
+
 
 def retry(exception, tries=3, delay=1, backoff=1):
     """Retry calling the decorated function using an exponential backoff.
@@ -122,6 +129,46 @@ def git_pip_link_parse(repo):
     return name.lower(), branch, plugin_path, url, repo
 
 
+def git_output(repo_path, command):
+    """Return the output of a git command or ``None`` if it failed.
+
+    :param repo_path: $PATH to the git repository.
+    :type repo_path: ``str``
+    :param command: Arguments of the git command.
+    :type command: ``list``
+    :returns: ``str``
+    """
+    try:
+        with open(os.devnull, 'wb') as devnull:
+            return subprocess.check_output(
+                ['git'] + command,
+                cwd=repo_path,
+                stderr=devnull
+            ).strip()
+    except (OSError, subprocess.CalledProcessError) as exp:
+        LOG.debug('Git command %s failed: %s', command, exp)
+        return None
+
+
+def git_rev_parse(repo_path, rev):
+    """Return the object name of a git revision or ``None`` if not found.
+
+    Example:
+        >>> git_rev_parse(repo_path='/opt/git/nova', rev='stable/kilo')
+        '8c1a1d0b4a8a9ec46f6c5cd6b7b0cd0b52bb4a43'
+
+    :param repo_path: $PATH to the git repository.
+    :type repo_path: ``str``
+    :param rev: Revision to parse, any revision understood by git.
+    :type rev: ``str``
+    :returns: ``str``
+    """
+    return git_output(
+        repo_path=repo_path,
+        command=['rev-parse', '--verify', '--quiet', rev]
+    )
+
+
 def copy_file(src, dst):
     """Copy file from source to destination.
 
@@ -200,6 +247,31 @@ def get_file_names(path):
         return files
 
 
+def thread_map(function, items, workers):
+    """Return the results of a function for every item, in order.
+
+    With more than one worker the items are run within a pool of threads,
+    hashing and file IO release the GIL so they run in parallel.
+
+    :param function: Function called with every item.
+    :type function: ``object``
+    :param items: List of items.
+    :type items: ``list``
+    :param workers: Number of threads.
+    :type workers: ``int``
+    :returns: ``list``
+    """
+    if workers <= 1 or len(items) <= 1:
+        return [function(i) for i in items]
+
+    worker_pool = pool.ThreadPool(processes=min(workers, len(items)))
+    try:
+        return worker_pool.map(function, items)
+    finally:
+        worker_pool.close()
+        worker_pool.join()
+
+
 def remove_dirs(directory):
     """Delete a directory recursively.
 
@@ -228,6 +300,41 @@ def remove_dirs(directory):
             pass
 
 
+def hash_digests(local_file, hash_types=('sha256',)):
+    """Return the hashes of a local file, computed in a single read.
+
+    The file is read into a reused buffer and every hash is updated from
+    it, so asking for several hashes costs one read of the file. This
+    function will support any hash type available within ``hashlib``.
+
+    Example:
+        >>> hash_digests(local_file='/path/file_name',
+        ...              hash_types=['md5', 'sha256'])
+        {'md5': 'd41d8cd98f00b204e9800998ecf8427e',
+         'sha256': 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495...'}
+
+    :param local_file: $PATH Local file
+    :type local_file: ``str``
+    :param hash_types: Types of hash to use. IE: md5, sha256
+    :type hash_types: ``list``
+    :returns: ``dict``
+    """
+    local_file = get_abs_path(file_name=local_file)
+    if os.path.isfile(local_file):
+        hash_functions = [(i, hashlib.new(i)) for i in set(hash_types)]
+        buffer_data = bytearray(HASH_BUFFER_SIZE)
+        buffer_view = memoryview(buffer_data)
+        with open(local_file, 'rb') as file_object:
+            while True:
+                size = file_object.readinto(buffer_data)
+                if not size:
+                    break
+                for _, hash_function in hash_functions:
+                    hash_function.update(buffer_view[:size])
+
+        return dict([(k, v.hexdigest()) for k, v in hash_functions])
+
+
 def hash_return(local_file, hash_type='sha256'):
     """Return the hash of a local file object.
 
@@ -243,25 +350,9 @@ def hash_return(local_file, hash_type='sha256'):
     :type hash_type: ``str``
     :returns: ``str``
     """
-    def calc_hash():
-        """Read the hash.
-
-        :returns: ``bytes``
-        """
-        return file_object.read(128 * hash_function.block_size)
-
-    local_file = get_abs_path(file_name=local_file)
-    if os.path.isfile(local_file):
-        hash_function = getattr(hashlib, hash_type)
-        hash_function = hash_function()
-        with open(local_file, 'rb') as file_object:
-            for chk in iter(calc_hash, ''):
-                if isinstance(chk, bytes):
-                    hash_function.update(chk)
-                else:
-                    hash_function.update(chk.encode('utf-8'))
-
-        return hash_function.hexdigest()
+    digests = hash_digests(local_file=local_file, hash_types=[hash_type])
+    if digests:
+        return digests[hash_type]
 
 
 def read_report(args):
@@ -396,7 +487,10 @@ class RepoBaseClass(object):
         :param command: list object containing parts of a shell command.
         :type command: ``list``
         """
-        data, success = self.shell_cmds.run_command(command=' '.join(command))
+        command = ' '.join(command)
+        with tracing.span('command', 'command', command=command,
+                          cwd=os.getcwd()):
+            data, success = self.shell_cmds.run_command(command=command)
         self.log.debug(
             'Command Data: [ %s ], Success: [ %s ]', data, success
         )
@@ -15,20 +15,64 @@
 # (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
 
 import collections
+import contextlib
+import errno
+import functools
 from distutils import version
+import hashlib
+import json
 import os
 import re
+import shutil
+import sys
 import tempfile
+import time
 import urlparse
 
 from cloudlib import logger
 
+from yaprt import build_engine
+from yaprt import build_envs
+from yaprt import build_metrics
+from yaprt import compiler_cache
+from yaprt import exporter
+from yaprt import html_indexer
+from yaprt import journal
+from yaprt import pipeline
+from yaprt import planner
+from yaprt import publisher
+from yaprt import sharding
+from yaprt import simple_index
+from yaprt import source_cache
+from yaprt import supervisor
+from yaprt import tree_cache
 from yaprt import utils
+from yaprt import wheel_verify
+from yaprt import work_queue
 
 
 LOG = logger.getLogger('repo_builder')
 VERSION_DESCRIPTORS = ['>=', '<=', '>', '<', '==', '~=', '!=']
 
+# Arguments that change the wheel built for a package.
+BUILD_INPUT_ARGS = [
+    'build_engine',
+    'pip_extra_index',
+    'pip_extra_link_dirs',
+    'pip_index',
+    'pip_no_deps',
+    'pip_no_index',
+    'pip_pre'
+]
+
+# Options of the base pip command, and the number of values they take, that
+# the pip of a build environment no longer accepts. ``--no-build-isolation``
+# needs pip 10, which removed ``--allow-all-external``.
+REMOVED_PIP_OPTIONS = {
+    '--allow-all-external': 0,
+    '--build': 1
+}
+
 
 def build_wheels(args):
     """Work through the various wheels based on arguments.
@@ -38,7 +82,124 @@ def build_wheels(args):
     """
     report = utils.read_report(args=args)
     wb = WheelBuilder(user_args=args)
+    try:
+        if not args['plan'] and not args['enqueue']:
+            wb.clear_build_failures()
+        _build_wheels(args=args, report=report, wb=wb)
+        wb.publish()
+    finally:
+        wb.close()
+
+    if args['plan']:
+        print(
+            '\n'.join(
+                planner.plan_lines(
+                    items=wb.planned,
+                    workers=args['plan_workers'] or args['build_workers']
+                )
+            )
+        )
+
+
+def build_worker(args):
+    """Claim and build jobs from a work queue until no jobs remain.
+
+    The build arguments are read from the queue, as written by the producer,
+    with the worker's own build directories and logging options laid on top.
+
+    :param args: User defined arguments.
+    :type args: ``dict``
+    """
+    queue = work_queue.SQLiteJobQueue(queue_file=args['queue_file'])
+    worker = work_queue.worker_name()
+
+    build_args = queue.get_args()
+    build_args['enqueue'] = False
+    for key in ['debug', 'quiet', 'build_output', 'build_dir', 'metrics_dir']:
+        if args.get(key) is not None:
+            build_args[key] = args[key]
+
+    # Workers sharing a host must not share their build directories.
+    for key in ['build_output', 'build_dir']:
+        if build_args[key]:
+            build_args[key] = os.path.join(build_args[key], worker)
+
+    wb = WheelBuilder(user_args=build_args)
+    try:
+        while True:
+            job = queue.claim(
+                worker=worker,
+                lease_time=args['lease_time'],
+                max_attempts=args['max_attempts']
+            )
+            if job:
+                _build_job(queue=queue, wb=wb, job=job, worker=worker,
+                           lease_time=args['lease_time'])
+                continue
 
+            counts = queue.counts()
+            if not args['keep_running'] and not counts[work_queue.PENDING]:
+                if not counts[work_queue.LEASED]:
+                    break
+            time.sleep(args['poll_interval'])
+    finally:
+        wb.close()
+
+    LOG.info('Queue complete: %s', queue.counts())
+    for package, error in queue.failures():
+        LOG.error('Failed package "%s": %s', package, error)
+
+
+def _build_job(queue, wb, job, worker, lease_time):
+    """Build a single job while holding its lease.
+
+    :param queue: Work queue the job was claimed from.
+    :type queue: ``work_queue.SQLiteJobQueue``
+    :param wb: Wheel builder used to build the job.
+    :type wb: ``WheelBuilder``
+    :param job: Claimed job.
+    :type job: ``dict``
+    :param worker: Name of the worker holding the lease.
+    :type worker: ``str``
+    :param lease_time: Number of seconds the lease is held for.
+    :type lease_time: ``int``
+    """
+    LOG.info('Building job for package "%s"', job['package'])
+    keeper = work_queue.LeaseKeeper(
+        queue=queue,
+        job_id=job['id'],
+        worker=worker,
+        lease_time=lease_time
+    )
+    keeper.start()
+    try:
+        wb.build_wheels(
+            packages=[job['package']],
+            clean_first=job['clean_first'],
+            force_iterate=job['force_iterate']
+        )
+    except (Exception, SystemExit) as exp:
+        keeper.stop()
+        queue.fail(
+            job_id=job['id'],
+            worker=worker,
+            error='%s: %s' % (getattr(exp, 'failure_class', 'error'), exp)
+        )
+    else:
+        keeper.stop()
+        queue.complete(job_id=job['id'], worker=worker)
+
+
+def _build_wheels(args, report, wb):
+    """Build all of the wheels requested within the arguments.
+
+    :param args: User defined arguments.
+    :type args: ``dict``
+    :param report: Dictionary report of required items.
+    :type report: ``dict``
+    :param wb: Wheel builder used to build the wheels.
+    :type wb: ``WheelBuilder``
+    """
     # Everything is built in order for consistency, even if it's not being
     # used later.
     wb.get_requirements(report=report)
@@ -50,8 +211,10 @@ def build_wheels(args):
         LOG.info('Building select packages: %d', len(args['build_packages']))
         # Build a given set of wheels as hard requirements.
         wb.build_wheels(
-            packages=wb.sort_requirements(
-                requirements_list=args['build_packages']
+            packages=wb.shard_packages(
+                packages=wb.sort_requirements(
+                    requirements_list=args['build_packages']
+                )
             )
         )
         wb.requirements.extend(args['build_packages'])
@@ -88,14 +251,14 @@ def build_wheels(args):
         packages.extend(wb.requirements)
 
     wb.build_wheels(
-        packages=packages,
+        packages=wb.shard_packages(packages=packages),
         clean_first=args['force_clean']
     )
 
     if args['build_branches']:
         LOG.info('Found branch packages: %d', len(wb.branches))
         wb.build_wheels(
-            packages=wb.branches,
+            packages=wb.shard_packages(packages=wb.branches),
             clean_first=args['force_clean'],
             force_iterate=True
         )
@@ -103,7 +266,7 @@ def build_wheels(args):
     if args['build_releases']:
         LOG.info('Found releases: %d', len(wb.releases))
         wb.build_wheels(
-            packages=wb.releases,
+            packages=wb.shard_packages(packages=wb.releases),
             clean_first=args['force_clean'],
             force_iterate=True
         )
@@ -141,6 +304,206 @@ class WheelBuilder(utils.RepoBaseClass):
         self.requirements = list()
         self.releases = list()
 
+        # Name keyed indexes used to shadow requirements and branches by
+        # items with a higher build precedence without rescanning the lists.
+        self._branches_index = collections.OrderedDict()
+        self._requirements_index = collections.OrderedDict()
+
+        self.default_limits, self.package_limits = supervisor.load_limits(
+            args=self.args
+        )
+
+        self.shard_weights = sharding.load_weights(
+            weights_file=self.args['shard_weights']
+        )
+
+        # Historical build costs used to plan and order the builds.
+        self.build_costs = self.shard_weights
+        self.build_failures = set()
+        metrics_dir = self.args['metrics_dir']
+        if metrics_dir and os.path.isdir(metrics_dir):
+            if not self.build_costs:
+                self.build_costs = build_metrics.package_costs(
+                    paths=[metrics_dir]
+                )
+            self.build_failures = build_metrics.package_failures(
+                paths=[metrics_dir]
+            )
+
+        # Packages planned by a ``--plan`` run instead of being built.
+        self.planned = list()
+
+        # Packages whose isolated builds failed during this run.
+        self.failed = list()
+
+        if self.args['build_engine'] == 'pep517':
+            self.build_engine = build_engine.BuildEngine()
+        else:
+            self.build_engine = None
+
+        if self.args['enqueue']:
+            self.job_queue = work_queue.SQLiteJobQueue(
+                queue_file=self.args['queue_file']
+            )
+            self.job_queue.set_args(args=self.args)
+        else:
+            self.job_queue = None
+
+        if self.args['source_cache']:
+            self.source_cache = source_cache.SourceCache(
+                cache_dir=self.args['source_cache'],
+                workers=self.args['prefetch_workers'],
+                refresh=self.args['source_cache_refresh'],
+                debug=self.args['debug']
+            )
+        else:
+            self.source_cache = None
+
+        # Set when every source of the packages being built is cached.
+        self._sources_prefetched = False
+
+        if self.args['build_env_dir']:
+            self.build_envs = build_envs.BuildEnvironments(
+                envs_dir=self.args['build_env_dir'],
+                python=self.args['build_python'],
+                requirements=self.args['build_env_requirements'],
+                pip_args=self._pip_index_args(),
+                debug=self.args['debug']
+            )
+        else:
+            self.build_envs = None
+
+        self.metrics = build_metrics.BuildMetrics(
+            metrics_dir=self.args['metrics_dir']
+        )
+
+        # Generation the wheels are published into in transactional mode.
+        self.publisher = None
+        self.staging_dir = None
+        if self.args['publish_root'] and not self.args['plan']:
+            if self.args['enqueue']:
+                raise utils.AError(
+                    'Publishing generations can not be used with a work'
+                    ' queue, the workers would publish separate generations.'
+                )
+            self._stage_generation()
+
+        if self.args['no_verify_wheels']:
+            self.verifier = None
+        else:
+            self.verifier = wheel_verify.WheelVerifier(
+                quarantine_dir=self.args['quarantine_dir'],
+                workers=self.args['verify_workers']
+            )
+
+        if self.args['tree_cache']:
+            self.tree_cache = tree_cache.TreeCache(
+                cache_dir=self.args['tree_cache']
+            )
+        else:
+            self.tree_cache = None
+
+        if self.args['compiler_cache']:
+            self.compiler_cache = compiler_cache.CompilerCache(
+                cache_dir=self.args['compiler_cache'],
+                jobs=self.args['compile_jobs'],
+                workers=self.args['build_workers'],
+                base_dir=self.args['build_dir']
+            )
+        else:
+            self.compiler_cache = None
+
+        if self.args['journal_file']:
+            self.journal = journal.BuildJournal(
+                journal_file=self.args['journal_file']
+            )
+        elif self.args['resume']:
+            raise utils.AError(
+                'Resuming a build requires a journal, use "--journal-file".'
+            )
+        else:
+            self.journal = None
+
+    def _stage_generation(self):
+        """Stage a new generation and build the repository within it."""
+        self.publisher = publisher.GenerationPublisher(
+            publish_root=self.args['publish_root'],
+            keep=self.args['keep_generations']
+        )
+        self.staging_dir = self.publisher.stage()
+        for key in ['storage_pool', 'link_dir', 'simple_dir']:
+            if self.args[key]:
+                self.args[key] = self.publisher.staged_path(
+                    path=self.args[key],
+                    staging_dir=self.staging_dir
+                )
+
+    def publish(self):
+        """Create the indexes and make the staged generation current.
+
+        With ``--simple-dir`` the simple index of the storage pool is
+        created. With ``--publish-indexes`` the HTML indexes of the
+        generation are created before it is made current.
+        """
+        if self.args['plan']:
+            return
+
+        if self.args['simple_dir']:
+            simple_index.create_simple_index(
+                args={
+                    'storage_pool': self.args['storage_pool'],
+                    'simple_dir': self.args['simple_dir'],
+                    'hash_cache': self.args['hash_cache'],
+                    'index_workers': self.args['index_workers']
+                }
+            )
+
+        if not self.staging_dir:
+            return
+
+        if self.args['publish_indexes']:
+            # The pages of the simple index are not replaced by listings.
+            html_indexer.create_html_indexes(
+                args={
+                    'repo_dir': self.staging_dir,
+                    'dir_exclude': [
+                        i for i in [self.args['simple_dir']] if i
+                    ],
+                    'index_state_file': self.args['index_state_file'],
+                    'hash_cache': self.args['hash_cache'],
+                    'index_workers': self.args['index_workers']
+                }
+            )
+
+        with exporter.phase(name='publish'):
+            self.publisher.commit(staging_dir=self.staging_dir)
+        self.staging_dir = None
+
+    def close(self):
+        """Release all resources held by the wheel builder."""
+        if self.staging_dir:
+            self.publisher.abort(staging_dir=self.staging_dir)
+            self.staging_dir = None
+        if self.build_engine:
+            self.build_engine.close()
+            self.build_engine = None
+        if self.verifier:
+            self.verifier.close()
+            self.verifier = None
+
+        if self.compiler_cache:
+            usage = self.compiler_cache.usage()
+            LOG.info(
+                'Compiler cache hits: %s, misses: %s, hit rate: %s%%',
+                usage['hits'],
+                usage['misses'],
+                usage['hit_rate']
+            )
+            exporter.add(name='compiler_cache_hits', value=usage['hits'])
+            exporter.add(name='compiler_cache_misses', value=usage['misses'])
+            self.metrics.compiler_cache = usage
+        self.metrics.save()
+
     @staticmethod
     def version_compare(versions, duplicate_handling='max'):
         """Return a list of sorted versions.
@@ -187,16 +550,129 @@ class WheelBuilder(utils.RepoBaseClass):
             versions = versions[-1].split(',')
         return name, versions, markers
 
+    def _package_name(self, package):
+        """Return the name of a package from an expected type, git+ or string.
+
+        :param package: Name of a particular package.
+        :type package: ``str``
+        :returns: ``str``
+        """
+        if 'git+' in package:
+            return utils.git_pip_link_parse(repo=package)[0].split('.git')[0]
+        else:
+            return self._requirement_name(package)[0]
+
+    def shard_packages(self, packages):
+        """Return the packages that belong to the shard being built.
+
+        If no shard has been defined all of the packages are returned.
+
+        :param packages: List of packages.
+        :type packages: ``list``
+        :returns: ``list``
+        """
+        if not self.args['shard']:
+            return packages
+
+        return sharding.shard_packages(
+            packages=packages,
+            shard=self.args['shard'],
+            name_function=self._package_name,
+            weights=self.shard_weights
+        )
+
+    def _build_name(self, package):
+        """Return the name of a package, path or requirement.
+
+        :param package: Name, path or requirement of a package.
+        :type package: ``str``
+        :returns: ``str``
+        """
+        if not package:
+            return ''
+        elif os.path.isdir(package):
+            return os.path.basename(package.rstrip(os.sep))
+        else:
+            return self._package_name(package=package)
+
+    def _build_limits(self, package):
+        """Return the build limits for a package, path or requirement.
+
+        :param package: Name, path or requirement of a package.
+        :type package: ``str``
+        :returns: ``dict``
+        """
+        return supervisor.limits_for(
+            name=self._build_name(package=package),
+            default_limits=self.default_limits,
+            package_limits=self.package_limits
+        )
+
+    def _run_build_command(self, command, package):
+        """Run a build command within the limits of a package.
+
+        :param command: list object containing parts of a shell command.
+        :type command: ``list``
+        :param package: Name, path or requirement of a package.
+        :type package: ``str``
+        """
+        limits = self._build_limits(package=package)
+        if self.compiler_cache:
+            env = self.compiler_cache.environment()
+        else:
+            env = None
+
+        if not env and not self.metrics.enabled:
+            if not supervisor.has_limits(limits):
+                return self._run_command(command=command)
+
+        data, success = supervisor.run_command(
+            command=command,
+            limits=limits,
+            env=env,
+            usage_callback=self.metrics.add_usage
+        )
+        self.log.debug(
+            'Command Data: [ %s ], Success: [ %s ]', data, success
+        )
+        if not success:
+            self.log.error(str(data))
+            raise SystemExit(str(data))
+
     @staticmethod
     def _copy_file(dst_file, src_file):
         """Copy a source file to a destination file.
 
+        The file is copied next to the destination and renamed over it, so
+        readers never see a partial file and a destination that is hard
+        linked into another published generation is never changed.
+
         :param dst_file: Destination file.
         :type dst_file: ``str``
         :param src_file: Source file.
         :type src_file: ``str``
         """
-        utils.copy_file(src=src_file, dst=dst_file)
+        temp_file = '%s.%d.tmp' % (dst_file, os.getpid())
+        utils.copy_file(src=src_file, dst=temp_file)
+        os.rename(temp_file, dst_file)
+
+    @staticmethod
+    def _write_lines(dst_file, lines):
+        """Write lines to a destination file.
+
+        Like ``_copy_file`` the lines are written next to the destination and
+        renamed over it, so a destination hard linked into another published
+        generation is never changed.
+
+        :param dst_file: Destination file.
+        :type dst_file: ``str``
+        :param lines: Lines to write.
+        :type lines: ``list``
+        """
+        temp_file = '%s.%d.tmp' % (dst_file, os.getpid())
+        with open(temp_file, 'wb') as f:
+            f.writelines(['%s\n' % i.encode('UTF-8') for i in lines])
+        os.rename(temp_file, dst_file)
 
     def _pip_build_wheels(self, package=None, packages_file=None,
                           no_links=False, retry=False, constraint_file=None):
@@ -239,17 +715,164 @@ class WheelBuilder(utils.RepoBaseClass):
         if constraint_file and os.path.isfile(constraint_file):
             command.extend(['--constraint', constraint_file])
 
-        if self.args['pip_pre']:
-            command.append('--pre')
+        command.extend(self._pip_source_args(no_links=no_links))
+
+        if not no_links and self.source_cache:
+            command.extend(['--find-links', self.source_cache.links_dir])
+            offline = self.args['source_cache_offline']
+            if offline and self._sources_prefetched:
+                if not self.args['pip_no_index']:
+                    command.append('--no-index')
+
+        if self.args['build_dir']:
+            build_dir = self.args['build_dir']
+            command.extend(['--build', build_dir])
+        else:
+            build_dir = tempfile.mkstemp(prefix='orb_')
+            command.extend(['--build', build_dir])
+
+        if self.args['debug'] is True:
+            command.append('--verbose')
+
+        if packages_file:
+            command.extend(['--requirement', packages_file])
+        else:
+            command.append('"%s"' % utils.stip_quotes(item=package))
+        with self.metrics.measure(operation='pip_build_wheels',
+                                  package=package or packages_file,
+                                  name=self._build_name(package=package),
+                                  output_dir=self.args['build_output']):
+            try:
+                self._run_pip_command(command=command, package=package)
+            except (IOError, OSError) as exp:
+                # If retry mode is enabled and there's an exception fail
+                if retry:
+                    raise utils.AError(
+                        'Failed to process wheel build: "%s", other data:'
+                        ' "%s"',
+                        package or packages_file,
+                        str(exp)
+                    )
+
+                LOG.warn(
+                    'Failed to process wheel build: "%s", other data: "%s"'
+                    ' Trying again without defined link lookups.',
+                    package or packages_file,
+                    str(exp)
+                )
+
+                # Remove the build directory when failed.
+                utils.remove_dirs(build_dir)
+
+                # Rerun wheel builder in retry mode without links
+                build_wheel_args = {'no_links': True, 'retry': True}
+                if package:
+                    build_wheel_args['package'] = package
+                else:
+                    build_wheel_args['packages_file'] = packages_file
+                self._pip_build_wheels(**build_wheel_args)
+            else:
+                LOG.debug('Build Success for: "%s"', package or packages_file)
+            finally:
+                utils.remove_dirs(directory=build_dir)
+
+    def _build_env(self, package=None):
+        """Return the build environment for a package.
+
+        Local source trees add the build requirements of their
+        ``pyproject.toml`` to the environment. ``None`` is returned when build
+        environments are not used or the environment could not be created.
+
+        :param package: Name, path or requirement of a package.
+        :type package: ``str``
+        :returns: ``str``
+        """
+        if not self.build_envs:
+            return None
+
+        if package and os.path.isdir(package):
+            requires = build_engine.read_build_system(package)['requires']
+        else:
+            requires = None
+
+        try:
+            return self.build_envs.get(requires=requires)
+        except utils.AError as exp:
+            LOG.warn(
+                'Build environment for "%s" could not be created, building'
+                ' with build isolation: %s',
+                package,
+                exp
+            )
+            return None
 
+    def _run_pip_command(self, command, package):
+        """Run a pip command within the build environment of a package.
+
+        Within a build environment the build requirements are already
+        installed so the build runs with ``--no-build-isolation``. When that
+        build fails it is run once more with build isolation.
+
+        :param command: list object containing parts of a pip command.
+        :type command: ``list``
+        :param package: Name, path or requirement of a package.
+        :type package: ``str``
+        """
+        env_dir = self._build_env(package=package)
+        if not env_dir:
+            return self._run_build_command(command=command, package=package)
+
+        env_command = self._env_pip_command(
+            command=command,
+            env_pip=self.build_envs.env_pip(env_dir=env_dir)
+        )
+        try:
+            self._run_build_command(command=env_command, package=package)
+        except SystemExit:
+            LOG.warn(
+                'Build of "%s" within build environment [ %s ] failed,'
+                ' trying again with build isolation.',
+                package,
+                env_dir
+            )
+            self._run_build_command(command=command, package=package)
+
+    @staticmethod
+    def _env_pip_command(command, env_pip):
+        """Return a pip command run by the pip of a build environment.
+
+        :param command: list object containing parts of a pip command.
+        :type command: ``list``
+        :param env_pip: $PATH to the pip of the build environment.
+        :type env_pip: ``str``
+        :returns: ``list``
+        """
+        env_command = [env_pip, command[1], '--no-build-isolation']
+        options = iter(command[2:])
+        for option in options:
+            if option in REMOVED_PIP_OPTIONS:
+                for _ in range(REMOVED_PIP_OPTIONS[option]):
+                    next(options, None)
+            else:
+                env_command.append(option)
+        return env_command
+
+    def _pip_index_args(self, no_links=False, index_urls=True):
+        """Return the pip arguments that select the indexes and links.
+
+        :param no_links: Enable / Disable add on links.
+        :type no_links: ``bol``
+        :param index_urls: Enable / Disable the index URLs.
+        :type index_urls: ``bol``
+        :returns: ``list``
+        """
+        command = list()
         if not no_links:
             if self.args['pip_extra_link_dirs']:
                 for link in self.args['pip_extra_link_dirs']:
                     command.extend(['--find-links', link])
 
-        if self.args['pip_no_deps']:
-            command.append('--no-deps')
-        else:
+        if index_urls:
             if self.args['pip_index']:
                 command.extend(['--index-url', self.args['pip_index']])
                 domain = urlparse.urlparse(self.args['pip_index'])
@@ -265,67 +888,181 @@ class WheelBuilder(utils.RepoBaseClass):
         if self.args['pip_no_index']:
             command.append('--no-index')
 
-        if self.args['build_dir']:
-            build_dir = self.args['build_dir']
-            command.extend(['--build', build_dir])
-        else:
-            build_dir = tempfile.mkstemp(prefix='orb_')
-            command.extend(['--build', build_dir])
+        return command
 
-        if self.args['debug'] is True:
-            command.append('--verbose')
+    def _pip_source_args(self, no_links=False):
+        """Return the pip arguments that select where sources come from.
 
-        if packages_file:
-            command.extend(['--requirement', packages_file])
-        else:
-            command.append('"%s"' % utils.stip_quotes(item=package))
-        try:
-            self._run_command(command=command)
-        except (IOError, OSError) as exp:
-            # If retry mode is enabled and there's an exception fail
-            if retry:
-                raise utils.AError(
-                    'Failed to process wheel build: "%s", other data: "%s"',
-                    package or packages_file,
-                    str(exp)
-                )
+        :param no_links: Enable / Disable add on links.
+        :type no_links: ``bol``
+        :returns: ``list``
+        """
+        command = list()
+        if self.args['pip_pre']:
+            command.append('--pre')
 
-            LOG.warn(
-                'Failed to process wheel build: "%s", other data: "%s"'
-                ' Trying again without defined link lookups.',
-                package or packages_file,
-                str(exp)
+        command.extend(
+            self._pip_index_args(
+                no_links=no_links,
+                index_urls=not self.args['pip_no_deps']
             )
+        )
+        if self.args['pip_no_deps']:
+            command.append('--no-deps')
 
-            # Remove the build directory when failed.
-            utils.remove_dirs(build_dir)
+        return command
 
-            # Rerun wheel builder in retry mode without links
-            build_wheel_args = {'no_links': True, 'retry': True}
-            if package:
-                build_wheel_args['package'] = package
-            else:
-                build_wheel_args['packages_file'] = packages_file
-            self._pip_build_wheels(**build_wheel_args)
+    def _prefetch_sources(self, packages):
+        """Download the sources of all packages into the source cache.
+
+        Git packages are built from their local checkouts and are skipped.
+
+        :param packages: List of packages to build.
+        :type packages: ``list``
+        """
+        requirements = [i for i in packages if not self._git_source(i)]
+        with exporter.phase(name='prefetch'):
+            results = self.source_cache.prefetch(
+                requirements=requirements,
+                pip_args=self._pip_source_args()
+            )
+
+        exporter.add(
+            name='sources_cached',
+            value=len(results[source_cache.CACHED])
+        )
+        exporter.add(
+            name='sources_fetched',
+            value=len(results[source_cache.FETCHED])
+        )
+        self._sources_prefetched = not results[source_cache.FAILED]
+
+    def _engine_build_wheels(self, source_dir):
+        """Create a python wheel using the in process build engine.
+
+        :param source_dir: $PATH to a local source tree.
+        :type source_dir: ``str``
+        :returns: ``bol``
+        """
+        if not self.build_engine:
+            return False
+        elif not self.build_engine.can_build(source_dir=source_dir):
+            LOG.debug(
+                'Build engine can not build "%s", falling back to pip.',
+                source_dir
+            )
+            return False
+        elif os.path.isfile(os.path.join(source_dir, 'constraints.txt')):
+            # The engine builds with the installed build requirements, which
+            # the constraints of the package are not applied to.
+            LOG.debug(
+                'Build engine does not apply the constraints of "%s", falling'
+                ' back to pip.',
+                source_dir
+            )
+            return False
+
+        try:
+            self.build_engine.build(
+                source_dir=source_dir,
+                wheel_dir=self.args['build_output'],
+                timeout=self._build_limits(package=source_dir)['timeout']
+            )
+        except supervisor.LimitExceeded:
+            raise
+        except utils.AError:
+            LOG.warn(
+                'Build engine failed for "%s", falling back to pip.',
+                source_dir
+            )
+            return False
         else:
-            LOG.debug('Build Success for: "%s"', package or packages_file)
-        finally:
-            utils.remove_dirs(directory=build_dir)
+            return True
 
-    def _setup_build_wheels(self, package):
-        """Create a Python wheel using a git with subdirectories.
+    def _failure_file(self):
+        """Return the $PATH to the build failure report or ``None``.
 
-        The method will clone the source into place, move to the designated
-        sub directory and create a python wheel from the designated
-        subdirectory.
+        :returns: ``str``
+        """
+        if self.args['link_dir']:
+            return os.path.join(self.args['link_dir'], 'build_failures.txt')
+        return None
+
+    def clear_build_failures(self):
+        """Remove the build failure report written by an earlier run."""
+        self.failed = list()
+        failure_file = self._failure_file()
+        if failure_file and os.path.isfile(failure_file):
+            LOG.info('Removing build failure report [ %s ]', failure_file)
+            os.remove(failure_file)
+
+    def _bisect_build_wheels(self, packages):
+        """Build a list of packages in bulk, bisecting any failed batch.
+
+        A failed batch is split in half and each half is built again until
+        the failures are isolated to single packages. All of the packages that
+        can be built are built in as few pip operations as possible. The
+        packages that failed are logged and, if a link directory is set,
+        written to ``build_failures.txt`` within it.
+
+        :param packages: List of packages to build.
+        :type packages: ``list``
+        :returns: ``list``
+        """
+        failed = list()
+        batches = [list(packages)]
+        while batches:
+            batch = batches.pop(0)
+            if not batch:
+                continue
+
+            fd, batch_file = tempfile.mkstemp(prefix='yaprt_batch_')
+            with os.fdopen(fd, 'wb') as f:
+                f.writelines(['%s\n' % i.encode('UTF-8') for i in batch])
+
+            try:
+                self._pip_build_wheels(packages_file=batch_file)
+            except (utils.AError, SystemExit):
+                if len(batch) == 1:
+                    LOG.error('Isolated build failure: "%s"', batch[0])
+                    failed.extend(batch)
+                else:
+                    LOG.warn(
+                        'Build of %d packages failed, bisecting the batch.',
+                        len(batch)
+                    )
+                    middle = len(batch) // 2
+                    batches[0:0] = [batch[:middle], batch[middle:]]
+            finally:
+                os.remove(batch_file)
+
+        if failed:
+            LOG.error('Failed to build packages: %s', failed)
+            # The report lists every failure of the run, not only this batch.
+            self.failed.extend(failed)
+            if self._failure_file():
+                self._write_lines(
+                    dst_file=self._failure_file(),
+                    lines=self.failed
+                )
+
+        return failed
+
+    def _git_source(self, package):
+        """Return the local source of a git package.
+
+        The returned ``tuple`` contains the local repository path, the path
+        of the package within the repository and the branch to build from. If
+        the package is not a git package ``None`` is returned.
 
         :param package: Name of a particular package to build.
         :type package: ``str``
+        :returns: ``tuple``
         """
         try:
             package_full_link = package.split('git+')[1]
         except IndexError:
-            return self._pip_build_wheels(package=package)
+            return None
 
         if '#' in package_full_link:
             package_link, extra_data = package_full_link.split('#')
@@ -352,41 +1089,211 @@ class WheelBuilder(utils.RepoBaseClass):
         else:
             git_package_location = repo_location
 
-        try:
+        return repo_location, git_package_location, branch
+
+    def _setup_build_wheels(self, package):
+        """Create a Python wheel using a git with subdirectories.
+
+        The method will clone the source into place, move to the designated
+        sub directory and create a python wheel from the designated
+        subdirectory.
+
+        :param package: Name of a particular package to build.
+        :type package: ``str``
+        """
+        with self.metrics.measure(operation='setup_build_wheels',
+                                  package=package,
+                                  name=self._package_name(package=package),
+                                  output_dir=self.args['build_output']):
+            git_source = self._git_source(package=package)
+            if not git_source:
+                return self._pip_build_wheels(package=package)
+
+            cache_key = self._tree_cache_key(git_source=git_source)
+            if cache_key and self._tree_cache_restore(package, cache_key):
+                return
+
+            before = self._built_wheels()
+            try:
+                with self._git_checkout(git_source=git_source) as source_dir:
+                    self._git_build_wheels(
+                        package=package,
+                        source_dir=source_dir
+                    )
+            finally:
+                utils.remove_dirs(directory=self.args['build_dir'])
+
+            if cache_key:
+                self.tree_cache.put(
+                    key=cache_key,
+                    wheels=[
+                        os.path.join(self.args['build_output'], i)
+                        for i in sorted(self._built_wheels() - before)
+                    ]
+                )
+
+    @contextlib.contextmanager
+    def _git_checkout(self, git_source):
+        """Check out the branch of a git package and yield its source dir.
+
+        By default the branch is checked out within the shared clone. With a
+        git snapshot mode the branch is exported, with ``git archive`` or as a
+        temporary worktree, into a private directory that is removed once the
+        package has been built, so any number of branches of a clone can be
+        built at the same time and build artefacts never reach the clone.
+
+        :param git_source: Local source of a git package.
+        :type git_source: ``tuple``
+        """
+        repo_location, git_package_location, branch = git_source
+        snapshot = self.args['git_snapshot']
+        if not snapshot:
             with utils.ChangeDir(git_package_location):
                 # Checkout the given branch
                 checkout_command = ['git', 'checkout', "'%s'" % branch]
                 self._run_command(command=checkout_command)
+            yield git_package_location
+            return
 
-            try:
-                LOG.debug('Build for: "%s"', package)
+        subdir = os.path.relpath(git_package_location, repo_location)
+        if subdir == '.':
+            subdir = ''
+
+        snapshot_dir = tempfile.mkdtemp(prefix='yaprt_snapshot_')
+        try:
+            if snapshot == 'worktree':
+                worktree = os.path.join(snapshot_dir, 'worktree')
+                self._run_command(
+                    command=[
+                        'git', '-C', repo_location, 'worktree', 'add',
+                        '--detach', worktree, "'%s'" % branch
+                    ]
+                )
+                yield os.path.join(worktree, subdir)
+            else:
+                archive = os.path.join(snapshot_dir, 'snapshot.tar')
+                source_dir = os.path.join(snapshot_dir, 'source')
+                os.makedirs(source_dir)
+                self._run_command(
+                    command=[
+                        'git', '-C', repo_location, 'archive',
+                        '--format=tar', '--output', archive,
+                        "'%s:%s'" % (branch, subdir)
+                    ]
+                )
+                self._run_command(
+                    command=['tar', '-xf', archive, '-C', source_dir]
+                )
+                os.remove(archive)
+                yield source_dir
+        finally:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            if snapshot == 'worktree':
+                self._run_command(
+                    command=['git', '-C', repo_location, 'worktree', 'prune'],
+                    skip_failure=True
+                )
+
+    def _git_build_wheels(self, package, source_dir):
+        """Create a Python wheel from the checked out source of a git package.
+
+        :param package: Name of a particular package to build.
+        :type package: ``str``
+        :param source_dir: $PATH to the checked out package source.
+        :type source_dir: ``str``
+        """
+        try:
+            LOG.debug('Build for: "%s"', package)
+            if not self._engine_build_wheels(source_dir):
                 self._pip_build_wheels(
-                    package=git_package_location,
+                    package=source_dir,
                     no_links=True,
                     constraint_file=os.path.join(
-                        git_package_location,
+                        source_dir,
                         'constraints.txt'
                     )
                 )
-            except SystemExit:
-                # Build the wheel using `python setup.py`
-                LOG.warn(
-                    'Running subdir package build for "%s" in fall back mode',
-                    package
-                )
-                build_command = [
-                    'python',
-                    'setup.py',
-                    'bdist_wheel',
-                    '--dist-dir',
+        except SystemExit:
+            # Build the wheel using `python setup.py`
+            LOG.warn(
+                'Running subdir package build for "%s" in fall back mode',
+                package
+            )
+            env_dir = self._build_env(package=source_dir)
+            if env_dir:
+                python = self.build_envs.env_python(env_dir=env_dir)
+            else:
+                python = 'python'
+
+            build_command = [
+                python,
+                'setup.py',
+                'bdist_wheel',
+                '--dist-dir',
+                self.args['build_output'],
+                '--bdist-dir',
+                self.args['build_dir']
+            ]
+            with utils.ChangeDir(source_dir):
+                self._run_build_command(
+                    command=build_command,
+                    package=source_dir
+                )
+
+    def _tree_cache_key(self, git_source):
+        """Return the tree cache key of a git package.
+
+        ``None`` is returned when the tree cache is not used or the tree of
+        the package could not be found.
+
+        :param git_source: Local source of a git package.
+        :type git_source: ``tuple``
+        :returns: ``str``
+        """
+        if not self.tree_cache:
+            return None
+
+        repo_location, git_package_location, branch = git_source
+        environment = {
+            'python': sys.version,
+            'args': dict([(i, self.args.get(i)) for i in BUILD_INPUT_ARGS])
+        }
+        if self.build_envs:
+            environment['build_env'] = self.build_envs.env_dir()
+        return self.tree_cache.key(
+            repo_path=repo_location,
+            rev=branch,
+            subdir=os.path.relpath(git_package_location, repo_location),
+            environment=environment
+        )
+
+    def _tree_cache_restore(self, package, cache_key):
+        """Copy the cached wheels of a git package into the build output.
+
+        :param package: Name of a particular package to build.
+        :type package: ``str``
+        :param cache_key: Tree cache key of the package.
+        :type cache_key: ``str``
+        :returns: ``bol``
+        """
+        cached_wheels = self.tree_cache.get(key=cache_key)
+        if not cached_wheels:
+            return False
+
+        if not os.path.isdir(self.args['build_output']):
+            os.makedirs(self.args['build_output'])
+
+        for cached_wheel in cached_wheels:
+            utils.copy_file(
+                src=cached_wheel,
+                dst=os.path.join(
                     self.args['build_output'],
-                    '--bdist-dir',
-                    self.args['build_dir']
-                ]
-                with utils.ChangeDir(git_package_location):
-                    self._run_command(command=build_command)
-        finally:
-            utils.remove_dirs(directory=self.args['build_dir'])
+                    os.path.basename(cached_wheel)
+                )
+            )
+        LOG.info('Using cached wheels of unchanged tree for "%s"', package)
+        exporter.add(name='tree_cache_hits')
+        return True
 
     @staticmethod
     def _get_sentinel(operators, vds):
@@ -610,25 +1517,54 @@ class WheelBuilder(utils.RepoBaseClass):
 
         return sorted(set(packages))
 
-    def _pop_items(self, found_repos, list_items):
-        """Remove items within a list.
+    @staticmethod
+    def _index_items(items, name_function):
+        """Return an ordered ``dict`` of items keyed by their package name.
+
+        :param items: List of items to index.
+        :type items: ``list``
+        :param name_function: Function that returns the name of an item.
+        :type name_function: ``function``
+        :returns: ``collections.OrderedDict``
+        """
+        index = collections.OrderedDict()
+        for item in items:
+            index.setdefault(name_function(item), list()).append(item)
+        return index
+
+    @staticmethod
+    def _index_list(index):
+        """Return a flat ``list`` of all items within a name keyed index.
+
+        :param index: Name keyed index of items.
+        :type index: ``collections.OrderedDict``
+        :returns: ``list``
+        """
+        items = list()
+        for value in index.values():
+            items.extend(value)
+        return items
 
-        :param found_repos: List of found repositories.
-        :type found_repos: ``list``
+    def _pop_items(self, name, list_items):
+        """Remove items of a given name from a name keyed index.
+
+        :param name: Name of the package to remove.
+        :type name: ``str``
         :param list_items: Name of list within the class to get.
         :type list_items: ``str``
         """
-        if self.args['disable_version_sanity']:
-            if found_repos:
-                LOG.warn(
-                    'Version sanity checking is disabled. At present the'
-                    ' following potentially duplicate and or conflicting'
-                    ' packages were not removed. Items: "%s"', found_repos
-                )
+        index = getattr(self, '_%s_index' % list_items)
+        found_repos = index.get(name)
+        if not found_repos:
+            return
+        elif self.args['disable_version_sanity']:
+            LOG.warn(
+                'Version sanity checking is disabled. At present the'
+                ' following potentially duplicate and or conflicting'
+                ' packages were not removed. Items: "%s"', found_repos
+            )
         else:
-            item_list = getattr(self, list_items)
-            for found_repo in found_repos:
-                item_list.pop(item_list.index(found_repo))
+            del index[name]
 
     def _pop_requirements(self, release):
         """Remove requirement items that are within a requirements list.
@@ -637,14 +1573,8 @@ class WheelBuilder(utils.RepoBaseClass):
         :type release: ``str``
         """
         name = utils.git_pip_link_parse(repo=release)[0]
-        self._pop_items(
-            found_repos=[
-                i for i in self.requirements
-                if self._requirement_name(i)[0] == name
-                if self._requirement_name(i)[0] == name.split('.git')[0]
-            ],
-            list_items='requirements'
-        )
+        if name == name.split('.git')[0]:
+            self._pop_items(name=name, list_items='requirements')
 
     def _pop_branches(self, release):
         """Remove requirement items that are within a branch list.
@@ -653,14 +1583,8 @@ class WheelBuilder(utils.RepoBaseClass):
         :type release: ``str``
         """
         name = utils.git_pip_link_parse(repo=release)[0]
-        self._pop_items(
-            found_repos=[
-                i for i in self.branches
-                if utils.git_pip_link_parse(repo=i)[0] == name
-                if utils.git_pip_link_parse(repo=i)[0] == name.split('.git')[0]
-            ],
-            list_items='branches'
-        )
+        if name == name.split('.git')[0]:
+            self._pop_items(name=name, list_items='branches')
 
     def get_requirements(self, report):
         """Load the requirements ``list`` from items within a report.
@@ -693,6 +1617,10 @@ class WheelBuilder(utils.RepoBaseClass):
                             self.requirements.extend(sanitized_values)
         else:
             self.requirements = self.sort_requirements()
+            self._requirements_index = self._index_items(
+                items=self.requirements,
+                name_function=lambda i: self._requirement_name(i)[0]
+            )
 
     def get_branches(self, report):
         """Load the branches ``list`` from items within a report.
@@ -710,6 +1638,11 @@ class WheelBuilder(utils.RepoBaseClass):
                     self._pop_requirements(release)
         else:
             self.branches = sorted(list(set(self.branches)))
+            self._branches_index = self._index_items(
+                items=self.branches,
+                name_function=lambda i: utils.git_pip_link_parse(repo=i)[0]
+            )
+            self.requirements = self._index_list(self._requirements_index)
 
     def get_releases(self, report):
         """Load the releases ``list`` from items within a report.
@@ -725,6 +1658,8 @@ class WheelBuilder(utils.RepoBaseClass):
                     self._pop_branches(release)
         else:
             self.releases = sorted(list(set(self.releases)))
+            self.requirements = self._index_list(self._requirements_index)
+            self.branches = self._index_list(self._branches_index)
 
     def _clean_packages(self, packages):
         """Search and clean existing packages in link_dir directory."""
@@ -740,54 +1675,136 @@ class WheelBuilder(utils.RepoBaseClass):
             for package in _packages:
                 self._package_clean(package=package, files=files)
 
+    def _pool_wheel_path(self, wheel_name):
+        """Return the path of a wheel within the storage pool.
+
+        :param wheel_name: name of wheel.
+        :type wheel_name: ``str``
+        :returns: ``str``
+        """
+        # Directory name is being "normalised"
+        return utils.get_abs_path(
+            file_name=os.path.join(
+                self.args['storage_pool'],
+                wheel_name.split('-')[0].lower().replace('_', '-'),
+                wheel_name
+            )
+        )
+
     def _store_pool(self):
         """Create wheels within the storage pool directory."""
+        with exporter.phase(name='store_pool'):
+            with self.metrics.measure(operation='store_pool') as measured:
+                self._store_wheels(measured=measured)
+
+    def _store_wheels(self, measured):
+        """Copy and link the built wheels into the storage pool.
+
+        :param measured: Metrics of the store operation.
+        :type measured: ``dict``
+        """
         built_wheels = utils.get_file_names(path=self.args['build_output'])
 
+        exporter.add(name='wheels_built', value=len(built_wheels))
+
+        verified_wheels = self._verify_wheels(wheel_files=built_wheels)
+
         # Iterate through the built wheels
-        for built_wheel in built_wheels:
-            _dst_wheel_file_name = os.path.basename(built_wheel)
-            # Directory name is being "normalised"
-            dst_wheel_file = utils.get_abs_path(
-                file_name=os.path.join(
-                    self.args['storage_pool'],
-                    _dst_wheel_file_name.split('-')[0].lower().replace('_', '-'),
-                    _dst_wheel_file_name
-                )
-            )
-
-            # Create destination file
-            if os.path.exists(dst_wheel_file):
-                dst_size = os.path.getsize(dst_wheel_file)
-                src_size = os.path.getsize(built_wheel)
-                if dst_size != src_size:
-                    LOG.debug(
-                        'Wheel found but the sizes are different. The new'
-                        ' wheel file will be copied over. Wheel file [ %s ]',
-                        dst_wheel_file
-                    )
-                    self._copy_file(
-                        dst_file=dst_wheel_file,
-                        src_file=built_wheel
-                    )
+        for built_wheel in verified_wheels:
+            dst_wheel_file = self._publish_wheel(
+                built_wheel=built_wheel,
+                measured=measured
+            )
+
+            # Create link
+            if self.args['link_dir']:
+                self._create_link(
+                    full_wheel_path=dst_wheel_file,
+                    wheel_name=os.path.basename(dst_wheel_file)
+                )
+
+        if len(verified_wheels) != len(built_wheels):
+            raise utils.AError(
+                'Invalid wheels were quarantined in [ %s ]: %s',
+                self.verifier.quarantine_dir,
+                sorted(set(built_wheels) - set(verified_wheels))
+            )
+
+    def _verify_wheels(self, wheel_files):
+        """Return the valid wheels, quarantining all of the others.
+
+        :param wheel_files: List of $PATHs to wheels.
+        :type wheel_files: ``list``
+        :returns: ``list``
+        """
+        if not self.verifier:
+            return wheel_files
+
+        results = self.verifier.verify(wheel_files=wheel_files)
+        verified = list()
+        for wheel_file in wheel_files:
+            problems = results[wheel_file]
+            if problems:
+                self.verifier.quarantine(
+                    wheel_file=wheel_file,
+                    problems=problems
+                )
+                exporter.add(name='wheels_quarantined')
             else:
+                verified.append(wheel_file)
+        return verified
+
+    def _publish_wheel(self, built_wheel, measured):
+        """Copy a built wheel into the storage pool.
+
+        :param built_wheel: $PATH to the built wheel.
+        :type built_wheel: ``str``
+        :param measured: Metrics of the store operation.
+        :type measured: ``dict``
+        :returns: ``str``
+        """
+        dst_wheel_file = self._pool_wheel_path(
+            wheel_name=os.path.basename(built_wheel)
+        )
+
+        # Create destination file
+        if os.path.exists(dst_wheel_file):
+            dst_size = os.path.getsize(dst_wheel_file)
+            src_size = os.path.getsize(built_wheel)
+            if dst_size != src_size:
                 LOG.debug(
-                    'Wheel not found copying wheel into place [ %s ]',
+                    'Wheel found but the sizes are different. The new'
+                    ' wheel file will be copied over. Wheel file [ %s ]',
                     dst_wheel_file
                 )
-                # Ensure the directory exists
-                self.shell_cmds.mkdir_p(path=os.path.dirname(dst_wheel_file))
                 self._copy_file(
                     dst_file=dst_wheel_file,
                     src_file=built_wheel
                 )
+                measured['wheels'] += 1
+                measured['bytes'] += src_size
+                exporter.add(name='published_bytes', value=src_size)
+            else:
+                exporter.add(name='wheels_skipped')
+        else:
+            LOG.debug(
+                'Wheel not found copying wheel into place [ %s ]',
+                dst_wheel_file
+            )
+            # Ensure the directory exists
+            self.shell_cmds.mkdir_p(path=os.path.dirname(dst_wheel_file))
+            self._copy_file(
+                dst_file=dst_wheel_file,
+                src_file=built_wheel
+            )
+            measured['wheels'] += 1
+            measured['bytes'] += os.path.getsize(dst_wheel_file)
+            exporter.add(
+                name='published_bytes',
+                value=os.path.getsize(dst_wheel_file)
+            )
 
-            # Create link
-            if self.args['link_dir']:
-                self._create_link(
-                    full_wheel_path=dst_wheel_file,
-                    wheel_name=os.path.basename(dst_wheel_file)
-                )
+        return dst_wheel_file
 
     def _create_link(self, full_wheel_path, wheel_name):
         """Create symbolic links within a link directory.
@@ -797,27 +1814,37 @@ class WheelBuilder(utils.RepoBaseClass):
         :param wheel_name: name of wheel.
         :type wheel_name: ``str``
         """
-        with utils.ChangeDir(self.args['link_dir']):
-            # Create the link using the relative path
-            link_path = os.path.join(self.args['link_dir'], wheel_name)
-            if os.path.exists(link_path):
-                try:
-                    # If the link is broken remove it
-                    if not os.readlink(link_path):
-                        os.remove(link_path)
-                except OSError as exp:
-                    if exp.errno == 2:
-                        pass
-                    else:
-                        raise utils.AError(exp)
+        # Create the link using the path relative to the link directory,
+        # without changing the working directory which is shared by the
+        # threads of a build pipeline.
+        link_path = os.path.join(self.args['link_dir'], wheel_name)
+        if os.path.exists(link_path):
+            try:
+                # If the link is broken remove it
+                if not os.readlink(link_path):
+                    os.remove(link_path)
+            except OSError as exp:
+                if exp.errno == 2:
+                    pass
+                else:
+                    raise utils.AError(exp)
 
-            if not os.path.islink(link_path):
-                if os.path.isfile(full_wheel_path):
-                    # Create the symlink
+        if not os.path.islink(link_path):
+            if os.path.isfile(full_wheel_path):
+                # Create the symlink
+                try:
                     os.symlink(
-                        os.path.relpath(full_wheel_path),
-                        os.path.join(self.args['link_dir'], wheel_name)
+                        os.path.relpath(
+                            full_wheel_path,
+                            os.path.realpath(self.args['link_dir'])
+                        ),
+                        link_path
                     )
+                except OSError as exp:
+                    # Created by another build worker sharing the link
+                    # directory since it was checked.
+                    if exp.errno != errno.EEXIST:
+                        raise
 
     def _package_clean(self, package, files):
         """Remove links for a given package name if found.
@@ -828,12 +1855,7 @@ class WheelBuilder(utils.RepoBaseClass):
         :param package: Name of a particular package to build.
         :type package: ``str``
         """
-        # Set the name of the package from an expected type, git+ or string.
-        if 'git+' in package:
-            name = utils.git_pip_link_parse(repo=package)[0].split('.git')[0]
-        else:
-            name = self._requirement_name(package)[0]
-
+        name = self._package_name(package=package)
         name = name.replace('-', '_').lower()
         LOG.debug('Checking for package name [ %s ] in link directory.', name)
         for file_name in files:
@@ -858,25 +1880,472 @@ class WheelBuilder(utils.RepoBaseClass):
         :param force_iterate: Force package iteration.
         :type force_iterate: ``bol``
         """
+        if self.args['plan']:
+            self.planned.extend(self.plan_packages(packages=packages))
+            return
+
+        if self.job_queue:
+            # Workers claim jobs in order, so the longest builds go first.
+            self.job_queue.put(
+                packages=planner.lpt_order(
+                    packages=packages,
+                    costs=self.build_costs,
+                    name_function=self._package_name
+                ),
+                clean_first=clean_first,
+                force_iterate=force_iterate
+            )
+            return
+
+        inputs = dict()
+        resumed = list()
+        relink = list()
+        if self.journal:
+            inputs = dict([(i, self._package_inputs(i)) for i in packages])
+            if self.args['resume']:
+                packages, resumed, relink = self._resume_packages(
+                    packages=packages,
+                    inputs=inputs
+                )
+                exporter.add(name='wheels_skipped', value=len(relink))
+
+        bulk_operation = self.args['pip_bulk_operation'] and packages
+        bulk_operation = bulk_operation and not force_iterate
+
+        # The pipeline fetches the sources of each package as it goes.
+        if self.source_cache:
+            if bulk_operation or not self.args['build_pipeline']:
+                self._prefetch_sources(packages=packages)
+
+        # Packages whose links are cleaned before the build output is stored.
+        clean_packages = packages
+        stored = False
         try:
-            if self.args['pip_bulk_operation'] and not force_iterate:
+            if bulk_operation:
                 req_file = os.path.join(
                     self.args['link_dir'],
                     'build_reqs.txt'
                 )
                 LOG.info('Requirement file being written: "%s"', req_file)
                 self.shell_cmds.mkdir_p(path=os.path.dirname(req_file))
-                with open(req_file, 'wb') as f:
-                    f.writelines(
-                        ['%s\n' % i.encode('UTF-8') for i in packages]
-                    )
+                self._write_lines(dst_file=req_file, lines=packages)
+
+                failed = list()
+                if self.args['pip_bulk_bisect']:
+                    failed = self._bisect_build_wheels(packages=packages)
+                    exporter.add(name='wheels_failed', value=len(failed))
+                else:
+                    self._pip_build_wheels(packages_file=req_file)
 
-                self._pip_build_wheels(packages_file=req_file)
+                if self.journal:
+                    for package in packages:
+                        if package in failed:
+                            state = journal.FAILED
+                        else:
+                            state = journal.BUILT
+                        self.journal.record(
+                            package=package,
+                            inputs=inputs[package],
+                            state=state
+                        )
+            elif self.args['build_pipeline']:
+                self._pipeline_build_wheels(
+                    packages=packages,
+                    inputs=inputs,
+                    clean_first=clean_first
+                )
+                clean_packages = list()
             else:
                 for package in packages:
-                    self._setup_build_wheels(package=package)
+                    try:
+                        self._journal_build_wheels(
+                            package=package,
+                            inputs=inputs.get(package)
+                        )
+                    except (Exception, SystemExit):
+                        exporter.add(name='wheels_failed')
+                        raise
             if clean_first:
-                self._clean_packages(packages)
+                self._clean_packages(clean_packages)
             self._store_pool()
+            stored = True
+            self._journal_stored(packages=packages + resumed, inputs=inputs)
+            for wheel_name in relink:
+                self._relink_wheel(wheel_name=wheel_name)
         finally:
-            utils.remove_dirs(directory=self.args['build_output'])
+            # A journaled build keeps unstored wheels so it can be resumed.
+            if stored or not self.journal:
+                utils.remove_dirs(directory=self.args['build_output'])
+
+    def _pipeline_build_wheels(self, packages, inputs, clean_first=False):
+        """Build, verify, publish and link packages as a pipeline.
+
+        Every package is published and linked as soon as its wheels have
+        been built instead of once all of the packages have been built. The
+        stages run in their own threads and are connected by bounded queues.
+
+        :param packages: List of packages to build.
+        :type packages: ``list``
+        :param inputs: Package names and the hash of their inputs.
+        :type inputs: ``dict``
+        :param clean_first: Enable a search and clean for existing package
+        :type clean_first: ``bol``
+        """
+        # Stages run while the build stage changes the working directory.
+        for key in ['build_output', 'storage_pool', 'link_dir']:
+            if self.args[key]:
+                self.args[key] = utils.get_abs_path(file_name=self.args[key])
+
+        stages = list()
+        if self.source_cache:
+            stages.append(
+                pipeline.Stage(
+                    name='fetch',
+                    function=self._pipeline_fetch,
+                    workers=self.args['prefetch_workers']
+                )
+            )
+        stages.extend(
+            [
+                pipeline.Stage(
+                    name='build',
+                    function=functools.partial(
+                        self._pipeline_build,
+                        inputs=inputs
+                    )
+                ),
+                pipeline.Stage(
+                    name='verify',
+                    function=self._pipeline_verify,
+                    workers=self.args['publish_workers'],
+                    drain=True
+                ),
+                pipeline.Stage(
+                    name='publish',
+                    function=self._pipeline_publish,
+                    workers=self.args['publish_workers'],
+                    drain=True
+                ),
+                pipeline.Stage(
+                    name='link',
+                    function=functools.partial(
+                        self._pipeline_link,
+                        inputs=inputs,
+                        clean_first=clean_first
+                    ),
+                    drain=True
+                )
+            ]
+        )
+        with exporter.phase(name='pipeline'):
+            pipeline.Pipeline(
+                stages=stages,
+                queue_size=self.args['pipeline_queue_size']
+            ).run(items=[{'package': i} for i in packages])
+
+    def _pipeline_fetch(self, item):
+        """Fetch the sources of a package into the source cache.
+
+        :param item: Pipeline item of a package.
+        :type item: ``dict``
+        :returns: ``dict``
+        """
+        if self._git_source(package=item['package']):
+            item['fetched'] = False
+            return item
+
+        state = self.source_cache.fetch(
+            requirement=item['package'],
+            pip_args=self._pip_source_args()
+        )
+        if state == source_cache.CACHED:
+            exporter.add(name='sources_cached')
+        elif state == source_cache.FETCHED:
+            exporter.add(name='sources_fetched')
+        item['fetched'] = state != source_cache.FAILED
+        return item
+
+    def _pipeline_build(self, item, inputs):
+        """Build the wheels of a package.
+
+        :param item: Pipeline item of a package.
+        :type item: ``dict``
+        :param inputs: Package names and the hash of their inputs.
+        :type inputs: ``dict``
+        :returns: ``dict``
+        """
+        self._sources_prefetched = item.get('fetched', False)
+        before = self._built_wheels()
+        try:
+            self._journal_build_wheels(
+                package=item['package'],
+                inputs=inputs.get(item['package'])
+            )
+        except (Exception, SystemExit):
+            exporter.add(name='wheels_failed')
+            raise
+
+        built_wheels = sorted(self._built_wheels() - before)
+        exporter.add(name='wheels_built', value=len(built_wheels))
+        item['wheels'] = [
+            os.path.join(self.args['build_output'], i) for i in built_wheels
+        ]
+        return item
+
+    def _pipeline_verify(self, item):
+        """Make sure every built wheel of a package is valid.
+
+        :param item: Pipeline item of a package.
+        :type item: ``dict``
+        :returns: ``dict``
+        """
+        verified_wheels = self._verify_wheels(wheel_files=item['wheels'])
+        if len(verified_wheels) != len(item['wheels']):
+            raise utils.AError(
+                'Invalid wheels of "%s" were quarantined in [ %s ]',
+                item['package'],
+                self.verifier.quarantine_dir
+            )
+        return item
+
+    def _pipeline_publish(self, item):
+        """Copy the built wheels of a package into the storage pool.
+
+        Published wheels are removed from the build output so they are not
+        stored again once the pipeline has finished.
+
+        :param item: Pipeline item of a package.
+        :type item: ``dict``
+        :returns: ``dict``
+        """
+        item['published'] = list()
+        with self.metrics.measure(operation='publish_wheels',
+                                  package=item['package']) as measured:
+            for built_wheel in item['wheels']:
+                item['published'].append(
+                    self._publish_wheel(
+                        built_wheel=built_wheel,
+                        measured=measured
+                    )
+                )
+                os.remove(built_wheel)
+        return item
+
+    def _pipeline_link(self, item, inputs, clean_first=False):
+        """Link the published wheels of a package.
+
+        :param item: Pipeline item of a package.
+        :type item: ``dict``
+        :param inputs: Package names and the hash of their inputs.
+        :type inputs: ``dict``
+        :param clean_first: Enable a search and clean for existing package
+        :type clean_first: ``bol``
+        """
+        if self.args['link_dir']:
+            if clean_first:
+                files = utils.get_file_names(self.args['link_dir'])
+                names = [item['package']] + [
+                    os.path.basename(i).split('-')[0] for i in item['wheels']
+                ]
+                for name in set(names):
+                    self._package_clean(package=name, files=files)
+
+            for published in item['published']:
+                self._create_link(
+                    full_wheel_path=published,
+                    wheel_name=os.path.basename(published)
+                )
+
+        self._journal_stored(packages=[item['package']], inputs=inputs)
+
+    def plan_packages(self, packages):
+        """Return the planned state and estimated build time of packages.
+
+        A package is cached when the journal has it stored from the same
+        inputs or when its git tree is within the tree cache. A package is
+        known to fail when the journal has it failed from the same inputs or
+        when its latest measured build failed. The packages are returned
+        longest build first.
+
+        :param packages: List of packages to build.
+        :type packages: ``list``
+        :returns: ``list``
+        """
+        items = list()
+        for package in planner.lpt_order(packages=packages,
+                                         costs=self.build_costs,
+                                         name_function=self._package_name):
+            name = self._package_name(package=package)
+            state = planner.BUILD
+            if self.journal:
+                inputs = self._package_inputs(package=package)
+                if self.journal.completed(package=package, inputs=inputs):
+                    state = planner.CACHED
+                elif self.journal.completed(package=package, inputs=inputs,
+                                            state=journal.FAILED):
+                    state = planner.FAILING
+
+            git_source = self._git_source(package=package)
+            if state == planner.BUILD and git_source:
+                cache_key = self._tree_cache_key(git_source=git_source)
+                if cache_key and self.tree_cache.get(key=cache_key):
+                    state = planner.CACHED
+
+            if state == planner.BUILD and name in self.build_failures:
+                state = planner.FAILING
+
+            cost, known = planner.estimate(name=name, costs=self.build_costs)
+            items.append(
+                {
+                    'package': package,
+                    'state': state,
+                    'estimate': cost,
+                    'known': known
+                }
+            )
+        return items
+
+    def _package_inputs(self, package):
+        """Return a hash of all of the inputs a package is built from.
+
+        :param package: Name of a particular package to build.
+        :type package: ``str``
+        :returns: ``str``
+        """
+        inputs = {
+            'package': package,
+            'python': sys.version,
+            'args': dict([(i, self.args.get(i)) for i in BUILD_INPUT_ARGS])
+        }
+        git_source = self._git_source(package=package)
+        if git_source:
+            inputs['commit'] = utils.git_rev_parse(
+                repo_path=git_source[0],
+                rev=git_source[2]
+            )
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True)).hexdigest()
+
+    def _built_wheels(self):
+        """Return a ``set`` of the wheel names within the build output.
+
+        :returns: ``set``
+        """
+        if os.path.isdir(self.args['build_output']):
+            return set(os.listdir(self.args['build_output']))
+        else:
+            return set()
+
+    def _resume_packages(self, packages, inputs):
+        """Return the work that remains for a list of packages.
+
+        The returned ``tuple`` contains the packages that need to be built,
+        the packages that were built by a previous run and whose wheels are
+        still within the build output, and the wheels of stored packages that
+        need to be linked.
+
+        :param packages: List of packages to build.
+        :type packages: ``list``
+        :param inputs: Package names and the hash of their inputs.
+        :type inputs: ``dict``
+        :returns: ``tuple``
+        """
+        build = list()
+        resumed = list()
+        relink = list()
+        built_wheels = self._built_wheels()
+        for package in packages:
+            entry = self.journal.completed(
+                package=package,
+                inputs=inputs[package]
+            )
+            if entry:
+                relink.extend(entry['wheels'] or list())
+                continue
+
+            entry = self.journal.completed(
+                package=package,
+                inputs=inputs[package],
+                state=journal.BUILT
+            )
+            wheels = entry and entry['wheels']
+            if wheels and built_wheels.issuperset(wheels):
+                resumed.append(package)
+            else:
+                build.append(package)
+
+        LOG.info(
+            'Resuming build, completed: %d, built: %d, remaining: %d',
+            len(packages) - len(build) - len(resumed),
+            len(resumed),
+            len(build)
+        )
+        return build, resumed, relink
+
+    def _journal_build_wheels(self, package, inputs):
+        """Build a package and record the outcome within the journal.
+
+        :param package: Name of a particular package to build.
+        :type package: ``str``
+        :param inputs: Hash of the inputs the package is built from.
+        :type inputs: ``str``
+        """
+        if not self.journal:
+            return self._setup_build_wheels(package=package)
+
+        before = self._built_wheels()
+        try:
+            self._setup_build_wheels(package=package)
+        except (Exception, SystemExit) as exp:
+            self.journal.record(
+                package=package,
+                inputs=inputs,
+                state=journal.FAILED,
+                error=str(exp),
+                failure=getattr(exp, 'failure_class', 'error')
+            )
+            raise
+        else:
+            self.journal.record(
+                package=package,
+                inputs=inputs,
+                state=journal.BUILT,
+                wheels=sorted(self._built_wheels() - before)
+            )
+
+    def _journal_stored(self, packages, inputs):
+        """Record built packages as stored within the journal.
+
+        :param packages: List of packages that were stored.
+        :type packages: ``list``
+        :param inputs: Package names and the hash of their inputs.
+        :type inputs: ``dict``
+        """
+        if not self.journal:
+            return
+
+        for package in packages:
+            entry = self.journal.completed(
+                package=package,
+                inputs=inputs[package],
+                state=journal.BUILT
+            )
+            if entry:
+                self.journal.record(
+                    package=package,
+                    inputs=inputs[package],
+                    state=journal.STORED,
+                    wheels=entry['wheels']
+                )
+
+    def _relink_wheel(self, wheel_name):
+        """Link a wheel that was stored by a previous run if it is missing.
+
+        :param wheel_name: name of wheel.
+        :type wheel_name: ``str``
+        """
+        full_wheel_path = self._pool_wheel_path(wheel_name=wheel_name)
+        if self.args['link_dir'] and os.path.isfile(full_wheel_path):
+            self._create_link(
+                full_wheel_path=full_wheel_path,
+                wheel_name=wheel_name
+            )
@@ -0,0 +1,308 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Verify the integrity of built wheels before they are published.
+
+Every wheel is checked within a pool of worker processes, so reading and
+hashing the content of large wheels runs on all of the CPUs. A wheel is
+valid when:
+
+* The zip central directory can be read and the CRC of every member
+  matches its content.
+* The wheel has a single ``.dist-info`` directory with ``WHEEL``,
+  ``METADATA`` and ``RECORD`` files.
+* Every member is listed within ``RECORD`` with a matching hash and size,
+  and every file listed within ``RECORD`` is a member.
+* The name and version of the file name match ``METADATA`` and the tags of
+  the file name are listed within ``WHEEL``.
+
+Wheels that are not valid are moved into a quarantine directory instead of
+being published.
+"""
+
+import base64
+import csv
+import hashlib
+import itertools
+import multiprocessing
+import os
+import re
+import shutil
+import time
+import zipfile
+import zlib
+
+from cloudlib import logger
+
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+# name-version(-build)?-python-abi-platform.whl
+WHEEL_NAME = re.compile(
+    r'^(?P<name>[^-]+)-(?P<version>[^-]+)(-(?P<build>\d[^-]*))?'
+    r'-(?P<python>[^-]+)-(?P<abi>[^-]+)-(?P<platform>[^-]+)\.whl$'
+)
+
+# Signatures of RECORD are not listed within it.
+UNRECORDED = ['RECORD', 'RECORD.jws', 'RECORD.p7s']
+
+
+def _normalize(name):
+    """Return a name normalised the way wheel file names escape it.
+
+    :param name: Project name or version.
+    :type name: ``str``
+    :returns: ``str``
+    """
+    return re.sub(r'[-_.]+', '_', name).lower()
+
+
+def headers(content):
+    """Return the ``Key: value`` headers of a metadata file.
+
+    :param content: Content of a ``WHEEL`` or ``METADATA`` file.
+    :type content: ``str``
+    :returns: ``list``
+    """
+    found = list()
+    for line in content.splitlines():
+        if not line.strip():
+            # The headers end at the first blank line, the body follows.
+            break
+        elif ':' in line and not line[0].isspace():
+            key, value = line.split(':', 1)
+            found.append((key.strip(), value.strip()))
+    return found
+
+
+def _check_record(archive, dist_info):
+    """Return the problems found by checking members against ``RECORD``.
+
+    :param archive: Open wheel archive.
+    :type archive: ``zipfile.ZipFile``
+    :param dist_info: Name of the ``.dist-info`` directory.
+    :type dist_info: ``str``
+    :returns: ``list``
+    """
+    problems = list()
+    records = dict()
+    for row in csv.reader(archive.read('%s/RECORD' % dist_info).splitlines()):
+        if row:
+            records[row[0]] = row[1:]
+
+    members = [i for i in archive.namelist() if not i.endswith('/')]
+    unrecorded = ['%s/%s' % (dist_info, i) for i in UNRECORDED]
+    for member in members:
+        if member in unrecorded:
+            continue
+        elif member not in records:
+            problems.append('%s is not listed within RECORD' % member)
+            continue
+
+        digest, size = (records[member] + ['', ''])[:2]
+        if not digest:
+            problems.append('%s has no hash within RECORD' % member)
+            continue
+
+        algorithm, _, expected = digest.partition('=')
+        # Wheels built on python 2 name the algorithm in upper case.
+        algorithm = algorithm.lower()
+        if algorithm not in ['sha256', 'sha384', 'sha512']:
+            problems.append(
+                '%s is hashed with unsupported %s' % (member, algorithm)
+            )
+            continue
+
+        content = archive.read(member)
+        actual = base64.urlsafe_b64encode(
+            hashlib.new(algorithm, content).digest()
+        ).rstrip('=')
+        if actual != expected.rstrip('='):
+            problems.append('%s does not match its RECORD hash' % member)
+        if size and size != str(len(content)):
+            problems.append('%s does not match its RECORD size' % member)
+
+    for missing in sorted(set(records) - set(members)):
+        if missing not in unrecorded:
+            problems.append('%s is listed within RECORD but missing' % missing)
+    return problems
+
+
+def verify_wheel(wheel_file):
+    """Return a ``list`` of the problems found within a wheel.
+
+    An empty list means the wheel is valid.
+
+    :param wheel_file: $PATH to the wheel.
+    :type wheel_file: ``str``
+    :returns: ``list``
+    """
+    wheel_name = os.path.basename(wheel_file)
+    match = WHEEL_NAME.match(wheel_name)
+    if not match:
+        return ['%s is not a valid wheel file name' % wheel_name]
+
+    try:
+        archive = zipfile.ZipFile(wheel_file)
+    except (zipfile.BadZipfile, zipfile.LargeZipFile, IOError) as exp:
+        return ['Zip central directory can not be read: %s' % exp]
+
+    try:
+        # Reading a member checks its CRC, every member is read to check its
+        # RECORD hash so the CRCs are not checked separately.
+        dist_infos = set(
+            [
+                i.split('/')[0] for i in archive.namelist()
+                if i.split('/')[0].endswith('.dist-info')
+            ]
+        )
+        if len(dist_infos) != 1:
+            return ['Expected one .dist-info directory, found %s' % len(
+                dist_infos
+            )]
+
+        dist_info = dist_infos.pop()
+        names = archive.namelist()
+        problems = [
+            '%s/%s is missing' % (dist_info, i)
+            for i in ['WHEEL', 'METADATA', 'RECORD']
+            if '%s/%s' % (dist_info, i) not in names
+        ]
+        if problems:
+            return problems
+
+        metadata = dict(
+            headers(archive.read('%s/METADATA' % dist_info))
+        )
+        if _normalize(metadata.get('Name', '')) != _normalize(
+                match.group('name')):
+            problems.append(
+                'File name does not match METADATA name %s' % metadata.get(
+                    'Name'
+                )
+            )
+        if _normalize(metadata.get('Version', '')) != _normalize(
+                match.group('version')):
+            problems.append(
+                'File name does not match METADATA version %s' % metadata.get(
+                    'Version'
+                )
+            )
+
+        tags = set(
+            [
+                v for k, v in headers(
+                    archive.read('%s/WHEEL' % dist_info)
+                ) if k == 'Tag'
+            ]
+        )
+        for tag in itertools.product(
+                match.group('python').split('.'),
+                match.group('abi').split('.'),
+                match.group('platform').split('.')):
+            if '-'.join(tag) not in tags:
+                problems.append(
+                    'File name tag %s is not listed within WHEEL' % '-'.join(
+                        tag
+                    )
+                )
+
+        problems.extend(_check_record(archive=archive, dist_info=dist_info))
+        return problems
+    except (zipfile.BadZipfile, zlib.error, KeyError, IOError,
+            ValueError) as exp:
+        return ['Wheel can not be read: %s' % exp]
+    finally:
+        archive.close()
+
+
+def _verify_wheel(wheel_file):
+    """Verify a wheel within a worker process.
+
+    :param wheel_file: $PATH to the wheel.
+    :type wheel_file: ``str``
+    :returns: ``tuple``
+    """
+    return wheel_file, verify_wheel(wheel_file=wheel_file)
+
+
+class WheelVerifier(object):
+    """Verify wheels within a pool of worker processes.
+
+    Example:
+        >>> verifier = WheelVerifier(quarantine_dir='/tmp/quarantine')
+        >>> verifier.verify(wheel_files=['/tmp/w/six-1.9.0-py2-none-any.whl'])
+        {'/tmp/w/six-1.9.0-py2-none-any.whl': []}
+        >>> verifier.close()
+    """
+    def __init__(self, quarantine_dir, workers=4):
+        """Start the worker pool.
+
+        :param quarantine_dir: $PATH where invalid wheels are moved.
+        :type quarantine_dir: ``str``
+        :param workers: Number of worker processes.
+        :type workers: ``int``
+        """
+        self.quarantine_dir = utils.get_abs_path(file_name=quarantine_dir)
+        self.pool = multiprocessing.Pool(processes=max(int(workers), 1))
+
+    def verify(self, wheel_files):
+        """Return a ``dict`` of wheels and the problems found within them.
+
+        :param wheel_files: List of $PATHs to wheels.
+        :type wheel_files: ``list``
+        :returns: ``dict``
+        """
+        if not wheel_files:
+            return dict()
+        return dict(self.pool.map(_verify_wheel, wheel_files))
+
+    def quarantine(self, wheel_file, problems):
+        """Move an invalid wheel into the quarantine directory.
+
+        The problems found are written next to the wheel.
+
+        :param wheel_file: $PATH to the wheel.
+        :type wheel_file: ``str``
+        :param problems: Problems found within the wheel.
+        :type problems: ``list``
+        :returns: ``str``
+        """
+        if not os.path.isdir(self.quarantine_dir):
+            os.makedirs(self.quarantine_dir)
+
+        quarantined = os.path.join(
+            self.quarantine_dir,
+            '%s.%d' % (os.path.basename(wheel_file), int(time.time()))
+        )
+        shutil.move(wheel_file, quarantined)
+        with open('%s.problems' % quarantined, 'wb') as f:
+            f.write('%s\n' % '\n'.join(problems))
+
+        LOG.error(
+            'Quarantined invalid wheel [ %s ] -> [ %s ]: %s',
+            wheel_file,
+            quarantined,
+            '; '.join(problems)
+        )
+        return quarantined
+
+    def close(self):
+        """Stop all of the worker processes."""
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,380 @@
+# Copyright 2014, Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# (c) 2015, Kevin Carter <kevin.carter@rackspace.com>
+
+"""Work queue used to distribute wheel builds between workers.
+
+A producer writes one job per package into the queue along with the build
+arguments it was run with. Any number of workers then claim jobs. A claimed
+job is leased to a worker for a limited amount of time which the worker
+renews while the job is being built. If a worker dies its lease expires and
+the job is handed to another worker, up to a maximum number of attempts.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from cloudlib import logger
+
+from yaprt import utils
+
+
+LOG = logger.getLogger('repo_builder')
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def worker_name():
+    """Return a name that is unique to the running worker process.
+
+    :returns: ``str``
+    """
+    return '%s-%d' % (socket.gethostname(), os.getpid())
+
+
+class SQLiteJobQueue(object):
+    """Job queue stored within a local SQLite database.
+
+    A job is a ``dict`` with the keys "id", "package", "clean_first",
+    "force_iterate" and "attempts".
+
+    Every operation uses its own connection so that the queue can be used
+    from multiple threads and processes at the same time.
+
+    Example:
+        >>> queue = SQLiteJobQueue(queue_file='/var/lib/yaprt/queue.db')
+        >>> queue.put(packages=['six', 'pbr'])
+        >>> job = queue.claim(worker='host-1', lease_time=600, max_attempts=3)
+        >>> queue.complete(job_id=job['id'], worker='host-1')
+    """
+    def __init__(self, queue_file):
+        """Create the queue database if it does not already exist.
+
+        :param queue_file: $PATH to the queue database.
+        :type queue_file: ``str``
+        """
+        if not queue_file:
+            raise utils.AError('A queue file is required, use "--queue-file".')
+
+        self.queue_file = utils.get_abs_path(file_name=queue_file)
+        queue_dir = os.path.dirname(self.queue_file)
+        if not os.path.isdir(queue_dir):
+            os.makedirs(queue_dir)
+
+        with self._transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' package TEXT UNIQUE NOT NULL,'
+                ' clean_first INTEGER NOT NULL DEFAULT 0,'
+                ' force_iterate INTEGER NOT NULL DEFAULT 0,'
+                ' state TEXT NOT NULL,'
+                ' attempts INTEGER NOT NULL DEFAULT 0,'
+                ' worker TEXT,'
+                ' lease_expires REAL,'
+                ' error TEXT)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta ('
+                ' key TEXT PRIMARY KEY,'
+                ' value TEXT)'
+            )
+
+    def _transaction(self):
+        """Return a connection that holds a write lock until it is closed.
+
+        :returns: ``_Transaction``
+        """
+        return _Transaction(queue_file=self.queue_file)
+
+    def set_args(self, args):
+        """Store the build arguments used by workers.
+
+        :param args: User defined arguments.
+        :type args: ``dict``
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                ('args', json.dumps(args, sort_keys=True))
+            )
+
+    def get_args(self):
+        """Return the build arguments used by workers.
+
+        :returns: ``dict``
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT value FROM meta WHERE key = ?', ('args',)
+            ).fetchone()
+
+        if not row:
+            raise utils.AError(
+                'No build arguments were found in the queue [ %s ]. Run'
+                ' "build-wheels --enqueue" first.', self.queue_file
+            )
+        return json.loads(row[0])
+
+    def put(self, packages, clean_first=False, force_iterate=False):
+        """Add a job for every package.
+
+        :param packages: List of packages to build.
+        :type packages: ``list``
+        :param clean_first: Enable a search and clean for existing package
+        :type clean_first: ``bol``
+        :param force_iterate: Force package iteration.
+        :type force_iterate: ``bol``
+        """
+        with self._transaction() as conn:
+            for package in packages:
+                conn.execute(
+                    'INSERT OR IGNORE INTO jobs'
+                    ' (package, clean_first, force_iterate, state)'
+                    ' VALUES (?, ?, ?, ?)',
+                    (package, int(clean_first), int(force_iterate), PENDING)
+                )
+                # Jobs left over from a previous run are queued again.
+                conn.execute(
+                    'UPDATE jobs SET state = ?, attempts = 0, worker = NULL,'
+                    ' lease_expires = NULL, error = NULL, clean_first = ?,'
+                    ' force_iterate = ? WHERE package = ? AND state IN'
+                    ' (?, ?)',
+                    (
+                        PENDING, int(clean_first), int(force_iterate),
+                        package, DONE, FAILED
+                    )
+                )
+        LOG.info('Queued %d jobs in [ %s ]', len(packages), self.queue_file)
+
+    def claim(self, worker, lease_time, max_attempts):
+        """Return a leased job or ``None`` if no job is available.
+
+        :param worker: Name of the worker claiming the job.
+        :type worker: ``str``
+        :param lease_time: Number of seconds the lease is held for.
+        :type lease_time: ``int``
+        :param max_attempts: Number of times a job can be claimed.
+        :type max_attempts: ``int``
+        :returns: ``dict``
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # Expired leases which have used all of their attempts have failed.
+            conn.execute(
+                'UPDATE jobs SET state = ?, error = ? WHERE state = ? AND'
+                ' lease_expires < ? AND attempts >= ?',
+                (FAILED, 'Lease expired', LEASED, now, max_attempts)
+            )
+            row = conn.execute(
+                'SELECT id, package, clean_first, force_iterate, attempts'
+                ' FROM jobs WHERE state = ? OR (state = ? AND'
+                ' lease_expires < ?) ORDER BY id LIMIT 1',
+                (PENDING, LEASED, now)
+            ).fetchone()
+            if not row:
+                return None
+
+            if row[4]:
+                LOG.warn('Retrying job for package "%s"', row[1])
+
+            conn.execute(
+                'UPDATE jobs SET state = ?, worker = ?, lease_expires = ?,'
+                ' attempts = attempts + 1 WHERE id = ?',
+                (LEASED, worker, now + lease_time, row[0])
+            )
+
+        return {
+            'id': row[0],
+            'package': row[1],
+            'clean_first': bool(row[2]),
+            'force_iterate': bool(row[3]),
+            'attempts': row[4] + 1
+        }
+
+    def renew(self, job_id, worker, lease_time):
+        """Extend the lease of a job held by a worker.
+
+        :param job_id: Id of the job.
+        :type job_id: ``int``
+        :param worker: Name of the worker holding the lease.
+        :type worker: ``str``
+        :param lease_time: Number of seconds the lease is extended by.
+        :type lease_time: ``int``
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET lease_expires = ? WHERE id = ? AND'
+                ' worker = ? AND state = ?',
+                (time.time() + lease_time, job_id, worker, LEASED)
+            )
+
+    def _finish(self, job_id, worker, state, error=None):
+        """Set the final state of a job leased to a worker.
+
+        :param job_id: Id of the job.
+        :type job_id: ``int``
+        :param worker: Name of the worker holding the lease.
+        :type worker: ``str``
+        :param state: Final state of the job.
+        :type state: ``str``
+        :param error: Reason the job failed.
+        :type error: ``str``
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET state = ?, error = ?, lease_expires = NULL'
+                ' WHERE id = ? AND worker = ? AND state = ?',
+                (state, error, job_id, worker, LEASED)
+            )
+
+    def complete(self, job_id, worker):
+        """Mark a job as done.
+
+        :param job_id: Id of the job.
+        :type job_id: ``int``
+        :param worker: Name of the worker holding the lease.
+        :type worker: ``str``
+        """
+        self._finish(job_id=job_id, worker=worker, state=DONE)
+
+    def fail(self, job_id, worker, error):
+        """Mark a job as failed.
+
+        :param job_id: Id of the job.
+        :type job_id: ``int``
+        :param worker: Name of the worker holding the lease.
+        :type worker: ``str``
+        :param error: Reason the job failed.
+        :type error: ``str``
+        """
+        self._finish(job_id=job_id, worker=worker, state=FAILED, error=error)
+
+    def counts(self):
+        """Return a ``dict`` of job states and the number of jobs in each.
+
+        :returns: ``dict``
+        """
+        counts = dict([(i, 0) for i in [PENDING, LEASED, DONE, FAILED]])
+        with self._transaction() as conn:
+            for state, count in conn.execute(
+                'SELECT state, COUNT(*) FROM jobs GROUP BY state'
+            ):
+                counts[state] = count
+        return counts
+
+    def failures(self):
+        """Return a ``list`` of failed packages and the reason they failed.
+
+        :returns: ``list``
+        """
+        with self._transaction() as conn:
+            return conn.execute(
+                'SELECT package, error FROM jobs WHERE state = ?'
+                ' ORDER BY package', (FAILED,)
+            ).fetchall()
+
+
+class _Transaction(object):
+    """Context manager for an immediate SQLite transaction."""
+    def __init__(self, queue_file):
+        """Set up the transaction, nothing is opened until it is entered.
+
+        :param queue_file: $PATH to the queue database.
+        :type queue_file: ``str``
+        """
+        self._queue_file = queue_file
+        self._conn = None
+
+    def __enter__(self):
+        """Open a connection and take the write lock.
+
+        :returns: ``sqlite3.Connection``
+        """
+        self._conn = sqlite3.connect(
+            self._queue_file,
+            timeout=60,
+            isolation_level=None
+        )
+        self._conn.execute('BEGIN IMMEDIATE')
+        return self._conn
+
+    def __exit__(self, exc_type, *args):
+        """Commit, or roll back on an exception, and close the connection.
+
+        :param exc_type: Type of the exception raised, if any.
+        :type exc_type: ``type``
+        """
+        try:
+            if exc_type:
+                self._conn.execute('ROLLBACK')
+            else:
+                self._conn.execute('COMMIT')
+        finally:
+            self._conn.close()
+
+
+class LeaseKeeper(threading.Thread):
+    """Renew the lease of a job until stopped.
+
+    Example:
+        >>> keeper = LeaseKeeper(queue, job_id=1, worker='a', lease_time=60)
+        >>> keeper.start()
+        >>> # build things
+        >>> keeper.stop()
+    """
+    def __init__(self, queue, job_id, worker, lease_time):
+        """Set up the thread, the lease is renewed once it is started.
+
+        :param queue: Work queue the job was claimed from.
+        :type queue: ``SQLiteJobQueue``
+        :param job_id: Id of the job.
+        :type job_id: ``int``
+        :param worker: Name of the worker holding the lease.
+        :type worker: ``str``
+        :param lease_time: Number of seconds the lease is extended by.
+        :type lease_time: ``int``
+        """
+        super(LeaseKeeper, self).__init__()
+        self.daemon = True
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self.lease_time = lease_time
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Renew the lease every third of the lease time until stopped."""
+        while not self._stop_event.wait(max(self.lease_time / 3.0, 1)):
+            try:
+                self.queue.renew(
+                    job_id=self.job_id,
+                    worker=self.worker,
+                    lease_time=self.lease_time
+                )
+            except sqlite3.Error as exp:
+                LOG.warn('Failed to renew the lease of a job: %s', exp)
+
+    def stop(self):
+        """Stop renewing the lease and wait for the thread to finish."""
+        self._stop_event.set()
+        self.join()